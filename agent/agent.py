@@ -6,28 +6,56 @@ A standalone agent that registers with the Manager, heartbeats, claims tasks,
 and executes iperf3 commands.
 """
 
+import io
 import os
 import sys
 import json
 import time
+import zlib
+import random
 import asyncio
+import itertools
+import sqlite3
+import threading
+import importlib.util
 import subprocess
 import signal
+import tempfile
 import socket
 import platform
 import uuid
 import argparse
 import logging
 import traceback
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 
 import httpx
 import psutil
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# Longest a server task waits for iperf3 to start listening before reporting started
+PORT_READY_TIMEOUT = 2.0
+
+# Task traceparents kept for event requests; oldest are forgotten first
+MAX_TRACEPARENTS = 1024
+
+# Client payload tuning options and their iperf3 flags (-b is handled with -u)
+CLIENT_TUNING_FLAGS = {
+    "zerocopy": "-Z",
+    "window": "-w",
+    "buffer_length": "-l",
+    "omit_seconds": "-O",
+    "congestion": "-C",
+    "mss": "-M",
+    "fq_rate": "--fq-rate",
+    "reverse": "-R",
+    "bidir": "--bidir",
+}
+
 
 class AgentSettings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env")
@@ -37,6 +65,31 @@ class AgentSettings(BaseSettings):
     agent_key: str = "your-registration-key-here"
     api_version: int = 1
 
+    # HTTP connection tuning (HTTP/2 is negotiated via ALPN on https:// manager URLs)
+    http2: bool = True
+    keepalive_expiry: float = 60.0
+    tasks_per_heartbeat: int = 5
+    # Heartbeat cadence; a claiming heartbeat waits up to this long at the
+    # Manager for tasks to be queued, so new work starts without polling lag
+    heartbeat_interval_seconds: float = 5.0
+
+    # Durable outbox for started/result events
+    outbox_batch_size: int = 50
+    outbox_max_backoff_seconds: float = 60.0
+
+    # iperf3 backend: "iperf3" runs the real binary, "fake" emits synthetic output
+    iperf_backend: str = "iperf3"
+    fake_timescale: float = 1.0
+    fake_bitrate_bps: float = 1e9
+    fake_failure_mode: str = "none"  # none, connection_refused, invalid_json, crash
+    fake_failure_rate: float = 0.0
+    # Where fake servers and clients on this host find each other (default: <tmp>/iperf-fake)
+    fake_rendezvous_dir: str = ""
+
+    # Long-lived iperf3 servers kept listening on these ports (e.g. "5201-5208"),
+    # leased to server tasks instead of spawning one per test; empty disables the pool
+    server_pool_ports: str = ""
+
     @classmethod
     def from_cli_args(cls, args: argparse.Namespace) -> 'AgentSettings':
         """Create settings from CLI args, with CLI args taking precedence over .env"""
@@ -52,6 +105,12 @@ class AgentSettings(BaseSettings):
             settings.agent_key = args.agent_key
         if args.api_version is not None:
             settings.api_version = args.api_version
+        if args.iperf_backend:
+            settings.iperf_backend = args.iperf_backend
+        if args.fake_timescale is not None:
+            settings.fake_timescale = args.fake_timescale
+        if args.server_pool_ports is not None:
+            settings.server_pool_ports = args.server_pool_ports
 
         return settings
 
@@ -62,25 +121,611 @@ class RunningProcess:
     process_type: str  # 'server' or 'client'
     port: Optional[int]
     pid: int
-    process: subprocess.Popen
+    process: Any  # subprocess.Popen or an executor-provided equivalent
     output_file: Optional[Path] = None  # File path for server stdout
 
 
+@dataclass
+class PooledServer:
+    port: int
+    process: Any
+    output_file: Path  # Server stdout, one JSON document appended per test
+    task_id: Optional[int] = None  # Server task currently leasing the server
+    offset: int = 0  # Output file position where the previous lease ended
+
+
+def parse_port_list(value: str) -> List[int]:
+    """Ports of a list of ports and ranges, e.g. "5201-5204,5300" """
+    ports = set()
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        ports.update(range(int(first), int(last or first) + 1))
+    return sorted(ports)
+
+
+def read_json_documents(text: str) -> Tuple[List[Any], int]:
+    """Consecutive JSON documents in iperf3 -J server output, stopping at a
+    truncated one, and the offset in text just past the last complete one"""
+    objects = []
+    decoder = json.JSONDecoder()
+    idx = end = 0
+    while True:
+        while idx < len(text) and text[idx].isspace():
+            idx += 1
+        if idx == len(text):
+            break
+        try:
+            obj, idx = decoder.raw_decode(text, idx)
+        except json.JSONDecodeError:
+            break
+        objects.append(obj)
+        end = idx
+    return objects, end
+
+
+def split_json_documents(text: str) -> List[Any]:
+    """Consecutive JSON documents in iperf3 -J server output, stopping at a
+    truncated one"""
+    return read_json_documents(text)[0]
+
+
+def error_code(body: Any) -> Optional[str]:
+    """Error code of a Manager error body, at its top level or under detail"""
+    if isinstance(body, dict) and isinstance(body.get("detail"), dict):
+        body = body["detail"]
+    return body.get("error") if isinstance(body, dict) else None
+
+
+def rejected_for_good(status_code: Optional[int], error: Optional[str]) -> bool:
+    """Whether the Manager will turn a task event down however often it is
+    retried: the task is unknown or past taking it, a conflict, or a
+    malformed body. Other rejections (a rotated key, a version mismatch
+    during an upgrade, timeouts, rate limits) may clear up."""
+    if status_code in (409, 422):
+        return True
+    return status_code == 400 and error in ("task_not_found", "invalid_task_state")
+
+
+def pick_server_result(objects: List[Any]) -> Optional[Dict[str, Any]]:
+    """The server document to report: the first complete test, else the first
+    without an error. Anything but an object is skipped."""
+    objects = [obj for obj in objects if isinstance(obj, dict)]
+    for obj in objects:
+        if 'end' in obj and obj.get('end'):
+            return obj
+    for obj in objects:
+        if 'error' not in obj or obj.get('intervals'):
+            return obj
+    return objects[0] if objects else None
+
+
+class IperfExecutor:
+    """Spawns iperf3 processes for tasks
+
+    The default implementation runs the real iperf3 binary. Alternative
+    executors return objects implementing the subset of subprocess.Popen the
+    agent uses (pid, returncode, stderr, wait, communicate, terminate, kill).
+    """
+
+    # Whether stray iperf3 processes from earlier runs should be killed on startup
+    cleans_orphans = True
+
+    def spawn(self, cmd: List[str], stdout: Any) -> subprocess.Popen:
+        """Start cmd with stdout sent to a file object or subprocess.PIPE"""
+        return subprocess.Popen(
+            cmd,
+            stdout=stdout,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+
+    def wait_listening(self, process: Any, port: int, timeout: float) -> bool:
+        """Block until process listens on port, giving up after timeout seconds"""
+        deadline = time.monotonic() + timeout
+        try:
+            proc = psutil.Process(process.pid)
+            list_connections = getattr(proc, "net_connections", None) or proc.connections
+            while process.poll() is None:
+                if any(c.status == psutil.CONN_LISTEN and c.laddr and c.laddr.port == port
+                       for c in list_connections(kind="inet")):
+                    return True
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(0.02)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+        return False
+
+
+_fake_pids = itertools.count(4000000)
+
+
+def _parse_iperf_size(value: str, base: int = 1000) -> float:
+    """iperf3 rate (base 1000) or size (base 1024) argument, e.g. "1.5G", "128K", "100M/10" """
+    value = value.split("/")[0]
+    power = {"k": 1, "m": 2, "g": 3}.get(value[-1:].lower(), 0)
+    return float(value[:-1] if power else value) * base ** power
+
+
+class FakeIperfProcess:
+    """Popen-compatible stand-in for iperf3 that emits a synthetic -J document
+
+    Clients finish after their -t duration scaled by the timescale and append
+    the server's document for the run to the output of the fake server
+    listening on their port; servers also write one document covering the
+    elapsed time when terminated.
+    """
+
+    def __init__(self, executor: 'FakeIperfExecutor', cmd: List[str], stdout: Any):
+        self.executor = executor
+        self.args = self._parse_args(cmd)
+        self.pid = next(_fake_pids)
+        self.returncode: Optional[int] = None
+        self.stderr = io.StringIO()
+        self._stdout_path = None if stdout == subprocess.PIPE else getattr(stdout, "name", None)
+        self._stdout = ""
+        self._started = time.monotonic()
+        self._terminated = False
+        # Set once returncode is, so wait() never returns before the exit
+        self._exited = threading.Event()
+        self._lock = threading.Lock()
+
+        # Seed from the command line so the same test always yields the same output
+        seed = zlib.crc32(" ".join(cmd).encode())
+        self._random = random.Random(seed)
+        self._failure = executor.failure_mode if self._random.random() < executor.failure_rate else "none"
+        if self.args["server"] and self._stdout_path and not executor.register_server(self.args["port"], self._stdout_path):
+            self.stderr.write("iperf3: error - unable to start listener for connections: Address already in use\n")
+            self.stderr.seek(0)
+            self.returncode = 1
+            self._exited.set()
+
+    @staticmethod
+    def _parse_args(cmd: List[str]) -> Dict[str, Any]:
+        args = {"server": "-s" in cmd, "udp": "-u" in cmd, "host": None, "port": 5201,
+                "parallel": 1, "time": 10, "bitrate": None, "omit": 0, "length": None,
+                "reverse": "-R" in cmd, "bidir": "--bidir" in cmd}
+        flags = {"-c": ("host", str), "-p": ("port", int), "-P": ("parallel", int),
+                 "-t": ("time", int), "-b": ("bitrate", str), "-O": ("omit", int), "-l": ("length", str)}
+        for flag, value in zip(cmd, cmd[1:]):
+            if flag in flags:
+                key, cast = flags[flag]
+                args[key] = cast(value)
+        return args
+
+    def _finish(self, exit_code: int):
+        """Produce output exactly once, when the fake process exits"""
+        with self._lock:
+            if self.returncode is not None:
+                return
+            elapsed = (time.monotonic() - self._started) / max(self.executor.timescale, 1e-9)
+            if self._failure == "connection_refused" and not self.args["server"]:
+                self.stderr.write("iperf3: error - unable to connect to server: Connection refused\n")
+                self._stdout = json.dumps({"start": {}, "intervals": [], "end": {},
+                                           "error": "unable to connect to server: Connection refused"})
+                exit_code = 1
+            elif self._failure == "invalid_json":
+                self._stdout = '{"start": {"connected": ['
+            elif self._failure == "crash":
+                self.stderr.write("iperf3: interrupt - the server has terminated\n")
+                exit_code = 1
+            else:
+                seconds = max(1, min(int(elapsed), 3600))
+                if not self.args["server"] and not self._terminated:
+                    seconds = self.args["time"] + self.args["omit"]
+                self._stdout = json.dumps(self.executor.build_document(self.args, seconds, self._random))
+                if not self.args["server"]:
+                    self.executor.report_to_server(self.args, seconds, self._random)
+            self.stderr.seek(0)
+            if self.args["server"] and self._stdout_path:
+                self.executor.unregister_server(self.args["port"], self._stdout_path)
+
+            if self._stdout_path and self._stdout:
+                with open(self._stdout_path, "a") as f:
+                    f.write(self._stdout)
+            self.returncode = exit_code
+            self._exited.set()
+
+    def _remaining(self) -> Optional[float]:
+        if self.args["server"]:
+            return None
+        if self._failure == "connection_refused":
+            return 0.0
+        duration = (self.args["time"] + self.args["omit"]) * self.executor.timescale
+        return max(0.0, duration - (time.monotonic() - self._started))
+
+    def poll(self) -> Optional[int]:
+        remaining = self._remaining()
+        if remaining is not None and remaining <= 0:
+            self._finish(0)
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        remaining = self._remaining()
+        if remaining is not None and (timeout is None or timeout >= remaining):
+            self._exited.wait(remaining)
+            self._finish(0)
+        elif not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired("iperf3", timeout)
+        return self.returncode
+
+    def communicate(self):
+        self.wait()
+        stdout = None if self._stdout_path else self._stdout
+        return stdout, self.stderr.getvalue()
+
+    def terminate(self):
+        self._terminated = True
+        self._finish(-signal.SIGTERM if self._remaining() else 0)
+
+    def kill(self):
+        self._terminated = True
+        self._finish(-signal.SIGKILL)
+
+
+class FakeIperfExecutor(IperfExecutor):
+    """Hermetic executor producing deterministic iperf3 output without a network
+
+    timescale shrinks (or stretches) test durations, bitrate_bps sets the
+    per-stream throughput reported, and failure_mode is applied to the given
+    fraction of processes: connection_refused, invalid_json or crash.
+
+    Fake servers writing to a file record its path by port in rendezvous_dir,
+    so clients of fake agents on the same host (other processes included)
+    can append the server's side of each run, as iperf3 -s -J does. A port
+    is held by one live fake server at a time.
+    """
+
+    cleans_orphans = False
+
+    def __init__(self, timescale: float = 1.0, bitrate_bps: float = 1e9,
+                 failure_mode: str = "none", failure_rate: float = 0.0,
+                 rendezvous_dir: Optional[Path] = None):
+        self.timescale = timescale
+        self.bitrate_bps = bitrate_bps
+        self.failure_mode = failure_mode
+        self.failure_rate = failure_rate if failure_mode != "none" else 0.0
+        self.rendezvous_dir = rendezvous_dir or Path(tempfile.gettempdir()) / "iperf-fake"
+
+    def _registration(self, port: int) -> Path:
+        return self.rendezvous_dir / f"{port}.server"
+
+    def _read_registration(self, port: int) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self._registration(port).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def register_server(self, port: int, output_path: str) -> bool:
+        """Claim port for a fake server, False if a live one already holds it
+        (the host's single listener per port, as for a real bind)"""
+        self.rendezvous_dir.mkdir(parents=True, exist_ok=True)
+        holder = self._read_registration(port)
+        if holder is not None and psutil.pid_exists(holder["pid"]):
+            return False
+        self._registration(port).write_text(json.dumps({"pid": os.getpid(), "path": os.path.abspath(output_path)}))
+        return True
+
+    def unregister_server(self, port: int, output_path: str):
+        holder = self._read_registration(port)
+        if holder is not None and holder["path"] == os.path.abspath(output_path):
+            self._registration(port).unlink(missing_ok=True)
+
+    def report_to_server(self, args: Dict[str, Any], seconds: int, rng: random.Random):
+        """Append the server's document for a finished client run, if a fake
+        server is listening on its port"""
+        holder = self._read_registration(args["port"])
+        if holder is None:
+            return
+        output_path = holder["path"]
+        document = self.build_document(dict(args, server=True, host=None), seconds, rng)
+        # One write, so a reader sees the document whole or not yet
+        with open(output_path, "a") as f:
+            f.write(json.dumps(document) + "\n")
+
+    def spawn(self, cmd: List[str], stdout: Any) -> FakeIperfProcess:
+        return FakeIperfProcess(self, cmd, stdout)
+
+    def wait_listening(self, process: Any, port: int, timeout: float) -> bool:
+        return process.poll() is None
+
+    def build_document(self, args: Dict[str, Any], seconds: int, rng: random.Random) -> Dict[str, Any]:
+        """Build an iperf3 -J document for the parsed command line"""
+        udp = args["udp"]
+        streams = args["parallel"]
+        # In reverse mode the server sends
+        sender = args["server"] == args["reverse"]
+        sockets = [5 + i for i in range(streams)]
+        # -O intervals are reported but left out of the end totals
+        omit = min(args["omit"], seconds)
+        measured = max(seconds - omit, 1)
+        # -b caps each stream
+        target_bps = _parse_iperf_size(args["bitrate"]) if args["bitrate"] else 0
+        stream_bps = min(self.bitrate_bps, target_bps) if target_bps else self.bitrate_bps
+        blksize = int(_parse_iperf_size(args["length"], 1024)) if args["length"] else (1448 if udp else 131072)
+
+        def measurement(start: float, end: float, bps: float, sender: bool) -> Dict[str, Any]:
+            entry = {
+                "start": start,
+                "end": end,
+                "seconds": end - start,
+                "bytes": int(bps * (end - start) / 8),
+                "bits_per_second": bps,
+                "omitted": False,
+                "sender": sender
+            }
+            if udp:
+                packets = int(entry["bytes"] / 1448)
+                entry.update({"packets": packets, "jitter_ms": round(rng.uniform(0.005, 0.05), 3),
+                              "lost_packets": 0, "lost_percent": 0.0})
+            else:
+                entry.update({"retransmits": rng.choice([0, 0, 0, 1, 2]), "snd_cwnd": 3145728,
+                              "rtt": rng.randint(80, 400), "rttvar": rng.randint(10, 80), "pmtu": 1500})
+            return entry
+
+        def direction(sockets: List[int], sender: bool) -> Dict[str, Any]:
+            """Intervals and end sums of the streams flowing one way"""
+            interval_streams, interval_sums = [], []
+            totals = {s: 0.0 for s in sockets}
+            for second in range(seconds):
+                stream_entries = []
+                omitted = second < omit
+                for s in sockets:
+                    bps = stream_bps * rng.uniform(0.95, 1.05)
+                    if not omitted:
+                        totals[s] += bps
+                    stream_entries.append(dict(measurement(second, second + 1, bps, sender), socket=s, omitted=omitted))
+                interval_streams.append(stream_entries)
+                interval_sums.append(dict(measurement(second, second + 1, sum(e["bits_per_second"] for e in stream_entries),
+                                                      sender), omitted=omitted))
+
+            stream_ends = []
+            for s in sockets:
+                avg = totals[s] / measured
+                stream_ends.append({"sender": dict(measurement(0, measured, avg, sender), socket=s),
+                                    "receiver": dict(measurement(0, measured, avg, sender), socket=s)})
+            total_bps = sum(totals.values()) / measured
+            return {"interval_streams": interval_streams, "interval_sums": interval_sums, "streams": stream_ends,
+                    "sent": measurement(0, measured, total_bps, sender),
+                    "received": measurement(0, measured, total_bps * 0.999, sender),
+                    "sum": measurement(0, measured, total_bps, sender)}
+
+        # -P streams run each way with --bidir; the reverse half reports its
+        # sums under *_bidir_reverse keys
+        forward = direction(sockets, sender)
+        backward = direction([s + streams for s in sockets], not sender) if args["bidir"] else None
+
+        intervals = []
+        for second in range(seconds):
+            interval = {"streams": forward["interval_streams"][second], "sum": forward["interval_sums"][second]}
+            if backward:
+                interval["streams"] = interval["streams"] + backward["interval_streams"][second]
+                interval["sum_bidir_reverse"] = backward["interval_sums"][second]
+            intervals.append(interval)
+
+        end = {
+            "streams": forward["streams"] + (backward["streams"] if backward else []),
+            "sum_sent": forward["sent"],
+            "sum_received": forward["received"],
+            "cpu_utilization_percent": {"host_total": round(rng.uniform(5, 40), 2),
+                                        "remote_total": round(rng.uniform(5, 40), 2)}
+        }
+        if udp:
+            end["sum"] = forward["sum"]
+        if backward:
+            end["sum_sent_bidir_reverse"] = backward["sent"]
+            end["sum_received_bidir_reverse"] = backward["received"]
+            if udp:
+                end["sum_bidir_reverse"] = backward["sum"]
+
+        return {
+            "start": {
+                "connected": [{"socket": s, "local_host": "127.0.0.1", "local_port": 40000 + s,
+                               "remote_host": args["host"] or "127.0.0.1", "remote_port": args["port"]}
+                              for s in sockets + ([s + streams for s in sockets] if backward else [])],
+                "version": "iperf 3.16 (fake)",
+                "system_info": platform.platform(),
+                "timestamp": {"time": datetime.now(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S GMT"),
+                              "timesecs": int(time.time())},
+                "test_start": {"protocol": "UDP" if udp else "TCP", "num_streams": streams,
+                               "blksize": blksize, "omit": omit, "duration": seconds - omit,
+                               "bytes": 0, "blocks": 0, "reverse": int(args["reverse"]),
+                               "bidir": int(args["bidir"]), "target_bitrate": int(target_bps)}
+            },
+            "intervals": intervals,
+            "end": end
+        }
+
+
+class TaskTrace:
+    """Lifecycle spans for one task, reported to the Manager with its result
+
+    Built from the W3C traceparent in the task payload: the agent's root span
+    is a child of the Manager's span for the task. Times are unix nanoseconds
+    on this host's clock.
+    """
+
+    def __init__(self, trace_id: str, parent_span_id: str):
+        self.trace_id = trace_id
+        self.parent_span_id = parent_span_id
+        self.span_id = os.urandom(8).hex()
+        self.start_ns = time.time_ns()
+        self.spans: List[Dict[str, Any]] = []
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> Optional['TaskTrace']:
+        parts = str(payload.get("traceparent") or "").split("-")
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        return cls(parts[1], parts[2])
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def add(self, name: str, start_ns: int, end_ns: Optional[int] = None,
+            attributes: Optional[Dict[str, Any]] = None, parent: Optional[str] = None) -> str:
+        """Record a finished span (ending now unless end_ns is given), returning its id"""
+        span_id = os.urandom(8).hex()
+        self.spans.append({
+            "name": name,
+            "span_id": span_id,
+            "parent_span_id": parent or self.span_id,
+            "start_time_unix_nano": start_ns,
+            "end_time_unix_nano": end_ns if end_ns is not None else time.time_ns(),
+            "attributes": attributes or {}
+        })
+        return span_id
+
+    def finish(self, attributes: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """All spans, with the root span closed now"""
+        root = {
+            "name": "agent.task",
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": time.time_ns(),
+            "attributes": attributes or {}
+        }
+        return [root] + self.spans
+
+
+class TaskEventOutbox:
+    """Durable queue of started/result events awaiting delivery to the Manager
+
+    Events live in a SQLite file so they survive Manager outages and agent
+    restarts. Each event keeps the Idempotency-Key it was created with, so
+    every retry of the same event is recognisable to the Manager.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                idempotency_key TEXT NOT NULL,
+                body TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_error TEXT
+            )
+        """)
+        self.conn.commit()
+
+    def enqueue(self, task_id: int, kind: str, body: Dict[str, Any]) -> int:
+        """Persist an event and return its id"""
+        now = time.time()
+        cursor = self.conn.execute(
+            "INSERT INTO events (task_id, kind, idempotency_key, body, next_attempt_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (task_id, kind, str(uuid.uuid4()), json.dumps(body), now, now)
+        )
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def due(self, limit: int) -> List[Dict[str, Any]]:
+        """Events ready to send, oldest first.
+
+        An event is held back while an earlier event for the same task is
+        still waiting out its backoff, so started always precedes result.
+        """
+        rows = self.conn.execute(
+            "SELECT id, task_id, kind, idempotency_key, body, attempts FROM events e "
+            "WHERE next_attempt_at <= ? AND NOT EXISTS ("
+            "  SELECT 1 FROM events p WHERE p.task_id = e.task_id AND p.id < e.id AND p.next_attempt_at > ?"
+            ") ORDER BY id LIMIT ?",
+            (time.time(), time.time(), limit)
+        ).fetchall()
+        return [
+            {"id": r[0], "task_id": r[1], "kind": r[2], "idempotency_key": r[3], "body": r[4], "attempts": r[5]}
+            for r in rows
+        ]
+
+    def remove(self, event_id: int):
+        self.conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+        self.conn.commit()
+
+    def retry_later(self, event_id: int, attempts: int, delay: float, error: str):
+        self.conn.execute(
+            "UPDATE events SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+            (attempts, time.time() + delay, error[:500], event_id)
+        )
+        self.conn.commit()
+
+    def contains(self, event_id: int) -> bool:
+        return self.conn.execute("SELECT 1 FROM events WHERE id = ?", (event_id,)).fetchone() is not None
+
+    def pending(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
 class IperfAgent:
     def __init__(self, settings: AgentSettings):
         self.settings = settings
-        self.client = httpx.AsyncClient(timeout=30.0)
+
+        # One persistent client for all Manager calls: authentication and version
+        # headers are sent by default, connections are kept alive between
+        # heartbeats, and HTTP/2 is used when the h2 package is available.
+        self.client = httpx.AsyncClient(
+            base_url=settings.manager_url,
+            headers={
+                "X-AGENT-NAME": settings.agent_name,
+                "X-AGENT-KEY": settings.agent_key,
+                "X-API-Version": str(settings.api_version)
+            },
+            http2=settings.http2 and importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(
+                max_connections=20,
+                max_keepalive_connections=5,
+                keepalive_expiry=settings.keepalive_expiry
+            ),
+            timeout=30.0
+        )
+        self._local_ip: Optional[str] = None
+        self._interfaces: Optional[frozenset] = None
+        if settings.iperf_backend == "fake":
+            self.executor: IperfExecutor = FakeIperfExecutor(
+                timescale=settings.fake_timescale,
+                bitrate_bps=settings.fake_bitrate_bps,
+                failure_mode=settings.fake_failure_mode,
+                failure_rate=settings.fake_failure_rate,
+                rendezvous_dir=Path(settings.fake_rendezvous_dir) if settings.fake_rendezvous_dir else None
+            )
+        else:
+            self.executor = IperfExecutor()
         self.running_processes: Dict[int, RunningProcess] = {}
+        self.pool_ports = parse_port_list(settings.server_pool_ports)
+        self.server_pool: Dict[int, PooledServer] = {}  # Warm servers by port
         self.running_tasks: Dict[int, asyncio.Task] = {}  # Track concurrent task execution
+        self.task_traces: Dict[int, TaskTrace] = {}  # Open traces, until the task's result is queued
+        self._traceparents: "OrderedDict[int, str]" = OrderedDict()  # Sent on task event requests
         self.should_exit = False
 
-        # Create logs, results, and temp directories
+        # Create logs, results, temp, and state directories
         self.logs_dir = Path("logs")
         self.results_dir = Path("results") / settings.agent_name
         self.temp_dir = Path("temp") / settings.agent_name
+        self.state_dir = Path("state") / settings.agent_name
         self.logs_dir.mkdir(exist_ok=True)
         self.results_dir.mkdir(parents=True, exist_ok=True)
         self.temp_dir.mkdir(parents=True, exist_ok=True)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+
+        # Started/result events are queued here until the Manager accepts them
+        self.outbox = TaskEventOutbox(self.state_dir / "outbox.db")
+        self._outbox_lock = asyncio.Lock()
+        self._batch_events = True
 
         # Set up file logging
         self._setup_logging()
@@ -138,38 +783,52 @@ class IperfAgent:
         else:
             self.logger.info(log_msg)
     
+    def _interface_snapshot(self) -> Optional[frozenset]:
+        """Addresses of the interfaces that are up, used to detect changes"""
+        try:
+            stats = psutil.net_if_stats()
+            return frozenset(
+                (name, addr.address)
+                for name, addrs in psutil.net_if_addrs().items()
+                if stats.get(name) and stats[name].isup
+                for addr in addrs
+                if addr.family == socket.AF_INET
+            )
+        except Exception:
+            return None
+
     def get_local_ip(self) -> str:
-        """Get local IP address"""
+        """Get local IP address, re-resolved only when interfaces change"""
+        interfaces = self._interface_snapshot()
+        if self._local_ip and interfaces is not None and interfaces == self._interfaces:
+            return self._local_ip
+
         try:
             # Connect to a remote address to determine local IP
             with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
                 s.connect(("8.8.8.8", 80))
-                return s.getsockname()[0]
+                self._local_ip = s.getsockname()[0]
         except Exception:
-            return "127.0.0.1"
+            self._local_ip = "127.0.0.1"
+
+        self._interfaces = interfaces
+        return self._local_ip
     
     async def register(self) -> bool:
         """Register with the Manager"""
         try:
             ip_address = self.get_local_ip()
             operating_system = platform.system()
-            
-            headers = {
-                "X-AGENT-NAME": self.settings.agent_name,
-                "X-AGENT-KEY": self.settings.agent_key,
-                "X-API-Version": str(self.settings.api_version),
-                "Idempotency-Key": str(uuid.uuid4()),
-                "Content-Type": "application/json"
-            }
-            
+
             payload = {
                 "ip_address": ip_address,
-                "operating_system": operating_system
+                "operating_system": operating_system,
+                "server_pool": sorted(self.server_pool)
             }
             
             response = await self.client.post(
-                f"{self.settings.manager_url}/v1/agent/register",
-                headers=headers,
+                "/v1/agent/register",
+                headers={"Idempotency-Key": str(uuid.uuid4())},
                 json=payload
             )
             
@@ -198,14 +857,17 @@ class IperfAgent:
             })
             return False
     
-    async def heartbeat(self) -> tuple[bool, bool]:
+    async def heartbeat(self, claim: int = 0, wait: float = 0) -> tuple[bool, bool, Optional[List[Dict[str, Any]]]]:
         """
-        Send heartbeat to Manager
+        Send heartbeat to Manager, optionally claiming tasks in the same request,
+        waiting up to wait seconds for tasks when there are none yet
 
         Returns:
-            tuple[bool, bool]: (success, should_exit)
+            tuple[bool, bool, Optional[list]]: (success, should_exit, tasks)
                 - success: True if heartbeat succeeded and can pull tasks
                 - should_exit: True if agent should exit (404 or fatal error)
+                - tasks: tasks claimed by the heartbeat, or None if the Manager
+                  does not support combined claims
         """
         try:
             # Collect running processes (create a snapshot to avoid race conditions)
@@ -217,39 +879,51 @@ class IperfAgent:
                     "pid": proc.pid
                 })
 
-            headers = {
-                "X-AGENT-NAME": self.settings.agent_name,
-                "X-AGENT-KEY": self.settings.agent_key,
-                "X-API-Version": str(self.settings.api_version),
-                "Idempotency-Key": str(uuid.uuid4()),
-                "Content-Type": "application/json"
-            }
+            for server in list(self.server_pool.values()):
+                running.append({
+                    "type": "pool",
+                    "port": server.port,
+                    "pid": server.process.pid,
+                    "task_id": server.task_id
+                })
+
+            # Tasks still being worked on, for the Manager to report cancellations
+            active = set(self.running_tasks) | set(self.running_processes)
+            active.update(server.task_id for server in self.server_pool.values() if server.task_id is not None)
 
             payload = {
                 "ip_address": self.get_local_ip(),
-                "running": running
+                "running": running,
+                "tasks": sorted(active),
+                "claim": claim
             }
+            if claim and wait > 0:
+                payload["wait"] = wait
+            if self.pool_ports:
+                payload["server_pool"] = sorted(self.server_pool)
 
             response = await self.client.post(
-                f"{self.settings.manager_url}/v1/agent/heartbeat",
-                headers=headers,
+                "/v1/agent/heartbeat",
+                headers={"Idempotency-Key": str(uuid.uuid4())},
                 json=payload
             )
 
             if response.status_code == 404:
                 self.log("error", "Agent not found or disabled - must exit", {"status_code": 404})
-                return False, True  # Fail and exit immediately
+                return False, True, None  # Fail and exit immediately
 
             if response.status_code != 200:
                 self.log("error", "Heartbeat failed", {
                     "status_code": response.status_code,
                     "response": response.text
                 })
-                return False, False  # Fail but don't exit (retry)
+                return False, False, None  # Fail but don't exit (retry)
 
             result = response.json()
+            for task_id in result.get("cancel") or []:
+                await self.cancel_task(task_id)
             pull_tasks = result.get("pull_tasks", False)
-            return pull_tasks, False  # Success, don't exit
+            return pull_tasks, False, result.get("tasks")  # Success, don't exit
 
         except (httpx.ReadError, httpx.ConnectError, httpx.RemoteProtocolError) as e:
             # Transient network errors - log and retry
@@ -257,7 +931,7 @@ class IperfAgent:
                 "error": str(e),
                 "error_type": type(e).__name__
             })
-            return False, False  # Fail but don't exit (retry)
+            return False, False, None  # Fail but don't exit (retry)
 
         except Exception as e:
             # Unexpected error - log full traceback
@@ -266,23 +940,12 @@ class IperfAgent:
                 "error_type": type(e).__name__,
                 "traceback": traceback.format_exc()
             })
-            return False, False  # Fail but don't exit (retry)
+            return False, False, None  # Fail but don't exit (retry)
     
     async def claim_task(self) -> Optional[Dict[str, Any]]:
         """Claim a task from the Manager"""
         try:
-            headers = {
-                "X-AGENT-NAME": self.settings.agent_name,
-                "X-AGENT-KEY": self.settings.agent_key,
-                "X-API-Version": str(self.settings.api_version),
-                "Content-Type": "application/json"
-            }
-            
-            response = await self.client.post(
-                f"{self.settings.manager_url}/v1/agent/tasks/claim",
-                headers=headers,
-                json={}
-            )
+            response = await self.client.post("/v1/agent/tasks/claim", json={})
             
             if response.status_code == 404:
                 self.log("error", "Agent not found - must exit", {"status_code": 404})
@@ -303,92 +966,166 @@ class IperfAgent:
             return None
     
     async def mark_task_started(self, task_id: int, pid: Optional[int] = None) -> bool:
-        """Mark task as started"""
-        try:
-            headers = {
-                "X-AGENT-NAME": self.settings.agent_name,
-                "X-AGENT-KEY": self.settings.agent_key,
-                "X-API-Version": str(self.settings.api_version),
-                "Idempotency-Key": str(uuid.uuid4()),
-                "Content-Type": "application/json"
-            }
-            
-            payload = {}
-            if pid is not None:
-                payload["pid"] = pid
-            
-            response = await self.client.post(
-                f"{self.settings.manager_url}/v1/agent/tasks/{task_id}/started",
-                headers=headers,
-                json=payload
-            )
-            
-            if response.status_code == 404:
-                self.log("error", "Agent not found - must exit", {"status_code": 404})
-                return False
-            
-            if response.status_code != 200:
-                self.log("error", "Mark started failed", {
-                    "status_code": response.status_code,
-                    "response": response.text
-                })
-                return False
-            
+        """Mark task as started
+
+        The event is queued in the outbox first, so it is retried later if the
+        Manager can't be reached now. Returns False if it is still queued.
+        """
+        payload = {}
+        if pid is not None:
+            payload["pid"] = pid
+
+        event_id = self.outbox.enqueue(task_id, "started", payload)
+        await self.flush_outbox()
+        if not self.outbox.contains(event_id):
             return True
-            
-        except Exception as e:
-            self.log("error", "Mark started error", {"error": str(e)})
-            return False
+
+        self.log("warning", "Mark started not delivered, queued for retry", {"task_id": task_id})
+        return False
     
     async def submit_task_result(self, task_id: int, status: str, result: Optional[Dict] = None,
                                 stderr: str = "", exit_code: int = 0) -> bool:
         """Submit task result
 
+        The result is queued in the outbox first, so it survives Manager
+        outages and agent restarts. Returns False if it is still queued.
+
         TODO: Add gzip compression for large results to avoid 413 errors
               - Compress result JSON if size > threshold (e.g., 1MB)
               - Add Content-Encoding: gzip header
               - Backend needs to decompress on receive
         """
-        try:
-            headers = {
-                "X-AGENT-NAME": self.settings.agent_name,
-                "X-AGENT-KEY": self.settings.agent_key,
-                "X-API-Version": str(self.settings.api_version),
-                "Idempotency-Key": str(uuid.uuid4()),
-                "Content-Type": "application/json"
-            }
+        payload = {
+            "status": status,
+            "result": result,
+            "stderr": stderr,
+            "exit_code": exit_code
+        }
+        trace = self.task_traces.pop(task_id, None)
+        if trace is not None:
+            payload["spans"] = trace.finish({"iperf.task_id": task_id, "iperf.result_status": status})
 
-            payload = {
-                "status": status,
-                "result": result,
-                "stderr": stderr,
-                "exit_code": exit_code
-            }
-            
+        event_id = self.outbox.enqueue(task_id, "result", payload)
+        await self.flush_outbox()
+        if not self.outbox.contains(event_id):
+            return True
+
+        self.log("warning", "Submit result not delivered, queued for retry", {"task_id": task_id})
+        return False
+
+    async def _send_events(self, events: List[Dict[str, Any]]) -> List[Tuple[Optional[int], Optional[str]]]:
+        """Send outbox events, returning a status code (None on network error)
+        and any error code from the Manager per event"""
+        if len(events) == 1 or not self._batch_events:
+            codes = []
+            for event in events:
+                headers = {"Idempotency-Key": event["idempotency_key"], "Content-Type": "application/json"}
+                traceparent = self._traceparents.get(event["task_id"])
+                if traceparent:
+                    headers["traceparent"] = traceparent
+                try:
+                    response = await self.client.post(
+                        f"/v1/agent/tasks/{event['task_id']}/{event['kind']}",
+                        headers=headers,
+                        content=event["body"]
+                    )
+                    error = None
+                    if response.status_code >= 400:
+                        self.log("warning", "Task event rejected", {
+                            "task_id": event["task_id"],
+                            "kind": event["kind"],
+                            "status_code": response.status_code,
+                            "response": response.text[:500]
+                        })
+                        try:
+                            error = error_code(response.json())
+                        except ValueError:
+                            pass
+                    codes.append((response.status_code, error))
+                except httpx.HTTPError as e:
+                    self.log("warning", "Task event delivery error", {"task_id": event["task_id"], "error": str(e)})
+                    codes.append((None, None))
+            return codes
+
+        # Splice the stored bodies into the batch without re-parsing them
+        items = ",".join(
+            '{"task_id": %d, "kind": %s, "idempotency_key": %s, "body": %s}'
+            % (e["task_id"], json.dumps(e["kind"]), json.dumps(e["idempotency_key"]), e["body"])
+            for e in events
+        )
+        try:
             response = await self.client.post(
-                f"{self.settings.manager_url}/v1/agent/tasks/{task_id}/result",
-                headers=headers,
-                json=payload
+                "/v1/agent/tasks/events",
+                headers={"Content-Type": "application/json"},
+                content='{"events": [' + items + ']}'
             )
-            
-            if response.status_code == 404:
-                self.log("error", "Agent not found - must exit", {"status_code": 404})
-                return False
-            
-            if response.status_code != 200:
-                self.log("error", "Submit result failed", {
-                    "status_code": response.status_code,
-                    "response": response.text
+        except httpx.HTTPError as e:
+            self.log("warning", "Task event batch delivery error", {"events": len(events), "error": str(e)})
+            return [(None, None)] * len(events)
+
+        if response.status_code == 404:
+            # Either the agent is gone or the Manager predates batch uploads;
+            # sending individually tells the two apart
+            self._batch_events = False
+            codes = await self._send_events(events)
+            self._batch_events = not any(code is not None and code < 300 for code, _ in codes)
+            return codes
+
+        if response.status_code != 200:
+            self.log("warning", "Task event batch failed", {
+                "status_code": response.status_code,
+                "response": response.text[:500]
+            })
+            # The batch as a whole was turned away; its events may still be accepted
+            return [(response.status_code, None)] * len(events)
+
+        return [(r["status_code"], error_code(r.get("detail"))) for r in response.json()["results"]]
+
+    async def flush_outbox(self):
+        """Deliver due outbox events in batches"""
+        async with self._outbox_lock:
+            while True:
+                events = self.outbox.due(self.settings.outbox_batch_size)
+                if not events:
+                    break
+
+                codes = await self._send_events(events)
+                retry = False
+                for event, (code, error) in zip(events, codes):
+                    if code is not None and code < 300:
+                        self.outbox.remove(event["id"])
+                    elif rejected_for_good(code, error):
+                        # The Manager will never accept this event (e.g. task already terminal)
+                        self.log("warning", "Dropping undeliverable task event", {
+                            "task_id": event["task_id"],
+                            "kind": event["kind"],
+                            "status_code": code,
+                            "error": error
+                        })
+                        self.outbox.remove(event["id"])
+                    else:
+                        attempts = event["attempts"] + 1
+                        delay = min(self.settings.outbox_max_backoff_seconds, 2 ** (attempts - 1))
+                        self.outbox.retry_later(event["id"], attempts, delay, f"status {code}")
+                        retry = True
+
+                if retry or len(events) < self.settings.outbox_batch_size:
+                    break
+
+    async def _outbox_worker(self):
+        """Retry queued task events, including ones left over from a previous run"""
+        while True:
+            try:
+                await self.flush_outbox()
+            except Exception as e:
+                self.log("error", "Outbox flush error", {
+                    "error": str(e),
+                    "error_type": type(e).__name__,
+                    "traceback": traceback.format_exc()
                 })
-                return False
-            
-            return True
-            
-        except Exception as e:
-            self.log("error", "Submit result error", {"error": str(e)})
-            return False
+            await asyncio.sleep(1)
 
-    async def _capture_and_submit_server_result(self, task_id: int, process: subprocess.Popen, port: int, output_file: Path):
+    async def _capture_and_submit_server_result(self, task_id: int, process: Any, port: int, output_file: Path):
         """Capture server output from file and submit as result update"""
         try:
             # Wait for process to terminate
@@ -411,42 +1148,13 @@ class IperfAgent:
                     stderr = stderr_data
 
             # Try to parse JSON output (may contain multiple JSON objects)
+            submitted = False
             if stdout and stdout.strip():
                 try:
-                    # iperf3 server with -J may output multiple JSON objects
-                    # Parse all objects and take the first complete one (has test data)
-                    json_objects = []
-                    decoder = json.JSONDecoder()
-                    idx = 0
-                    stdout_stripped = stdout.strip()
-
-                    while idx < len(stdout_stripped):
-                        try:
-                            obj, end_idx = decoder.raw_decode(stdout_stripped, idx)
-                            json_objects.append(obj)
-                            idx = end_idx
-                            # Skip whitespace
-                            while idx < len(stdout_stripped) and stdout_stripped[idx].isspace():
-                                idx += 1
-                        except json.JSONDecodeError:
-                            break
-
-                    # Find the best result (prefer objects with 'end' field and actual data)
-                    result = None
-                    for obj in json_objects:
-                        if 'end' in obj and obj.get('end'):
-                            # This is a complete test result
-                            result = obj
-                            break
-
-                    # If no complete result found, use the first non-error object
-                    if not result and json_objects:
-                        for obj in json_objects:
-                            if 'error' not in obj or obj.get('intervals'):
-                                result = obj
-                                break
-                        if not result:
-                            result = json_objects[0]
+                    # iperf3 server with -J may output multiple JSON objects;
+                    # prefer the first complete test
+                    json_objects = split_json_documents(stdout)
+                    result = pick_server_result(json_objects)
 
                     if result:
                         # Save server result to permanent file
@@ -464,6 +1172,7 @@ class IperfAgent:
 
                         # Submit server result as an update
                         await self.submit_task_result(task_id, "succeeded", result, stderr, process.returncode or 0)
+                        submitted = True
 
                         # Clean up temp file
                         try:
@@ -493,6 +1202,10 @@ class IperfAgent:
                     "file_exists": output_file.exists()
                 })
 
+            if not submitted:
+                # Still end the task, so the Manager frees the port
+                await self.submit_task_result(task_id, "succeeded", {"started": True, "pid": process.pid}, stderr)
+
         except Exception as e:
             self.log("error", "Failed to capture server result", {
                 "task_id": task_id,
@@ -501,6 +1214,104 @@ class IperfAgent:
                 "traceback": traceback.format_exc()
             })
 
+    async def _spawn_pooled_server(self, port: int) -> Optional[PooledServer]:
+        """Start a pool server on port and wait until it listens"""
+        output_file = self.temp_dir / f"pool_{port}.json"
+        cmd = self.build_iperf_command("iperf_server_start", {"port": port})
+        with open(output_file, 'w') as stdout_f:
+            process = self.executor.spawn(cmd, stdout_f)
+        listening = await asyncio.get_event_loop().run_in_executor(
+            None, self.executor.wait_listening, process, port, PORT_READY_TIMEOUT
+        )
+        if not listening:
+            self.log("warning", "Pool server not listening, will retry", {"port": port, "pid": process.pid})
+            process.kill()
+            return None
+
+        server = PooledServer(port=port, process=process, output_file=output_file)
+        self.server_pool[port] = server
+        self.log("info", "Pool server started", {"port": port, "pid": process.pid})
+        return server
+
+    async def _maintain_server_pool(self):
+        """Start missing pool servers and replace any that exited"""
+        for port in self.pool_ports:
+            server = self.server_pool.get(port)
+            if server is not None and server.process.poll() is None:
+                continue
+            if server is not None:
+                self.log("warning", "Pool server exited", {"port": port, "exit_code": server.process.returncode})
+                del self.server_pool[port]
+                await self._release_pooled_server(server)
+            await self._spawn_pooled_server(port)
+
+    async def _lease_pooled_server(self, task_id: int, server: PooledServer):
+        """Hand a warm pool server to a server task; it is started immediately"""
+        if server.task_id is not None:
+            # The previous test's lease was never released by a kill_all
+            await self._release_pooled_server(server)
+        # Output since the previous lease ended belongs to this one: the
+        # Manager leases the port to one test at a time, and its client may
+        # connect before this task is claimed
+        server.task_id = task_id
+
+        trace = self.task_traces.get(task_id)
+        if trace:
+            trace.add("pool_lease", time.time_ns(), attributes={"iperf.port": server.port, "iperf.pid": server.process.pid})
+        await self.mark_task_started(task_id, server.process.pid)
+        self.log("info", "Pool server leased", {"task_id": task_id, "port": server.port, "pid": server.process.pid})
+
+    async def _release_pooled_server(self, server: PooledServer):
+        """End a lease, submitting the server output written during it as the
+        task's result. The server keeps listening for the next lease."""
+        task_id, server.task_id = server.task_id, None
+        if task_id is None:
+            return
+
+        def read_lease_output():
+            with open(server.output_file, 'rb') as f:
+                f.seek(server.offset)
+                return f.read()
+
+        try:
+            data = await asyncio.get_event_loop().run_in_executor(None, read_lease_output)
+            text = data.decode("utf-8", errors="surrogateescape")
+            json_objects, end = read_json_documents(text)
+            # A document still being written belongs to the next lease; it
+            # is read again from its start then
+            server.offset += len(text[:end].encode("utf-8", errors="surrogateescape"))
+            result = pick_server_result(json_objects)
+            if result is None:
+                self.log("warning", "Pool server produced no output during lease", {
+                    "task_id": task_id,
+                    "port": server.port
+                })
+                # Still end the task, so the Manager frees the port
+                await self.submit_task_result(task_id, "succeeded", {"started": True, "pid": server.process.pid, "pooled": True})
+                return
+
+            timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+            result_file = self.results_dir / f"task_{task_id}_server_{timestamp}.json"
+            with open(result_file, 'w') as f:
+                json.dump(result, f, indent=2)
+
+            self.log("info", "Server result captured", {
+                "task_id": task_id,
+                "port": server.port,
+                "result_file": str(result_file),
+                "json_objects_found": len(json_objects),
+                "pooled": True
+            })
+            await self.submit_task_result(task_id, "succeeded", result)
+
+        except Exception as e:
+            self.log("error", "Failed to capture pooled server result", {
+                "task_id": task_id,
+                "port": server.port,
+                "error": str(e),
+                "traceback": traceback.format_exc()
+            })
+
     def build_iperf_command(self, task_type: str, payload: Dict[str, Any]) -> List[str]:
         """Build iperf3 command based on task type and payload"""
         if task_type == "iperf_server_start":
@@ -518,7 +1329,17 @@ class IperfAgent:
                 "-J"  # JSON output
             ]
             if payload.get("udp", False):
-                cmd.extend(["-u", "-b", "0"])  # UDP with unlimited bandwidth
+                cmd.append("-u")
+            # UDP defaults to unlimited bandwidth instead of iperf3's 1 Mbit/s
+            bitrate = payload.get("bitrate") or ("0" if payload.get("udp", False) else None)
+            if bitrate is not None:
+                cmd.extend(["-b", str(bitrate)])
+            for option, flag in CLIENT_TUNING_FLAGS.items():
+                value = payload.get(option)
+                if value is True:
+                    cmd.append(flag)
+                elif value is not None and value is not False:
+                    cmd.extend([flag, str(value)])
             return cmd
         
         else:
@@ -536,12 +1357,20 @@ class IperfAgent:
             "payload": payload
         })
 
+        trace = TaskTrace.from_payload(payload)
+        if trace is not None:
+            self.task_traces[task_id] = trace
+            self._traceparents[task_id] = trace.traceparent
+            while len(self._traceparents) > MAX_TRACEPARENTS:
+                self._traceparents.popitem(last=False)
+
         try:
             if task_type == "iperf_server_start":
                 await self._execute_server_task(task_id, payload)
             elif task_type == "iperf_client_run":
                 await self._execute_client_task(task_id, payload)
-            elif task_type == "kill_all":
+            elif task_type in ("kill_all", "iperf_server_stop"):
+                # A server stop is a kill scoped to one server task
                 await self._execute_kill_all_task(task_id, payload)
             else:
                 self.log("error", "Unknown task type", {"task_type": task_type})
@@ -558,21 +1387,27 @@ class IperfAgent:
             await self.submit_task_result(task_id, "failed", stderr=f"{type(e).__name__}: {str(e)}\n{error_trace}", exit_code=1)
     
     async def _execute_server_task(self, task_id: int, payload: Dict[str, Any]):
-        """Execute server task"""
+        """Execute server task, leasing a warm pool server when the Manager
+        assigned a pooled port"""
         try:
+            server = self.server_pool.get(payload["port"]) if payload.get("pooled") else None
+            if server is not None and server.process.poll() is None:
+                await self._lease_pooled_server(task_id, server)
+                return
+
             cmd = self.build_iperf_command("iperf_server_start", payload)
 
             # Create output file for server stdout
             output_file = self.temp_dir / f"server_task_{task_id}.json"
 
+            trace = self.task_traces.get(task_id)
+
             # Start server process with stdout redirected to file
+            spawn_ns = time.time_ns()
             with open(output_file, 'w') as stdout_f:
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=stdout_f,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
+                process = self.executor.spawn(cmd, stdout_f)
+            if trace:
+                trace.add("spawn", spawn_ns, attributes={"iperf.pid": process.pid})
 
             # Store process info with output file path
             self.running_processes[task_id] = RunningProcess(
@@ -584,9 +1419,20 @@ class IperfAgent:
                 output_file=output_file
             )
 
+            # Report started once clients can connect
+            ready_ns = time.time_ns()
+            listening = await asyncio.get_event_loop().run_in_executor(
+                None, self.executor.wait_listening, process, payload["port"], PORT_READY_TIMEOUT
+            )
+            if trace:
+                trace.add("port_ready", ready_ns, attributes={"iperf.port": payload["port"], "iperf.listening": listening})
+
             # Mark as started
             await self.mark_task_started(task_id, process.pid)
 
+            # The task stays running until the Manager stops it (iperf_server_stop
+            # once its client has finished, or kill_all); the captured output
+            # is then submitted as its result
             self.log("info", "Server task started", {
                 "task_id": task_id,
                 "pid": process.pid,
@@ -594,9 +1440,6 @@ class IperfAgent:
                 "output_file": str(output_file)
             })
 
-            # For server tasks, mark as succeeded immediately (v1 behavior)
-            await self.submit_task_result(task_id, "succeeded", {"started": True, "pid": process.pid})
-
         except Exception as e:
             self.log("error", "Server task error", {"task_id": task_id, "error": str(e)})
             await self.submit_task_result(task_id, "failed", stderr=str(e), exit_code=1)
@@ -605,6 +1448,7 @@ class IperfAgent:
         """Execute client task with retry logic"""
         max_retries = payload.get("max_retries", 3)
         retry_delay = payload.get("retry_delay_seconds", 2)
+        trace = self.task_traces.get(task_id)
 
         for attempt in range(max_retries):
             try:
@@ -613,7 +1457,10 @@ class IperfAgent:
                     delay = payload.get("client_delay_seconds", 3)
                     if delay > 0:
                         self.log("info", "Client initial delay", {"task_id": task_id, "delay": delay})
+                        delay_ns = time.time_ns()
                         await asyncio.sleep(delay)
+                        if trace:
+                            trace.add("client_delay", delay_ns, attributes={"iperf.delay_seconds": delay})
                 elif attempt > 0:
                     # Exponential backoff for retries
                     backoff = retry_delay * (2 ** (attempt - 1))
@@ -622,7 +1469,10 @@ class IperfAgent:
                         "attempt": attempt + 1,
                         "delay": backoff
                     })
+                    backoff_ns = time.time_ns()
                     await asyncio.sleep(backoff)
+                    if trace:
+                        trace.add("retry_backoff", backoff_ns, attributes={"iperf.attempt": attempt + 1})
 
                 cmd = self.build_iperf_command("iperf_client_run", payload)
 
@@ -636,12 +1486,10 @@ class IperfAgent:
                 })
 
                 # Start client process
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
+                spawn_ns = time.time_ns()
+                process = self.executor.spawn(cmd, subprocess.PIPE)
+                if trace:
+                    trace.add("spawn", spawn_ns, attributes={"iperf.attempt": attempt + 1, "iperf.pid": process.pid})
 
                 # Store process info
                 self.running_processes[task_id] = RunningProcess(
@@ -670,6 +1518,12 @@ class IperfAgent:
                 stdout, stderr = await asyncio.get_event_loop().run_in_executor(
                     None, process.communicate
                 )
+                exit_ns = time.time_ns()
+                attempt_span = None
+                if trace:
+                    attempt_span = trace.add("attempt", spawn_ns, exit_ns, attributes={
+                        "iperf.attempt": attempt + 1, "iperf.exit_code": process.returncode
+                    })
 
                 # Remove from running processes
                 if task_id in self.running_processes:
@@ -679,6 +1533,8 @@ class IperfAgent:
                 if process.returncode == 0:
                     try:
                         result = json.loads(stdout)
+                        if trace:
+                            self._trace_client_phases(trace, attempt_span, spawn_ns, exit_ns, result)
 
                         # Save result to file
                         timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
@@ -748,13 +1604,89 @@ class IperfAgent:
                     await self.submit_task_result(task_id, "failed", stderr=str(e), exit_code=1)
                     return
     
+    @staticmethod
+    def _trace_client_phases(trace: TaskTrace, parent: Optional[str], spawn_ns: int, exit_ns: int,
+                             result: Dict[str, Any]):
+        """connect, first_interval and run spans for a finished client, from its -J document
+
+        iperf3 only timestamps the test start to the second, so the connection
+        is placed one reported test duration before the process exited.
+        """
+        end = result.get("end") or {}
+        total = end.get("sum_sent") or end.get("sum") or {}
+        try:
+            duration_ns = int(float(total["end"]) * 1e9)
+        except (KeyError, TypeError, ValueError):
+            return
+
+        connected_ns = min(max(spawn_ns, exit_ns - duration_ns), exit_ns)
+        trace.add("connect", spawn_ns, connected_ns, parent=parent)
+
+        intervals = result.get("intervals") or []
+        try:
+            first_ns = int(float(intervals[0]["sum"]["end"]) * 1e9)
+            trace.add("first_interval", connected_ns, min(connected_ns + first_ns, exit_ns), parent=parent)
+        except (IndexError, KeyError, TypeError, ValueError):
+            pass
+
+        trace.add("run", connected_ns, exit_ns, parent=parent)
+
+    async def cancel_task(self, task_id: int):
+        """Stop a task the Manager canceled: its coroutine, process and any
+        pool lease. No result is reported; the task is already terminal."""
+        stopped = False
+        running = self.running_tasks.get(task_id)
+        if running is not None and not running.done():
+            # Before terminating, so the client's retry loop never sees the exit
+            running.cancel()
+            stopped = True
+
+        proc = self.running_processes.pop(task_id, None)
+        if proc is not None:
+            proc.process.terminate()
+            try:
+                await asyncio.wait_for(
+                    asyncio.get_event_loop().run_in_executor(None, proc.process.wait),
+                    timeout=5
+                )
+            except asyncio.TimeoutError:
+                proc.process.kill()
+            stopped = True
+
+        for server in self.server_pool.values():
+            if server.task_id == task_id:
+                # Drop the lease's output; the next lease starts after it
+                server.task_id = None
+                server.offset = server.output_file.stat().st_size
+                stopped = True
+
+        self.task_traces.pop(task_id, None)
+        if stopped:
+            self.log("info", "Task canceled by Manager", {
+                "task_id": task_id,
+                "pid": proc.pid if proc else None
+            })
+
     async def _execute_kill_all_task(self, task_id: int, payload: Dict[str, Any]):
-        """Execute kill_all task"""
+        """Execute kill_all task
+
+        With "task_ids" in the payload only those tasks' processes are killed
+        (the Manager scopes kills to one exercise); without, every process is.
+        """
         try:
             killed_count = 0
             server_result_tasks = []
+            scope = set(payload["task_ids"]) if payload.get("task_ids") is not None else None
+
+            # Stop in-scope tasks still being worked on first, so a killed
+            # client is not retried and a delayed one never starts
+            for other_id, running in list(self.running_tasks.items()):
+                if other_id != task_id and (scope is None or other_id in scope) and not running.done():
+                    running.cancel()
 
             for proc in list(self.running_processes.values()):
+                if scope is not None and proc.task_id not in scope:
+                    continue
                 try:
                     # Terminate the process
                     proc.process.terminate()
@@ -796,9 +1728,13 @@ class IperfAgent:
                         "pid": proc.pid,
                         "error": str(e)
                     })
+                finally:
+                    self.running_processes.pop(proc.task_id, None)
 
-            # Clear all running processes
-            self.running_processes.clear()
+            # Pool servers keep running; their leases end with the exercise
+            for server in list(self.server_pool.values()):
+                if server.task_id is not None and (scope is None or server.task_id in scope):
+                    server_result_tasks.append(asyncio.create_task(self._release_pooled_server(server)))
 
             # Wait for all server result captures to complete (with timeout)
             if server_result_tasks:
@@ -813,8 +1749,12 @@ class IperfAgent:
                         "pending_captures": len(server_result_tasks)
                     })
 
-            await self.submit_task_result(task_id, "succeeded", {"killed": True, "count": killed_count})
-            self.log("info", "Kill all completed", {"task_id": task_id, "killed_count": killed_count})
+            await self.submit_task_result(task_id, "succeeded", {
+                "killed": True, "count": killed_count, "exercise_id": payload.get("exercise_id")
+            })
+            self.log("info", "Kill all completed", {
+                "task_id": task_id, "killed_count": killed_count, "exercise_id": payload.get("exercise_id")
+            })
 
         except Exception as e:
             self.log("error", "Kill all error", {"task_id": task_id, "error": str(e)})
@@ -863,25 +1803,38 @@ class IperfAgent:
         """Main agent loop"""
         self.log("info", "Starting agent", {
             "agent_name": self.settings.agent_name,
-            "manager_url": self.settings.manager_url
+            "manager_url": self.settings.manager_url,
+            "iperf_backend": self.settings.iperf_backend
         })
 
         # Clean up any leftover temp files from previous runs
         try:
-            for temp_file in self.temp_dir.glob("server_task_*.json"):
+            for temp_file in [*self.temp_dir.glob("server_task_*.json"), *self.temp_dir.glob("pool_*.json")]:
                 temp_file.unlink()
                 self.log("info", "Cleaned up temp file", {"file": str(temp_file)})
         except Exception as e:
             self.log("warning", "Failed to clean up temp files", {"error": str(e)})
 
         # Clean up any orphaned iperf3 processes from previous runs
-        await self._cleanup_orphaned_iperf_processes()
+        if self.executor.cleans_orphans:
+            await self._cleanup_orphaned_iperf_processes()
+
+        # Warm the server pool before registering, so the Manager can lease it right away
+        if self.pool_ports:
+            await self._maintain_server_pool()
+            self.log("info", "Server pool ready", {"ports": sorted(self.server_pool), "configured": len(self.pool_ports)})
 
         # Register with manager
         if not await self.register():
             self.log("error", "Registration failed - exiting")
             return
 
+        # Replay events queued by a previous run, then keep retrying in the background
+        pending_events = self.outbox.pending()
+        if pending_events:
+            self.log("info", "Replaying queued task events", {"count": pending_events})
+        outbox_worker = asyncio.create_task(self._outbox_worker())
+
         # Main loop with failure tracking
         consecutive_failures = 0
         max_consecutive_failures = 3
@@ -896,8 +1849,17 @@ class IperfAgent:
                 for task_id in completed_task_ids:
                     del self.running_tasks[task_id]
 
-                # Send heartbeat
-                pull_tasks, should_exit = await self.heartbeat()
+                # Replace pool servers that exited
+                if self.pool_ports:
+                    await self._maintain_server_pool()
+
+                # Send heartbeat, claiming tasks in the same request; it returns
+                # as soon as tasks are queued, or after the interval
+                iteration_started = time.monotonic()
+                pull_tasks, should_exit, claimed = await self.heartbeat(
+                    claim=self.settings.tasks_per_heartbeat,
+                    wait=self.settings.heartbeat_interval_seconds
+                )
 
                 if should_exit:
                     # Fatal error (404 - agent disabled)
@@ -932,27 +1894,33 @@ class IperfAgent:
                         })
                     consecutive_failures = 0
 
-                # Claim and execute tasks if needed (claim multiple for concurrent execution)
-                if pull_tasks:
-                    # Try to claim up to 5 tasks at once for concurrent execution
-                    for _ in range(5):
+                # Execute tasks claimed by the heartbeat; older Managers don't
+                # return tasks, so fall back to claiming them one at a time
+                if pull_tasks and claimed is None:
+                    claimed = []
+                    for _ in range(self.settings.tasks_per_heartbeat):
                         task = await self.claim_task()
-                        if task:
-                            # Execute task in background (non-blocking)
-                            task_id = task["id"]
-                            if task_id not in self.running_tasks:
-                                async_task = asyncio.create_task(self.execute_task(task))
-                                self.running_tasks[task_id] = async_task
-                                self.log("info", "Task started in background", {
-                                    "task_id": task_id,
-                                    "total_running": len(self.running_tasks)
-                                })
-                        else:
+                        if not task:
                             # No more tasks available
                             break
+                        claimed.append(task)
+
+                for task in claimed or []:
+                    # Execute task in background (non-blocking)
+                    task_id = task["id"]
+                    if task_id not in self.running_tasks:
+                        async_task = asyncio.create_task(self.execute_task(task))
+                        self.running_tasks[task_id] = async_task
+                        self.log("info", "Task started in background", {
+                            "task_id": task_id,
+                            "total_running": len(self.running_tasks)
+                        })
 
-                # Wait before next iteration
-                await asyncio.sleep(5)
+                # Wait out the rest of the interval; Managers that don't hold
+                # heartbeats answer at once, leaving the whole interval
+                await asyncio.sleep(max(
+                    0.0, self.settings.heartbeat_interval_seconds - (time.monotonic() - iteration_started)
+                ))
 
             except Exception as e:
                 self.log("error", "Main loop error", {
@@ -1034,6 +2002,13 @@ class IperfAgent:
                 except asyncio.TimeoutError:
                     self.log("warning", "Server result capture timed out on shutdown")
 
+        # Submit open pool leases, then stop the pool servers
+        if self.server_pool:
+            for server in list(self.server_pool.values()):
+                await self._release_pooled_server(server)
+                server.process.terminate()
+            self.server_pool.clear()
+
         # Wait for any running tasks to complete
         if self.running_tasks:
             self.log("info", "Waiting for running tasks to complete", {
@@ -1041,6 +2016,20 @@ class IperfAgent:
             })
             await asyncio.gather(*self.running_tasks.values(), return_exceptions=True)
 
+        # Last delivery attempt; anything left is replayed on next start
+        outbox_worker.cancel()
+        try:
+            await outbox_worker
+        except asyncio.CancelledError:
+            pass
+        try:
+            await asyncio.wait_for(self.flush_outbox(), timeout=10)
+        except Exception as e:
+            self.log("warning", "Final outbox flush failed", {"error": str(e)})
+        if self.outbox.pending():
+            self.log("warning", "Task events left in outbox for next start", {"count": self.outbox.pending()})
+        self.outbox.close()
+
         await self.client.aclose()
 
 
@@ -1088,6 +2077,23 @@ Note: CLI arguments take precedence over .env file settings.
         help="API version (default: from .env or 1)"
     )
 
+    parser.add_argument(
+        "--iperf-backend",
+        choices=["iperf3", "fake"],
+        help="Process backend: real iperf3 binary or synthetic fake (default: from .env or iperf3)"
+    )
+
+    parser.add_argument(
+        "--fake-timescale",
+        type=float,
+        help="Duration multiplier for the fake backend, e.g. 0.1 runs a 30s test in 3s"
+    )
+
+    parser.add_argument(
+        "--server-pool-ports",
+        help="Ports to keep warm iperf3 servers on, e.g. 5201-5208 (default: from .env, none)"
+    )
+
     return parser.parse_args()
 
 
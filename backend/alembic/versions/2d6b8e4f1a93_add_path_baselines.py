@@ -0,0 +1,59 @@
+"""Add path baseline and regression tables
+
+Revision ID: 2d6b8e4f1a93
+Revises: 9c3e5a1d7f28
+Create Date: 2026-10-19 19:02:41.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d6b8e4f1a93'
+down_revision = '9c3e5a1d7f28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_all() may already have added the tables on fresh databases
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS path_baselines (
+            id INTEGER NOT NULL PRIMARY KEY,
+            server_agent_id INTEGER NOT NULL REFERENCES agents(id),
+            client_agent_id INTEGER NOT NULL REFERENCES agents(id),
+            protocol VARCHAR NOT NULL,
+            parallel INTEGER NOT NULL,
+            sample_count INTEGER NOT NULL,
+            window JSON NOT NULL,
+            stats JSON NOT NULL,
+            updated_at DATETIME NOT NULL,
+            CONSTRAINT uq_path_baseline_signature UNIQUE (server_agent_id, client_agent_id, protocol, parallel)
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_path_baselines_id ON path_baselines(id)")
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS path_regressions (
+            id INTEGER NOT NULL PRIMARY KEY,
+            baseline_id INTEGER NOT NULL REFERENCES path_baselines(id),
+            exercise_id INTEGER NOT NULL REFERENCES exercises(id),
+            test_id INTEGER NOT NULL REFERENCES tests(id),
+            task_id INTEGER NOT NULL REFERENCES tasks(id),
+            metric VARCHAR NOT NULL,
+            value FLOAT NOT NULL,
+            median FLOAT NOT NULL,
+            mad FLOAT NOT NULL,
+            score FLOAT NOT NULL,
+            detected_at DATETIME NOT NULL
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_path_regressions_id ON path_regressions(id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_path_regressions_baseline_id ON path_regressions(baseline_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_path_regressions_exercise_id ON path_regressions(exercise_id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS path_regressions")
+    op.execute("DROP TABLE IF EXISTS path_baselines")
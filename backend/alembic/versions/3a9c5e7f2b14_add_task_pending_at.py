@@ -0,0 +1,27 @@
+"""Add pending_at column to tasks
+
+Revision ID: 3a9c5e7f2b14
+Revises: 8d2f4c6a1e07
+Create Date: 2026-10-19 14:26:03.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a9c5e7f2b14'
+down_revision = '8d2f4c6a1e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_all() may already have added the column on fresh databases
+    columns = [c["name"] for c in sa.inspect(op.get_bind()).get_columns("tasks")]
+    if "pending_at" not in columns:
+        op.add_column('tasks', sa.Column('pending_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('tasks', 'pending_at')
@@ -0,0 +1,41 @@
+"""Add exercise result cache table and exercises.result_version
+
+Revision ID: 4f8a2c6e9b13
+Revises: 7e1b3d9f4a62
+Create Date: 2026-10-19 17:21:09.604538
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f8a2c6e9b13'
+down_revision = '7e1b3d9f4a62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_all() may already have added the column and table on fresh databases
+    columns = [c["name"] for c in sa.inspect(op.get_bind()).get_columns("exercises")]
+    if "result_version" not in columns:
+        op.add_column('exercises', sa.Column('result_version', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS exercise_result_cache (
+            id INTEGER NOT NULL PRIMARY KEY,
+            exercise_id INTEGER NOT NULL REFERENCES exercises(id),
+            kind VARCHAR NOT NULL,
+            version INTEGER NOT NULL,
+            body TEXT NOT NULL,
+            created_at DATETIME NOT NULL,
+            CONSTRAINT uq_exercise_result_cache_kind UNIQUE (exercise_id, kind)
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_exercise_result_cache_id ON exercise_result_cache(id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS exercise_result_cache")
+    op.drop_column('exercises', 'result_version')
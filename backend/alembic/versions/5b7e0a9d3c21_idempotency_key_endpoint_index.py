@@ -0,0 +1,36 @@
+"""Unique idempotency keys per endpoint and created_at index for expiry
+
+Revision ID: 5b7e0a9d3c21
+Revises: c1c4e9f12260
+Create Date: 2026-10-19 09:12:40.518224
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e0a9d3c21'
+down_revision = 'c1c4e9f12260'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Keys were globally unique; make them unique per endpoint instead.
+    # IF NOT EXISTS because create_all() may already have built these indexes.
+    op.execute("DROP INDEX IF EXISTS ix_idempotency_log_key")
+    op.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_idempotency_key_endpoint
+        ON idempotency_log(key, endpoint)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_idempotency_log_created_at
+        ON idempotency_log(created_at)
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_idempotency_log_created_at")
+    op.execute("DROP INDEX IF EXISTS uq_idempotency_key_endpoint")
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_idempotency_log_key ON idempotency_log(key)")
@@ -0,0 +1,41 @@
+"""Add agent pair stats table
+
+Revision ID: 6a1f3c8d5e27
+Revises: 2d6b8e4f1a93
+Create Date: 2026-10-19 20:14:55.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a1f3c8d5e27'
+down_revision = '2d6b8e4f1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_all() may already have added the table on fresh databases
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS agent_pair_stats (
+            id INTEGER NOT NULL PRIMARY KEY,
+            client_agent_id INTEGER NOT NULL REFERENCES agents(id),
+            server_agent_id INTEGER NOT NULL REFERENCES agents(id),
+            protocol VARCHAR NOT NULL,
+            count INTEGER NOT NULL,
+            last_task_id INTEGER REFERENCES tasks(id),
+            last_result_at DATETIME,
+            stats JSON NOT NULL,
+            sketches JSON NOT NULL,
+            updated_at DATETIME NOT NULL,
+            CONSTRAINT uq_agent_pair_stats_pair UNIQUE (client_agent_id, server_agent_id, protocol)
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_agent_pair_stats_id ON agent_pair_stats(id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_agent_pair_stats_updated_at ON agent_pair_stats(updated_at)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS agent_pair_stats")
@@ -0,0 +1,41 @@
+"""Add task_spans table for lifecycle tracing
+
+Revision ID: 7e1b3d9f4a62
+Revises: 3a9c5e7f2b14
+Create Date: 2026-10-19 16:02:47.930115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e1b3d9f4a62'
+down_revision = '3a9c5e7f2b14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # IF NOT EXISTS because create_all() may already have built the table
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS task_spans (
+            id INTEGER NOT NULL PRIMARY KEY,
+            task_id INTEGER NOT NULL REFERENCES tasks(id),
+            trace_id VARCHAR NOT NULL,
+            span_id VARCHAR NOT NULL,
+            parent_span_id VARCHAR,
+            name VARCHAR NOT NULL,
+            source VARCHAR NOT NULL,
+            start_time DATETIME NOT NULL,
+            end_time DATETIME NOT NULL,
+            attributes JSON NOT NULL
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_task_spans_id ON task_spans(id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_task_spans_task_id ON task_spans(task_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_task_spans_trace_id ON task_spans(trace_id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS task_spans")
@@ -0,0 +1,28 @@
+"""Add summary column to tasks
+
+Revision ID: 8d2f4c6a1e07
+Revises: 5b7e0a9d3c21
+Create Date: 2026-10-19 11:04:17.293651
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f4c6a1e07'
+down_revision = '5b7e0a9d3c21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_all() may already have added the column on fresh databases.
+    # Existing rows are summarised lazily from their stored result.
+    columns = [c["name"] for c in sa.inspect(op.get_bind()).get_columns("tasks")]
+    if "summary" not in columns:
+        op.add_column('tasks', sa.Column('summary', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('tasks', 'summary')
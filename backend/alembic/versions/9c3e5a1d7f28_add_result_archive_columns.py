@@ -0,0 +1,30 @@
+"""Add tasks.archived_result and exercises.archived_at for cold storage
+
+Revision ID: 9c3e5a1d7f28
+Revises: 4f8a2c6e9b13
+Create Date: 2026-10-19 18:40:12.377961
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3e5a1d7f28'
+down_revision = '4f8a2c6e9b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_all() may already have added the columns on fresh databases
+    inspector = sa.inspect(op.get_bind())
+    if "archived_result" not in [c["name"] for c in inspector.get_columns("tasks")]:
+        op.add_column('tasks', sa.Column('archived_result', sa.JSON(), nullable=True))
+    if "archived_at" not in [c["name"] for c in inspector.get_columns("exercises")]:
+        op.add_column('exercises', sa.Column('archived_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('exercises', 'archived_at')
+    op.drop_column('tasks', 'archived_result')
@@ -0,0 +1,29 @@
+"""Add queued_at to exercises
+
+Revision ID: a4e8c2f6d317
+Revises: f5c2d8e6a914
+Create Date: 2026-10-20 09:12:05.418236
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4e8c2f6d317'
+down_revision = 'f5c2d8e6a914'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_all() may already have added the column on fresh databases
+    columns = [c["name"] for c in sa.inspect(op.get_bind()).get_columns("exercises")]
+    if "queued_at" not in columns:
+        op.add_column('exercises', sa.Column('queued_at', sa.DateTime(), nullable=True))
+    # Exercises started before scheduling count as queued when they started
+    op.execute("UPDATE exercises SET queued_at = started_at WHERE queued_at IS NULL AND started_at IS NOT NULL")
+
+
+def downgrade() -> None:
+    op.drop_column('exercises', 'queued_at')
@@ -0,0 +1,39 @@
+"""Add change counters and agent_pair_stats.version
+
+Revision ID: a9d3f6b2c851
+Revises: e8c3f1a7b296
+Create Date: 2026-10-21 10:12:47.381650
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3f6b2c851'
+down_revision = 'e8c3f1a7b296'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_all() may already have added the table and column on fresh databases
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS change_counters (
+            name VARCHAR NOT NULL PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+    columns = [c["name"] for c in sa.inspect(op.get_bind()).get_columns("agent_pair_stats")]
+    if "version" not in columns:
+        op.add_column('agent_pair_stats', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+    op.execute("CREATE INDEX IF NOT EXISTS ix_agent_pair_stats_version ON agent_pair_stats(version)")
+    # Cached matrices sync by version now, not by updated_at
+    op.execute("DROP INDEX IF EXISTS ix_agent_pair_stats_updated_at")
+
+
+def downgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS ix_agent_pair_stats_updated_at ON agent_pair_stats(updated_at)")
+    op.execute("DROP INDEX IF EXISTS ix_agent_pair_stats_version")
+    op.drop_column('agent_pair_stats', 'version')
+    op.execute("DROP TABLE IF EXISTS change_counters")
@@ -0,0 +1,100 @@
+"""Add iperf3 tuning options to tests and tuning_key to path baselines
+
+Revision ID: b7d4e2a9c615
+Revises: 6a1f3c8d5e27
+Create Date: 2026-10-19 21:07:33.541870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d4e2a9c615'
+down_revision = '6a1f3c8d5e27'
+branch_labels = None
+depends_on = None
+
+
+TUNING_COLUMNS = [
+    ('zerocopy', sa.Boolean(), {"nullable": False, "server_default": "0"}),
+    ('window', sa.String(), {"nullable": True}),
+    ('buffer_length', sa.String(), {"nullable": True}),
+    ('omit_seconds', sa.Integer(), {"nullable": True}),
+    ('congestion', sa.String(), {"nullable": True}),
+    ('mss', sa.Integer(), {"nullable": True}),
+    ('bitrate', sa.String(), {"nullable": True}),
+    ('fq_rate', sa.String(), {"nullable": True}),
+    ('reverse', sa.Boolean(), {"nullable": False, "server_default": "0"}),
+    ('bidir', sa.Boolean(), {"nullable": False, "server_default": "0"}),
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    # create_all() may already have added the columns on fresh databases
+    columns = [c["name"] for c in inspector.get_columns("tests")]
+    for name, type_, kwargs in TUNING_COLUMNS:
+        if name not in columns:
+            op.add_column('tests', sa.Column(name, type_, **kwargs))
+
+    # The signature constraint gains tuning_key, and SQLite cannot alter
+    # constraints, so the table is copied into a new one
+    columns = [c["name"] for c in inspector.get_columns("path_baselines")]
+    if "tuning_key" not in columns:
+        op.execute("""
+            CREATE TABLE path_baselines_new (
+                id INTEGER NOT NULL PRIMARY KEY,
+                server_agent_id INTEGER NOT NULL REFERENCES agents(id),
+                client_agent_id INTEGER NOT NULL REFERENCES agents(id),
+                protocol VARCHAR NOT NULL,
+                parallel INTEGER NOT NULL,
+                tuning_key VARCHAR NOT NULL DEFAULT '',
+                sample_count INTEGER NOT NULL,
+                window JSON NOT NULL,
+                stats JSON NOT NULL,
+                updated_at DATETIME NOT NULL,
+                CONSTRAINT uq_path_baseline_signature UNIQUE (server_agent_id, client_agent_id, protocol, parallel, tuning_key)
+            )
+        """)
+        op.execute("""
+            INSERT INTO path_baselines_new
+                (id, server_agent_id, client_agent_id, protocol, parallel, tuning_key, sample_count, window, stats, updated_at)
+            SELECT id, server_agent_id, client_agent_id, protocol, parallel, '', sample_count, window, stats, updated_at
+            FROM path_baselines
+        """)
+        op.execute("DROP TABLE path_baselines")
+        op.execute("ALTER TABLE path_baselines_new RENAME TO path_baselines")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_path_baselines_id ON path_baselines(id)")
+
+
+def downgrade() -> None:
+    op.execute("""
+        CREATE TABLE path_baselines_old (
+            id INTEGER NOT NULL PRIMARY KEY,
+            server_agent_id INTEGER NOT NULL REFERENCES agents(id),
+            client_agent_id INTEGER NOT NULL REFERENCES agents(id),
+            protocol VARCHAR NOT NULL,
+            parallel INTEGER NOT NULL,
+            sample_count INTEGER NOT NULL,
+            window JSON NOT NULL,
+            stats JSON NOT NULL,
+            updated_at DATETIME NOT NULL,
+            CONSTRAINT uq_path_baseline_signature UNIQUE (server_agent_id, client_agent_id, protocol, parallel)
+        )
+    """)
+    # Tuned baselines have no place in the old signature
+    op.execute("DELETE FROM path_regressions WHERE baseline_id IN (SELECT id FROM path_baselines WHERE tuning_key != '')")
+    op.execute("""
+        INSERT INTO path_baselines_old
+            (id, server_agent_id, client_agent_id, protocol, parallel, sample_count, window, stats, updated_at)
+        SELECT id, server_agent_id, client_agent_id, protocol, parallel, sample_count, window, stats, updated_at
+        FROM path_baselines WHERE tuning_key = ''
+    """)
+    op.execute("DROP TABLE path_baselines")
+    op.execute("ALTER TABLE path_baselines_old RENAME TO path_baselines")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_path_baselines_id ON path_baselines(id)")
+
+    for name, _, _ in reversed(TUNING_COLUMNS):
+        op.drop_column('tests', name)
@@ -0,0 +1,37 @@
+"""Add task and exercise priority, and the claim index
+
+Revision ID: c6f1a9e3b742
+Revises: a4e8c2f6d317
+Create Date: 2026-10-20 11:47:22.903615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6f1a9e3b742'
+down_revision = 'a4e8c2f6d317'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_all() may already have added the columns on fresh databases
+    inspector = sa.inspect(op.get_bind())
+    if "priority" not in [c["name"] for c in inspector.get_columns("tasks")]:
+        op.add_column('tasks', sa.Column('priority', sa.Integer(), nullable=False, server_default='100'))
+    if "priority" not in [c["name"] for c in inspector.get_columns("exercises")]:
+        op.add_column('exercises', sa.Column('priority', sa.Integer(), nullable=False, server_default='100'))
+    # Cleanup is claimed ahead of runs (PRIORITY_CONTROL)
+    op.execute("UPDATE tasks SET priority = 0 WHERE type = 'kill_all'")
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_tasks_claim
+        ON tasks(agent_id, status, priority, created_at)
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_tasks_claim")
+    op.drop_column('exercises', 'priority')
+    op.drop_column('tasks', 'priority')
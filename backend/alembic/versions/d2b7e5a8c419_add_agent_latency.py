@@ -0,0 +1,27 @@
+"""Add latency estimates to agents
+
+Revision ID: d2b7e5a8c419
+Revises: c6f1a9e3b742
+Create Date: 2026-10-20 15:06:38.274901
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2b7e5a8c419'
+down_revision = 'c6f1a9e3b742'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_all() may already have added the column on fresh databases
+    columns = [c["name"] for c in sa.inspect(op.get_bind()).get_columns("agents")]
+    if "latency" not in columns:
+        op.add_column('agents', sa.Column('latency', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('agents', 'latency')
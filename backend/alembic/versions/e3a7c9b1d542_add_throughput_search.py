@@ -0,0 +1,51 @@
+"""Add throughput search columns to tests and search trials table
+
+Revision ID: e3a7c9b1d542
+Revises: b7d4e2a9c615
+Create Date: 2026-10-19 21:52:16.308417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a7c9b1d542'
+down_revision = 'b7d4e2a9c615'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    # create_all() may already have added the columns and table on fresh databases
+    columns = [c["name"] for c in inspector.get_columns("tests")]
+    if "search" not in columns:
+        op.add_column('tests', sa.Column('search', sa.JSON(), nullable=True))
+    if "search_state" not in columns:
+        op.add_column('tests', sa.Column('search_state', sa.JSON(), nullable=True))
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS search_trials (
+            id INTEGER NOT NULL PRIMARY KEY,
+            test_id INTEGER NOT NULL REFERENCES tests(id) ON DELETE CASCADE,
+            trial INTEGER NOT NULL,
+            task_id INTEGER NOT NULL REFERENCES tasks(id),
+            bitrate_bps FLOAT NOT NULL,
+            bps_avg FLOAT,
+            loss_pct FLOAT,
+            passed BOOLEAN,
+            finished_at DATETIME,
+            CONSTRAINT uq_search_trial UNIQUE (test_id, trial)
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_search_trials_id ON search_trials(id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_search_trials_test_id ON search_trials(test_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_search_trials_task_id ON search_trials(task_id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS search_trials")
+    op.drop_column('tests', 'search_state')
+    op.drop_column('tests', 'search')
@@ -0,0 +1,41 @@
+"""Add worker_leases and notifications tables
+
+Revision ID: e8c3f1a7b296
+Revises: d2b7e5a8c419
+Create Date: 2026-10-20 16:42:11.508317
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8c3f1a7b296'
+down_revision = 'd2b7e5a8c419'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_all() may already have added the tables on fresh databases
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS worker_leases (
+            name VARCHAR NOT NULL PRIMARY KEY,
+            holder VARCHAR NOT NULL,
+            acquired_at DATETIME NOT NULL,
+            expires_at DATETIME NOT NULL
+        )
+    """)
+    # AUTOINCREMENT: IDs are read in order and must not be reused after a purge
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            channel VARCHAR NOT NULL,
+            created_at DATETIME NOT NULL
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_notifications_created_at ON notifications(created_at)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS notifications")
+    op.execute("DROP TABLE IF EXISTS worker_leases")
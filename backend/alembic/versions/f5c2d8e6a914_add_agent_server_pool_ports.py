@@ -0,0 +1,27 @@
+"""Add server_pool_ports to agents
+
+Revision ID: f5c2d8e6a914
+Revises: e3a7c9b1d542
+Create Date: 2026-10-19 22:31:47.120594
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5c2d8e6a914'
+down_revision = 'e3a7c9b1d542'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_all() may already have added the column on fresh databases
+    columns = [c["name"] for c in sa.inspect(op.get_bind()).get_columns("agents")]
+    if "server_pool_ports" not in columns:
+        op.add_column('agents', sa.Column('server_pool_ports', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('agents', 'server_pool_ports')
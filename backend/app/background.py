@@ -2,18 +2,46 @@ import asyncio
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app.database import SessionLocal, begin_write
 from app.models.agent import Agent
 from app.models.task import Task
 from app.models.port_reservation import PortReservation
 from app.models.exercise import Exercise
 from app.models.test import Test
+from app.services.idempotency import purge_expired
+from app.services.archive import archive_due, compact_database
+from app.services.deadlines import sweep_deadlines
+from app.services.cancellation import exercise_kill_tasks
+from app.services.scheduler import schedule
+from app.services.leader import BACKGROUND_LEASE, WORKER_ID, acquire_lease, leadership, release_lease
+from app.services.notifications import purge_notifications, read_new, wake
+from app.config import settings
+from app import metrics, profiling
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 # Thread pool executor for database operations
 executor = ThreadPoolExecutor(max_workers=4)
+# Lease renewals and notification reads, kept clear of long job passes
+coordination_executor = ThreadPoolExecutor(max_workers=1)
+
+
+async def _run_job(job: str, fn) -> None:
+    """Run one job pass in the thread pool, recording its duration. Passes
+    are skipped unless this worker holds the background lease."""
+    if not leadership.held():
+        return
+    loop = asyncio.get_event_loop()
+    start = time.perf_counter()
+    try:
+        await loop.run_in_executor(executor, profiling.run_profiled, f"job {job}", fn)
+    except Exception:
+        metrics.background_job_failures.inc(labels=(job,))
+        raise
+    finally:
+        metrics.background_job_duration.labels(job).observe(time.perf_counter() - start)
 
 
 def _run_offline_marker():
@@ -40,8 +68,7 @@ async def offline_marker():
     await asyncio.sleep(0.5)  # Stagger start time
     while True:
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(executor, _run_offline_marker)
+            await _run_job("offline_marker", _run_offline_marker)
         except Exception as e:
             logger.error(f"Error in offline_marker: {e}")
 
@@ -52,38 +79,24 @@ def _run_timeout_sweeper():
     """Database operation for timeout_sweeper (runs in thread pool)"""
     db = SessionLocal()
     try:
-        # Find running client tasks that have exceeded their time
-        running_tasks = db.query(Task).filter(
-            Task.type == "iperf_client_run",
-            Task.status == "running",
-            Task.started_at.isnot(None)
-        ).all()
-
-        for task in running_tasks:
-            if task.started_at:
-                # Get time from payload
-                time_seconds = task.payload.get("time", 30)
-                # Use proportional grace period: 10% of test duration or minimum 30 seconds
-                grace_seconds = max(30, int(time_seconds * 0.1))
-                timeout_time = task.started_at + timedelta(seconds=time_seconds + grace_seconds)
-
-                if datetime.utcnow() > timeout_time:
-                    task.status = "timed_out"
-                    task.finished_at = datetime.utcnow()
-                    logger.info(f"Task {task.id} timed out after {time_seconds}s + {grace_seconds}s grace")
-
+        swept = sweep_deadlines(db)
         db.commit()
+
+        for task in swept["timed_out"]:
+            logger.info(f"Task {task.id} ({task.type}) passed its deadline, marked timed_out")
+        for task in swept["stopped"]:
+            logger.info(f"Stopping server task {task.payload['task_ids'][0]}: its client has finished")
     finally:
         db.close()
 
 
 async def timeout_sweeper():
-    """Mark client tasks as timed_out if exceeded duration + grace"""
+    """Time out accepted/running tasks past their deadline and stop servers
+    whose clients have finished"""
     await asyncio.sleep(1.0)  # Stagger start time
     while True:
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(executor, _run_timeout_sweeper)
+            await _run_job("timeout_sweeper", _run_timeout_sweeper)
         except Exception as e:
             logger.error(f"Error in timeout_sweeper: {e}")
 
@@ -132,8 +145,7 @@ async def reservation_cleanup():
     await asyncio.sleep(1.5)  # Stagger start time
     while True:
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(executor, _run_reservation_cleanup)
+            await _run_job("reservation_cleanup", _run_reservation_cleanup)
         except Exception as e:
             logger.error(f"Error in reservation_cleanup: {e}")
 
@@ -182,22 +194,8 @@ def _run_exercise_auto_ender():
             all_terminal = all(task.status in terminal_states for task in all_tasks)
 
             if all_terminal:
-                # Get all agents involved in this exercise
-                agent_ids = set()
-                for test in tests:
-                    agent_ids.add(test.server_agent_id)
-                    agent_ids.add(test.client_agent_id)
-
-                # Create kill_all tasks for each agent to clean up iperf processes
-                for agent_id in agent_ids:
-                    kill_task = Task(
-                        type="kill_all",
-                        agent_id=agent_id,
-                        status="pending",
-                        payload={},
-                        created_at=datetime.utcnow()
-                    )
-                    db.add(kill_task)
+                # Clean up this exercise's iperf processes on each agent
+                exercise_kill_tasks(db, exercise.id, tests)
 
                 # Release all port reservations for this exercise
                 for test in tests:
@@ -214,33 +212,186 @@ def _run_exercise_auto_ender():
                 logger.info(f"Auto-ended exercise {exercise.id} ({exercise.name}) - all tasks completed, cleanup initiated")
 
         db.commit()
+
+        # Start queued exercises whose agents are now free
+        begin_write(db)
+        for exercise in schedule(db):
+            logger.info(f"Started queued exercise {exercise.id} ({exercise.name})")
+        db.commit()
     finally:
         db.close()
 
 
 async def exercise_auto_ender():
-    """Automatically end exercises when all tasks are in terminal states"""
+    """Automatically end exercises when all tasks are in terminal states, then
+    start queued exercises whose agents are free"""
     await asyncio.sleep(2.0)  # Stagger start time
     while True:
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(executor, _run_exercise_auto_ender)
+            await _run_job("exercise_auto_ender", _run_exercise_auto_ender)
         except Exception as e:
             logger.error(f"Error in exercise_auto_ender: {e}")
 
         await asyncio.sleep(5)  # Run every 5 seconds
 
 
+def _run_idempotency_purge():
+    """Database operation for idempotency_purge (runs in thread pool)"""
+    db = SessionLocal()
+    try:
+        deleted = purge_expired(db)
+        if deleted > 0:
+            logger.info(f"Purged {deleted} expired idempotency records")
+    finally:
+        db.close()
+
+
+async def idempotency_purge():
+    """Delete Idempotency-Key records older than the configured TTL"""
+    await asyncio.sleep(2.5)  # Stagger start time
+    while True:
+        try:
+            await _run_job("idempotency_purge", _run_idempotency_purge)
+        except Exception as e:
+            logger.error(f"Error in idempotency_purge: {e}")
+
+        await asyncio.sleep(300)  # Run every 5 minutes
+
+
+def _run_archiver():
+    """Database operation for archiver (runs in thread pool)"""
+    db = SessionLocal()
+    try:
+        if settings.archive_after_days > 0:
+            archived = archive_due(db, settings.archive_batch_exercises)
+            if archived["exercises"] > 0:
+                logger.info(f"Archived {archived['results']} results from {archived['exercises']} exercises")
+    finally:
+        db.close()
+
+    compacted = compact_database()
+    if compacted.get("pages_freed"):
+        logger.info(f"Returned {compacted['pages_freed']} free pages to the filesystem")
+    elif compacted.get("free_pages") and not compacted.get("incremental"):
+        logger.info(f"{compacted['free_pages']} free pages; run VACUUM once to enable incremental vacuum")
+
+
+async def archiver():
+    """Move old results to cold storage, then vacuum and checkpoint the database"""
+    await asyncio.sleep(3.0)  # Stagger start time
+    while True:
+        try:
+            await _run_job("archiver", _run_archiver)
+        except Exception as e:
+            logger.error(f"Error in archiver: {e}")
+
+        await asyncio.sleep(settings.archive_interval_seconds)
+
+
+def _run_leader_election():
+    """Database operation for leader_election (runs in thread pool)"""
+    db = SessionLocal()
+    try:
+        attempted_at = time.monotonic()
+        was_leader = leadership.held()
+        if acquire_lease(db, BACKGROUND_LEASE, WORKER_ID, settings.leader_lease_seconds):
+            leadership.held_until = attempted_at + settings.leader_lease_seconds
+            if not was_leader:
+                logger.info(f"Worker {WORKER_ID} took the background lease; running background jobs")
+        elif was_leader:
+            leadership.held_until = 0.0
+            logger.warning(f"Worker {WORKER_ID} lost the background lease; background jobs paused")
+    finally:
+        db.close()
+
+
+async def leader_election():
+    """Take or renew the background lease, so exactly one worker runs jobs"""
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            await loop.run_in_executor(coordination_executor, _run_leader_election)
+        except Exception as e:
+            # The lease lapses on its own if renewals keep failing
+            logger.error(f"Error in leader_election: {e}")
+
+        await asyncio.sleep(settings.leader_lease_seconds / 3)
+
+
+def release_leadership():
+    """Hand the background lease back on shutdown, so another worker takes
+    over at its next attempt instead of after the lease expires"""
+    if not leadership.held():
+        return
+    leadership.held_until = 0.0
+    db = SessionLocal()
+    try:
+        release_lease(db, BACKGROUND_LEASE, WORKER_ID)
+    finally:
+        db.close()
+
+
+def _run_notification_listener():
+    """Database operation for notification_listener (runs in thread pool)"""
+    db = SessionLocal()
+    try:
+        return read_new(db)
+    finally:
+        db.close()
+
+
+async def notification_listener():
+    """Wake this worker's waiting heartbeats for tasks queued by any worker"""
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            wake(await loop.run_in_executor(coordination_executor, _run_notification_listener))
+        except Exception as e:
+            logger.error(f"Error in notification_listener: {e}")
+
+        await asyncio.sleep(settings.notify_poll_seconds)
+
+
+def _run_notification_purge():
+    """Database operation for notification_purge (runs in thread pool)"""
+    db = SessionLocal()
+    try:
+        purge_notifications(db)
+    finally:
+        db.close()
+
+
+async def notification_purge():
+    """Delete notifications every worker has read"""
+    await asyncio.sleep(3.5)  # Stagger start time
+    while True:
+        try:
+            await _run_job("notification_purge", _run_notification_purge)
+        except Exception as e:
+            logger.error(f"Error in notification_purge: {e}")
+
+        await asyncio.sleep(60)  # Run every 60 seconds
+
+
 async def start_background_tasks():
-    """Start all background tasks"""
+    """Start all background tasks.
+
+    Every worker runs leader_election and notification_listener; the jobs
+    only do work in the worker holding the background lease.
+    """
     logger.info("Starting background tasks")
 
     # Start all background tasks
     tasks = [
+        asyncio.create_task(leader_election()),
+        asyncio.create_task(notification_listener()),
         asyncio.create_task(offline_marker()),
         asyncio.create_task(timeout_sweeper()),
         asyncio.create_task(reservation_cleanup()),
-        asyncio.create_task(exercise_auto_ender())
+        asyncio.create_task(exercise_auto_ender()),
+        asyncio.create_task(idempotency_purge()),
+        asyncio.create_task(archiver()),
+        asyncio.create_task(notification_purge())
     ]
 
     # Wait for all tasks (they run forever)
@@ -18,6 +18,64 @@ class Settings(BaseSettings):
     # API Settings
     api_version: int = 1
     
+    # Idempotency-Key replay: how long responses are kept and how many stay in memory
+    idempotency_ttl_seconds: int = 86400
+    idempotency_cache_size: int = 4096
+
+    # Append each finished task's trace to this file as OTLP JSON lines (off when unset)
+    trace_export_path: Optional[str] = None
+
+    # Opt-in SQL profiling: per-request statement counts, DB time and repeated
+    # statements, with requests/statements over these thresholds logged
+    sql_profiling: bool = False
+    sql_slow_request_ms: float = 100.0
+    sql_slow_request_statements: int = 30
+    sql_slow_query_ms: float = 50.0
+    sql_duplicate_threshold: int = 3
+
+    # In-memory budget for rendered responses of ended exercises (also kept in the DB)
+    result_cache_bytes: int = 64 * 1024 * 1024
+
+    # Cold storage: results of exercises ended this many days ago move to
+    # compressed files in archive_dir (0 disables archiving)
+    archive_after_days: int = 30
+    archive_dir: str = "./archive"
+    archive_codec: str = "auto"  # auto (zstd when installed), zstd, gzip
+    archive_interval_seconds: int = 3600
+    archive_batch_exercises: int = 20
+    # Freed pages returned to the filesystem per maintenance pass (4 KiB each)
+    vacuum_pages_per_pass: int = 25600
+
+    # Path baselines: the most recent baseline_window client results per test
+    # signature; a result is flagged once baseline_min_samples are in and its
+    # robust z-score reaches regression_threshold in the worse direction
+    baseline_window: int = 50
+    baseline_min_samples: int = 10
+    regression_threshold: float = 3.5
+
+    # Task deadlines: grace past a task's expected end follows each agent's
+    # observed latency (mean + 4 deviations), clamped to this range
+    task_grace_min_seconds: float = 5.0
+    task_grace_max_seconds: float = 300.0
+
+    # Weight of the newest result in each agent pair's EWMA
+    pair_stats_ewma_alpha: float = 0.2
+
+    # A running exercise holds its agents, so exercises sharing an agent
+    # queue instead of overlapping (false starts every exercise at once)
+    scheduler_exclusive_agents: bool = True
+    # A queued exercise ends less urgent (higher priority number) running
+    # exercises holding its agents instead of waiting for them
+    scheduler_preempt: bool = False
+
+    # Several workers: one leader, holding a lease renewed every third of
+    # leader_lease_seconds, runs the background jobs; every worker checks the
+    # notifications table this often to wake its waiting heartbeats
+    leader_lease_seconds: float = 15.0
+    notify_poll_seconds: float = 0.25
+    # Longest an agent heartbeat may wait for tasks to be queued
+    heartbeat_max_wait_seconds: float = 10.0
+
     class Config:
         env_file = ".env"
 
@@ -1,26 +1,103 @@
-from sqlalchemy import create_engine, event
+from typing import Union
+from sqlalchemy import create_engine, event, text, Text
+from sqlalchemy.engine import Connection, make_url
+from sqlalchemy.types import TypeDecorator
+from starlette.requests import Request
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.config import settings
+from app import profiling
+import orjson
+import time
 
-# Create SQLite engine with WAL mode
+# Postgres advisory lock standing in for SQLite's single writer lock
+WRITE_LOCK_KEY = 0x69706572  # "iper"
+
+_is_sqlite = make_url(settings.database_url).get_backend_name() == "sqlite"
+
+# SQLite (in WAL mode) or Postgres
 engine = create_engine(
     settings.database_url,
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False} if _is_sqlite else {}
 )
 
-# Enable WAL mode for SQLite
-@event.listens_for(engine, "connect")
-def set_sqlite_pragma(dbapi_connection, connection_record):
-    cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA journal_mode=WAL")
-    cursor.close()
+if _is_sqlite:
+    # Enable WAL mode for SQLite
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # Lets the archiver shrink the file. Only takes effect on new databases,
+        # and setting it waits for the write lock, so skip it on existing ones
+        cursor.execute("PRAGMA page_count")
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
+
+def begin_write(db: Union[Session, Connection]) -> None:
+    """Take the database-wide write lock for the rest of the transaction.
+
+    Claims, scheduling passes and table creation read, then write based on
+    what they read, so they run one at a time across all workers. SQLite
+    starts the transaction with its writer lock held (BEGIN IMMEDIATE);
+    Postgres takes an advisory lock, released on commit or rollback.
+    """
+    dialect = (db.get_bind() if isinstance(db, Session) else db).dialect.name
+    if dialect == "sqlite":
+        db.execute(text("BEGIN IMMEDIATE"))
+    elif dialect == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": WRITE_LOCK_KEY})
+
+
+if settings.sql_profiling:
+    # Time statements issued under an active QueryProfile (see app.profiling)
+    @event.listens_for(engine, "before_cursor_execute")
+    def _profile_before_execute(conn, cursor, statement, parameters, context, executemany):
+        if profiling.current_profile.get() is not None:
+            conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _profile_after_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = profiling.current_profile.get()
+        starts = conn.info.get("profile_start")
+        if profile is not None and starts:
+            profile.record(statement, time.perf_counter() - starts.pop())
+
+
+class RawJSON(TypeDecorator):
+    """JSON column stored and loaded as undecoded text.
+
+    Binds accept already-encoded JSON (str/bytes) verbatim and encode anything
+    else with orjson; loads return the stored JSON text without parsing it, so
+    large documents can be passed through to responses untouched.
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value).decode("utf-8")
+        return orjson.dumps(value).decode("utf-8")
+
+    def process_result_value(self, value, dialect):
+        return value
+
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
-def get_db():
+def get_db(request: Request):
+    # Agent protocol requests get their session from ProtocolMiddleware,
+    # which opened it to authenticate the agent and closes it afterwards
+    scoped = request.scope.get("db")
+    if scoped is not None:
+        yield scoped
+        return
+
     db = SessionLocal()
     try:
         yield db
@@ -5,24 +5,31 @@ from contextlib import asynccontextmanager
 import asyncio
 import logging
 
-from app.database import engine, Base
-from app.middleware.version import version_middleware
-from app.routers import auth, agents, exercises, tasks, agent
-from app.background import start_background_tasks
+from app.database import begin_write, engine, Base
+from app.middleware.protocol import ProtocolMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.profiling import SQLProfilingMiddleware
+from app.routers import auth, agents, exercises, tasks, agent, metrics, profiling, export, baselines, matrix
+from app.config import settings
+from app.background import release_leadership, start_background_tasks
+from app.responses import ORJSONResponse
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
     logger.info("Starting up...")
     
-    # Create database tables
-    Base.metadata.create_all(bind=engine)
+    # Create database tables, holding the write lock so workers starting
+    # together don't race to create the same table
+    with engine.connect() as connection:
+        begin_write(connection)
+        Base.metadata.create_all(bind=connection)
+        connection.commit()
     logger.info("Database tables created")
     
     # Start background tasks
@@ -38,6 +45,7 @@ async def lifespan(app: FastAPI):
         await background_task
     except asyncio.CancelledError:
         pass
+    release_leadership()
     logger.info("Background tasks stopped")
 
 
@@ -46,7 +54,8 @@ app = FastAPI(
     title="Iperf Orchestrator API",
     description="Distributed iperf3 orchestration platform",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -58,8 +67,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add version middleware
-app.middleware("http")(version_middleware)
+# Add API version / agent auth middleware (raw ASGI, outermost)
+app.add_middleware(ProtocolMiddleware)
+
+# Opt-in per-request SQL profiling, wrapping agent auth's queries too
+if settings.sql_profiling:
+    app.add_middleware(SQLProfilingMiddleware)
+
+# Per-route latency and SQL statement counts (raw ASGI, wraps everything)
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(auth.router)
@@ -67,6 +83,11 @@ app.include_router(agents.router)
 app.include_router(exercises.router)
 app.include_router(tasks.router)
 app.include_router(agent.router)
+app.include_router(metrics.router)
+app.include_router(profiling.router)
+app.include_router(export.router)
+app.include_router(baselines.router)
+app.include_router(matrix.router)
 
 
 @app.get("/healthz")
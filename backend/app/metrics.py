@@ -0,0 +1,211 @@
+"""Prometheus text-format metrics.
+
+Metrics are plain dicts and lists mutated without locks: every update happens
+on the event loop thread (request handlers, middleware and the async side of
+the background loops), so there is nothing to contend on. Work done in the
+executor reports back through the awaiting coroutine.
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from app.database import engine
+
+# Exposition format served by GET /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WAIT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+BYTES_BUCKETS = (1024, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, labels: Tuple[str, ...] = ()) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, labels: Tuple[str, ...] = ()) -> None:
+        self._values[labels] = value
+
+    def replace(self, samples: Dict[Tuple[str, ...], float]) -> None:
+        """Swap in a fresh sample set, dropping label sets that disappeared"""
+        self._values = samples
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children: Dict[Tuple[str, ...], _HistogramChild] = {}
+
+    def labels(self, *values: str) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> bytes:
+    """All registered metrics in Prometheus text exposition format"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode()
+
+
+# Per-request SQL statement count; set by MetricsMiddleware, bumped by the
+# engine hook below for statements issued from that request's context
+statement_count: ContextVar[Optional[List[int]]] = ContextVar("statement_count", default=None)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = statement_count.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+http_request_duration = Histogram(
+    "iperf_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+db_statements_per_request = Histogram(
+    "iperf_db_statements_per_request",
+    "SQL statements executed while serving one request",
+    ("method", "route"),
+    buckets=COUNT_BUCKETS
+)
+task_transition_seconds = Histogram(
+    "iperf_task_transition_seconds",
+    "Time tasks spend between lifecycle states",
+    ("transition", "type"),
+    buckets=WAIT_BUCKETS
+)
+background_job_duration = Histogram(
+    "iperf_background_job_duration_seconds",
+    "Run time of one background job pass",
+    ("job",)
+)
+background_job_failures = Counter(
+    "iperf_background_job_failures_total",
+    "Background job passes that raised",
+    ("job",)
+)
+tasks_by_status = Gauge(
+    "iperf_tasks",
+    "Non-terminal tasks by status and agent (refreshed on scrape)",
+    ("status", "agent")
+)
+exercises_by_state = Gauge(
+    "iperf_exercises",
+    "Exercises waiting for agents (queued) or running (refreshed on scrape)",
+    ("state",)
+)
+agent_heartbeat_lag = Gauge(
+    "iperf_agent_heartbeat_lag_seconds",
+    "Seconds since each enabled agent's last heartbeat (refreshed on scrape)",
+    ("agent",)
+)
+result_ingest_bytes = Histogram(
+    "iperf_result_ingest_bytes",
+    "Size of stored task result documents",
+    ("type",),
+    buckets=BYTES_BUCKETS
+)
+path_regressions = Counter(
+    "iperf_path_regressions_total",
+    "Client results flagged against their path baseline",
+    ("metric",)
+)
@@ -1,13 +1,11 @@
+from typing import Optional
 from fastapi import Request, HTTPException, status
 from sqlalchemy.orm import Session
 from app.models.agent import Agent
 
 
-def get_agent_from_headers(request: Request, db: Session) -> Agent:
-    """Extract and validate agent from headers"""
-    agent_name = request.headers.get("X-AGENT-NAME")
-    agent_key = request.headers.get("X-AGENT-KEY")
-
+def authenticate_agent(db: Session, agent_name: Optional[str], agent_key: Optional[str]) -> Agent:
+    """Look up and validate an agent by name and registration key"""
     if not agent_name or not agent_key:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -46,3 +44,20 @@ def get_agent_from_headers(request: Request, db: Session) -> Agent:
         )
 
     return agent
+
+
+def get_agent_from_headers(request: Request, db: Session) -> Agent:
+    """Extract and validate agent from headers.
+
+    Agent protocol requests are already authenticated by ProtocolMiddleware,
+    which leaves the agent (bound to the request's session) in the scope.
+    """
+    agent = request.scope.get("agent")
+    if agent is not None:
+        return agent
+
+    return authenticate_agent(
+        db,
+        request.headers.get("X-AGENT-NAME"),
+        request.headers.get("X-AGENT-KEY")
+    )
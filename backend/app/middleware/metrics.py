@@ -0,0 +1,42 @@
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app import metrics
+
+
+class MetricsMiddleware:
+    """Raw ASGI middleware recording per-route latency and SQL statement counts.
+
+    Routes are labelled by their path template (e.g. /v1/tasks/{task_id});
+    requests that match no route share the "unmatched" label so scanners
+    cannot blow up label cardinality.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = [500]
+
+        async def send_with_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        statements = [0]
+        token = metrics.statement_count.set(statements)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.statement_count.reset(token)
+
+            route = scope.get("route")
+            route_label = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            metrics.http_request_duration.labels(method, route_label, str(status_code[0])).observe(elapsed)
+            metrics.db_statements_per_request.labels(method, route_label).observe(statements[0])
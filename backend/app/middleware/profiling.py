@@ -0,0 +1,33 @@
+import time
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app import profiling
+
+
+class SQLProfilingMiddleware:
+    """Raw ASGI middleware profiling each request's SQL (SQL_PROFILING=true).
+
+    Profiles are labelled "METHOD /route/template" like the request metrics,
+    with unmatched paths sharing one label.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Labelled by raw path until routing has resolved the template
+        profile = profiling.QueryProfile(f"{scope['method']} {scope['path']}")
+        token = profiling.current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - start
+            profiling.current_profile.reset(token)
+
+            route = scope.get("route")
+            profile.label = f"{scope['method']} {route.path if route is not None else 'unmatched'}"
+            profiling.store.finish(profile, elapsed)
@@ -0,0 +1,139 @@
+from typing import Dict, Optional
+from fastapi import HTTPException, Request, status
+from fastapi.exception_handlers import http_exception_handler
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+from app.database import SessionLocal
+from app.middleware.agent_auth import authenticate_agent
+
+# Paths exempt from the X-API-Version check
+VERSION_EXEMPT_PATHS = frozenset({"/healthz", "/metrics", "/docs", "/redoc", "/openapi.json", "/v1/auth/login"})
+
+# Agent protocol routes; register authenticates in its own handler
+AGENT_PATH_PREFIX = "/v1/agent/"
+AGENT_AUTH_EXEMPT_PATHS = frozenset({"/v1/agent/register"})
+
+_VERSION_HEADER = (b"x-api-version", str(settings.api_version).encode())
+
+
+class ProtocolMiddleware:
+    """Raw ASGI middleware for the API version check and agent auth.
+
+    Validates X-API-Version once per request and stamps it on the response.
+    For agent protocol routes it also opens the request's DB session and
+    resolves the calling agent into scope["db"] / scope["agent"], which
+    get_db() and get_agent_from_headers() pick up. The request body is never
+    read here, so large result uploads stream straight through to the route.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        # CORS preflights cannot carry X-API-Version
+        if path in VERSION_EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        headers = _headers(scope)
+        error = _check_api_version(headers.get(b"x-api-version"))
+        if error is not None:
+            await _send_error(scope, receive, send, error)
+            return
+
+        async def send_with_version(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    header for header in message.get("headers", [])
+                    if header[0].lower() != _VERSION_HEADER[0]
+                ] + [_VERSION_HEADER]
+            await send(message)
+
+        if not path.startswith(AGENT_PATH_PREFIX) or path in AGENT_AUTH_EXEMPT_PATHS:
+            await self.app(scope, receive, send_with_version)
+            return
+
+        db = SessionLocal()
+        try:
+            try:
+                agent = authenticate_agent(
+                    db,
+                    _decode(headers.get(b"x-agent-name")),
+                    _decode(headers.get(b"x-agent-key"))
+                )
+            except HTTPException as e:
+                await _send_error(scope, receive, send_with_version, e)
+                return
+
+            # End the read transaction so no pooled connection is held while
+            # the body streams in; keep the agent loaded for the handler
+            db.expire_on_commit = False
+            db.commit()
+            db.expire_on_commit = True
+
+            scope["db"] = db
+            scope["agent"] = agent
+            await self.app(scope, receive, send_with_version)
+        finally:
+            db.close()
+
+
+def _headers(scope: Scope) -> Dict[bytes, bytes]:
+    # Header names are already lower-cased by the server; first value wins
+    headers = {}
+    for name, value in scope["headers"]:
+        headers.setdefault(name, value)
+    return headers
+
+
+def _decode(value: Optional[bytes]) -> Optional[str]:
+    return value.decode("latin-1") if value is not None else None
+
+
+def _check_api_version(api_version: Optional[bytes]) -> Optional[HTTPException]:
+    """HTTPException describing a bad X-API-Version header, or None"""
+    if api_version is None:
+        return HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": "missing_version_header",
+                "message": "X-API-Version header is required",
+                "details": {"required_version": settings.api_version}
+            }
+        )
+
+    try:
+        version_num = int(api_version)
+    except ValueError:
+        return HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": "invalid_version_format",
+                "message": "X-API-Version must be a number",
+                "details": {"provided": api_version.decode("latin-1")}
+            }
+        )
+
+    if version_num != settings.api_version:
+        return HTTPException(
+            status_code=status.HTTP_426_UPGRADE_REQUIRED,
+            detail={
+                "error": "unsupported_version",
+                "message": "Unsupported API version",
+                "details": {"min": settings.api_version, "max": settings.api_version}
+            }
+        )
+    return None
+
+
+async def _send_error(scope: Scope, receive: Receive, send: Send, exc: HTTPException) -> None:
+    """Respond through the app's own exception handlers, as if a route raised exc"""
+    handlers = scope["app"].exception_handlers
+    handler = handlers.get(exc.status_code) or handlers.get(HTTPException, http_exception_handler)
+    response = await handler(Request(scope, receive), exc)
+    await response(scope, receive, send)
@@ -4,6 +4,15 @@ from .test import Test
 from .task import Task
 from .port_reservation import PortReservation
 from .idempotency_log import IdempotencyLog
+from .task_span import TaskSpan
+from .exercise_result_cache import ExerciseResultCache
+from .path_baseline import PathBaseline
+from .path_regression import PathRegression
+from .agent_pair_stats import AgentPairStats
+from .search_trial import SearchTrial
+from .worker_lease import WorkerLease
+from .notification import Notification
+from .change_counter import ChangeCounter
 
 __all__ = [
     "Agent",
@@ -11,5 +20,14 @@ __all__ = [
     "Test",
     "Task",
     "PortReservation",
-    "IdempotencyLog"
+    "IdempotencyLog",
+    "TaskSpan",
+    "ExerciseResultCache",
+    "PathBaseline",
+    "PathRegression",
+    "AgentPairStats",
+    "SearchTrial",
+    "WorkerLease",
+    "Notification",
+    "ChangeCounter"
 ]
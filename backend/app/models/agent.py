@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -15,6 +15,8 @@ class Agent(Base):
     last_heartbeat = Column(DateTime, nullable=True)
     ip_address = Column(String, nullable=True)
     operating_system = Column(String, nullable=True)
+    server_pool_ports = Column(JSON, nullable=True)  # ports with a warm iperf3 server, as last reported
+    latency = Column(JSON, nullable=True)  # observed start/upload latency estimates (see app.services.deadlines)
     
     # Relationships
     tasks = relationship("Task", back_populates="agent")
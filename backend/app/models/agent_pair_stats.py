@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, UniqueConstraint
+from app.database import Base
+
+
+class AgentPairStats(Base):
+    __tablename__ = "agent_pair_stats"
+
+    # Running statistics of succeeded client results per (client, server,
+    # protocol), maintained on ingest (see app.services.pair_stats). For
+    # server-to-client traffic (-R, --bidir) the server agent is the "client".
+    id = Column(Integer, primary_key=True, index=True)
+    client_agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False)
+    server_agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False)
+    protocol = Column(String, nullable=False)  # tcp, udp
+    count = Column(Integer, nullable=False, default=0)
+    last_task_id = Column(Integer, ForeignKey("tasks.id"), nullable=True)
+    last_result_at = Column(DateTime, nullable=True)
+    stats = Column(JSON, nullable=False, default={})  # {metric: {"last", "ewma", "p50", "p95", "min", "max", "count"}}
+    sketches = Column(JSON, nullable=False, default={})  # {metric: {"zero": n, "buckets": {index: n}}}
+    updated_at = Column(DateTime, nullable=False)
+    # pair_stats change counter value of the last write (see app.services.counters)
+    version = Column(Integer, nullable=False, default=0, server_default="0", index=True)
+
+    __table_args__ = (
+        UniqueConstraint('client_agent_id', 'server_agent_id', 'protocol', name='uq_agent_pair_stats_pair'),
+    )
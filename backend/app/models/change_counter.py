@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String
+from app.database import Base
+
+
+class ChangeCounter(Base):
+    __tablename__ = "change_counters"
+
+    # One row per counter, e.g. "pair_stats"; bumped in the transaction making
+    # the change it counts (see app.services.counters)
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
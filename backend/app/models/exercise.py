@@ -9,10 +9,14 @@ class Exercise(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, nullable=False)
     duration_seconds = Column(Integer, nullable=False, default=30)
+    priority = Column(Integer, nullable=False, default=100, server_default="100")  # lower runs first; its tasks inherit it
     created_at = Column(DateTime, nullable=False)
+    queued_at = Column(DateTime, nullable=True)  # start requested; waits for its agents (see app.services.scheduler)
     started_at = Column(DateTime, nullable=True)
     ended_at = Column(DateTime, nullable=True)
     notes = Column(Text, nullable=True)
+    archived_at = Column(DateTime, nullable=True)  # task results moved to cold storage
+    result_version = Column(Integer, nullable=False, default=0, server_default="0")  # bumped when a late result changes an ended exercise
     
     # Relationships
     tests = relationship("Test", back_populates="exercise", cascade="all, delete-orphan")
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from app.database import Base, RawJSON
+
+
+class ExerciseResultCache(Base):
+    __tablename__ = "exercise_result_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), nullable=False)
+    kind = Column(String, nullable=False)  # detail, results
+    version = Column(Integer, nullable=False)  # exercise.result_version the body was rendered at
+    body = Column(RawJSON, nullable=False)  # encoded response body, served verbatim
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('exercise_id', 'kind', name='uq_exercise_result_cache_kind'),
+    )
@@ -1,12 +1,17 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, UniqueConstraint
-from app.database import Base
+from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint
+from app.database import Base, RawJSON
 
 
 class IdempotencyLog(Base):
     __tablename__ = "idempotency_log"
     
     id = Column(Integer, primary_key=True, index=True)
-    key = Column(String, unique=True, nullable=False, index=True)
+    key = Column(String, nullable=False)
     endpoint = Column(String, nullable=False)
-    response = Column(JSON, nullable=False)
-    created_at = Column(DateTime, nullable=False)
+    response = Column(RawJSON, nullable=False)  # encoded response body, replayed verbatim
+    created_at = Column(DateTime, nullable=False, index=True)  # indexed for TTL purge
+
+    # The same key may be reused across endpoints; lookups are by (key, endpoint)
+    __table_args__ = (
+        UniqueConstraint('key', 'endpoint', name='uq_idempotency_key_endpoint'),
+    )
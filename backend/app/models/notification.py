@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from app.database import Base
+
+
+class Notification(Base):
+    __tablename__ = "notifications"
+
+    id = Column(Integer, primary_key=True)
+    channel = Column(String, nullable=False)  # e.g. "agent:12"
+    created_at = Column(DateTime, nullable=False, index=True)  # indexed for purge
+
+    # Workers read new rows by ID, so IDs must never be reused after a purge
+    __table_args__ = {"sqlite_autoincrement": True}
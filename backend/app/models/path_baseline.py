@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, UniqueConstraint
+from app.database import Base
+
+
+class PathBaseline(Base):
+    __tablename__ = "path_baselines"
+
+    # Rolling baseline for one test signature (server agent, client agent,
+    # protocol, parallel streams, tuning), updated as client results arrive
+    id = Column(Integer, primary_key=True, index=True)
+    server_agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False)
+    client_agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False)
+    protocol = Column(String, nullable=False)  # tcp, udp
+    parallel = Column(Integer, nullable=False)
+    tuning_key = Column(String, nullable=False, default="", server_default="")  # see app.services.tuning
+    sample_count = Column(Integer, nullable=False, default=0)  # results seen over the whole history
+    window = Column(JSON, nullable=False, default={})  # {metric: [most recent values, oldest first]}
+    stats = Column(JSON, nullable=False, default={})  # {metric: {"median", "mad", "n"}} over the window
+    updated_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('server_agent_id', 'client_agent_id', 'protocol', 'parallel', 'tuning_key', name='uq_path_baseline_signature'),
+    )
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from app.database import Base
+
+
+class PathRegression(Base):
+    __tablename__ = "path_regressions"
+
+    # A client result that fell outside its path's baseline
+    id = Column(Integer, primary_key=True, index=True)
+    baseline_id = Column(Integer, ForeignKey("path_baselines.id"), nullable=False, index=True)
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), nullable=False, index=True)
+    test_id = Column(Integer, ForeignKey("tests.id"), nullable=False)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
+    metric = Column(String, nullable=False)  # bps_avg, retransmits, loss_pct
+    value = Column(Float, nullable=False)
+    median = Column(Float, nullable=False)  # baseline before this result
+    mad = Column(Float, nullable=False)
+    score = Column(Float, nullable=False)  # robust z-score, positive in the worse direction
+    detected_at = Column(DateTime, nullable=False)
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, DateTime, Float, Boolean, ForeignKey, UniqueConstraint
+from app.database import Base
+
+
+class SearchTrial(Base):
+    __tablename__ = "search_trials"
+
+    # One client run of a throughput search test (see app.services.search)
+    id = Column(Integer, primary_key=True, index=True)
+    test_id = Column(Integer, ForeignKey("tests.id", ondelete="CASCADE"), nullable=False, index=True)
+    trial = Column(Integer, nullable=False)  # 1-based
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False, index=True)
+    bitrate_bps = Column(Float, nullable=False)  # offered load across all streams
+    bps_avg = Column(Float, nullable=True)
+    loss_pct = Column(Float, nullable=True)  # worst direction
+    passed = Column(Boolean, nullable=True)  # NULL until the run finishes
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('test_id', 'trial', name='uq_search_trial'),
+    )
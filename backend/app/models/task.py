@@ -1,6 +1,10 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Text, Index
 from sqlalchemy.orm import relationship
-from app.database import Base
+from app.database import Base, RawJSON
+
+# Claim order: lower priorities are handed out first, oldest first within one
+PRIORITY_CONTROL = 0  # kill_all and iperf_server_stop, so cleanup never waits behind queued runs
+PRIORITY_DEFAULT = 100
 
 
 class Task(Base):
@@ -10,13 +14,22 @@ class Task(Base):
     type = Column(String, nullable=False)  # iperf_server_start, iperf_client_run, kill_all, iperf_server_stop
     agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False, index=True)
     created_at = Column(DateTime, nullable=False)
+    pending_at = Column(DateTime, nullable=True)  # when a queued task was released; created pending otherwise
     accepted_at = Column(DateTime, nullable=True)
     started_at = Column(DateTime, nullable=True)
     finished_at = Column(DateTime, nullable=True)
     status = Column(String, nullable=False, default="pending", index=True)  # pending, accepted, running, succeeded, failed, canceled, timed_out
+    priority = Column(Integer, nullable=False, default=PRIORITY_DEFAULT, server_default=str(PRIORITY_DEFAULT))
     payload = Column(JSON, nullable=False, default={})
-    result = Column(JSON, nullable=True)
+    result = Column(RawJSON, nullable=True)  # raw iperf3 JSON text, never decoded on read
+    summary = Column(JSON, nullable=True)  # headline metrics extracted from result at ingest
+    archived_result = Column(JSON, nullable=True)  # {"file", "offset", "length", "codec"} once result moved to cold storage
     error = Column(Text, nullable=True)
+
+    # Serves the claim query (agent, pending, by priority then age) without a sort
+    __table_args__ = (
+        Index("ix_tasks_claim", "agent_id", "status", "priority", "created_at"),
+    )
     
     # Relationships
     agent = relationship("Agent", back_populates="tasks")
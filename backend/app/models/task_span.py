@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+from app.database import Base
+
+
+class TaskSpan(Base):
+    __tablename__ = "task_spans"
+
+    # Spans reported by agents plus the Manager's result upload span; the
+    # Manager's own lifecycle spans are derived from task timestamps on read
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False, index=True)
+    trace_id = Column(String, nullable=False, index=True)
+    span_id = Column(String, nullable=False)
+    parent_span_id = Column(String, nullable=True)
+    name = Column(String, nullable=False)
+    source = Column(String, nullable=False)  # agent, manager
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    attributes = Column(JSON, nullable=False, default={})
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -14,6 +14,20 @@ class Test(Base):
     udp = Column(Boolean, nullable=False, default=False)
     parallel = Column(Integer, nullable=False, default=1)  # 1-32
     time_seconds = Column(Integer, nullable=True)  # defaults to exercise duration if NULL
+    # iperf3 client tuning, NULL/false for iperf3's defaults (see app.services.tuning)
+    zerocopy = Column(Boolean, nullable=False, default=False, server_default="0")
+    window = Column(String, nullable=True)
+    buffer_length = Column(String, nullable=True)
+    omit_seconds = Column(Integer, nullable=True)
+    congestion = Column(String, nullable=True)
+    mss = Column(Integer, nullable=True)
+    bitrate = Column(String, nullable=True)
+    fq_rate = Column(String, nullable=True)
+    reverse = Column(Boolean, nullable=False, default=False, server_default="0")
+    bidir = Column(Boolean, nullable=False, default=False, server_default="0")
+    # Throughput search settings and progress, NULL for plain tests (see app.services.search)
+    search = Column(JSON, nullable=True)
+    search_state = Column(JSON, nullable=True)
     server_task_id = Column(Integer, ForeignKey("tasks.id"), nullable=True)
     client_task_id = Column(Integer, ForeignKey("tasks.id"), nullable=True)
     
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, DateTime
+from app.database import Base
+
+
+class WorkerLease(Base):
+    __tablename__ = "worker_leases"
+
+    # One row per leader role, e.g. "background"
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)  # worker ID: host:pid:random
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # another worker may take over once past
@@ -0,0 +1,215 @@
+"""Opt-in SQL profiling (SQL_PROFILING=true).
+
+Engine hooks in app.database time every statement issued while a
+QueryProfile is active. SQLProfilingMiddleware opens one per request and
+background jobs one per pass. Finished profiles are folded into per-route
+totals served by GET /v1/profiling/sql. Requests over the thresholds, and
+statements repeated within one request (N+1 loops), are logged and kept in
+short rings of recent offenders.
+
+Background jobs finish their profiles on executor threads, so the store
+takes a lock; the per-statement hooks only touch the active profile.
+"""
+import re
+import time
+import logging
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Slow requests and statements kept for the summary endpoint
+RECENT_SLOW = 50
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement: str) -> str:
+    """Statement text with whitespace and expanded IN lists collapsed"""
+    return _IN_LIST.sub("(?, ...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryProfile:
+    """Statements and DB time for one request or background job pass"""
+    __slots__ = ("label", "statements", "db_seconds", "counts")
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.counts: Counter = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.statements += 1
+        self.db_seconds += seconds
+        self.counts[statement] += 1
+        if seconds * 1000 >= settings.sql_slow_query_ms:
+            store.slow_query(self.label, statement, seconds)
+
+    def duplicated_shapes(self) -> Dict[str, int]:
+        """Shapes executed at least sql_duplicate_threshold times"""
+        shapes: Counter = Counter()
+        for statement, count in self.counts.items():
+            shapes[statement_shape(statement)] += count
+        return {shape: count for shape, count in shapes.items() if count >= settings.sql_duplicate_threshold}
+
+
+class _RouteStats:
+    __slots__ = ("requests", "statements", "statements_max", "db_seconds", "db_seconds_max", "slow")
+
+    def __init__(self):
+        self.requests = 0
+        self.statements = 0
+        self.statements_max = 0
+        self.db_seconds = 0.0
+        self.db_seconds_max = 0.0
+        self.slow = 0
+
+
+class ProfileStore:
+    """Aggregated profiles since startup or the last reset"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.since = datetime.utcnow()
+            self._routes: Dict[str, _RouteStats] = {}
+            self._shapes: Dict[str, Dict[str, Any]] = {}
+            self._slow_requests: deque = deque(maxlen=RECENT_SLOW)
+            self._slow_queries: deque = deque(maxlen=RECENT_SLOW)
+
+    def slow_query(self, label: str, statement: str, seconds: float) -> None:
+        logger.warning("Slow SQL statement (%.1f ms) in %s: %s", seconds * 1000, label, statement_shape(statement))
+        with self._lock:
+            self._slow_queries.append({
+                "at": datetime.utcnow(),
+                "label": label,
+                "db_ms": round(seconds * 1000, 3),
+                "statement": statement_shape(statement)
+            })
+
+    def finish(self, profile: QueryProfile, elapsed: Optional[float] = None) -> None:
+        """Fold a finished profile into the totals, logging it if over a threshold"""
+        duplicated = profile.duplicated_shapes() if profile.statements >= settings.sql_duplicate_threshold else {}
+        slow = (
+            profile.statements > settings.sql_slow_request_statements
+            or profile.db_seconds * 1000 > settings.sql_slow_request_ms
+        )
+
+        with self._lock:
+            stats = self._routes.get(profile.label)
+            if stats is None:
+                stats = self._routes[profile.label] = _RouteStats()
+            stats.requests += 1
+            stats.statements += profile.statements
+            stats.statements_max = max(stats.statements_max, profile.statements)
+            stats.db_seconds += profile.db_seconds
+            stats.db_seconds_max = max(stats.db_seconds_max, profile.db_seconds)
+
+            for shape, count in duplicated.items():
+                entry = self._shapes.get(shape)
+                if entry is None:
+                    entry = self._shapes[shape] = {"requests": 0, "max_per_request": 0, "labels": set()}
+                entry["requests"] += 1
+                entry["max_per_request"] = max(entry["max_per_request"], count)
+                entry["labels"].add(profile.label)
+
+            if slow:
+                stats.slow += 1
+                self._slow_requests.append({
+                    "at": datetime.utcnow(),
+                    "label": profile.label,
+                    "statements": profile.statements,
+                    "db_ms": round(profile.db_seconds * 1000, 3),
+                    "elapsed_ms": round(elapsed * 1000, 3) if elapsed is not None else None,
+                    "duplicated": duplicated
+                })
+
+        if slow:
+            logger.warning(
+                "SQL threshold exceeded by %s: %d statements, %.1f ms in DB%s",
+                profile.label, profile.statements, profile.db_seconds * 1000,
+                f", repeated: {duplicated}" if duplicated else ""
+            )
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = [
+                {
+                    "label": label,
+                    "requests": s.requests,
+                    "statements_mean": s.statements / s.requests,
+                    "statements_max": s.statements_max,
+                    "db_ms_total": round(s.db_seconds * 1000, 3),
+                    "db_ms_mean": round(s.db_seconds * 1000 / s.requests, 3),
+                    "db_ms_max": round(s.db_seconds_max * 1000, 3),
+                    "slow_requests": s.slow
+                }
+                for label, s in self._routes.items()
+            ]
+            shapes = [
+                {
+                    "statement": shape,
+                    "requests": entry["requests"],
+                    "max_per_request": entry["max_per_request"],
+                    "labels": sorted(entry["labels"])
+                }
+                for shape, entry in self._shapes.items()
+            ]
+            slow_requests = list(self._slow_requests)
+            slow_queries = list(self._slow_queries)
+
+        routes.sort(key=lambda r: r["db_ms_total"], reverse=True)
+        shapes.sort(key=lambda s: s["max_per_request"], reverse=True)
+        return {
+            "enabled": settings.sql_profiling,
+            "since": self.since,
+            "thresholds": {
+                "slow_request_ms": settings.sql_slow_request_ms,
+                "slow_request_statements": settings.sql_slow_request_statements,
+                "slow_query_ms": settings.sql_slow_query_ms,
+                "duplicate_threshold": settings.sql_duplicate_threshold
+            },
+            "routes": routes,
+            "duplicated_statements": shapes,
+            "slow_requests": slow_requests,
+            "slow_queries": slow_queries
+        }
+
+
+store = ProfileStore()
+
+# Profile collecting statements issued from the current request or job
+current_profile: ContextVar[Optional[QueryProfile]] = ContextVar("current_profile", default=None)
+
+
+@contextmanager
+def profile_scope(label: str):
+    """Profile statements issued inside the block under label"""
+    profile = QueryProfile(label)
+    token = current_profile.set(profile)
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        current_profile.reset(token)
+        store.finish(profile, time.perf_counter() - start)
+
+
+def run_profiled(label: str, fn: Callable[[], Any]) -> Any:
+    """fn(), profiled under label when profiling is enabled"""
+    if not settings.sql_profiling:
+        return fn()
+    with profile_scope(label):
+        return fn()
@@ -0,0 +1,38 @@
+from typing import Any
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+import orjson
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        # Python mode keeps stored result documents as orjson.Fragment
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dump_json(content: Any) -> bytes:
+    """Encode response content with orjson.
+
+    datetimes, UUIDs, dataclasses and numpy arrays are handled natively;
+    nested Pydantic models are dumped in python mode.
+    """
+    return orjson.dumps(
+        content,
+        default=_default,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    )
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered by orjson; the app's default response class.
+
+    Routes serving large or ORM-backed payloads return it directly with
+    Pydantic models as content. That skips FastAPI's second validation pass
+    and its JSON-mode serialisation, and lets stored result documents reach
+    the client without being decoded. response_model is still declared on
+    those routes for the OpenAPI schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
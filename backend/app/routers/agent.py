@@ -1,20 +1,125 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from app.database import get_db
+from pydantic import ValidationError
+from app.database import begin_write, get_db
 from app.schemas.agent import AgentResponse, AgentRegisterRequest, AgentHeartbeatRequest
-from app.schemas.task import TaskResponse, TaskStartedRequest, TaskResultRequest
+from app.schemas.task import (
+    TaskResponse, TaskStartedRequest, TaskResultRequest,
+    TaskEventBatchRequest, TaskEventBatchResponse, TaskEventResult
+)
 from app.models.agent import Agent
 from app.models.task import Task
+from app.models.test import Test
+from app.models.port_reservation import PortReservation
 from app.middleware.agent_auth import get_agent_from_headers
 from app.services.idempotency import IdempotencyService
+from app.services.results import (
+    body_validation_error, load_json_body, parse_result_upload, split_result_upload
+)
+from app.services.result_cache import LATE_RESULT_STATUSES, evict, invalidate_for_task
+from app.services.tracing import export_task_trace, record_agent_spans
+from app.services.baselines import record_result
+from app.services.pair_stats import record_pair_result
+from app.services.search import advance_search
+from app.services.cancellation import canceled_task_ids
+from app.services.deadlines import record_latency, run_seconds, stop_idle_servers
+from app.services.notifications import Subscription, agent_channel
+from app.responses import dump_json
+from app import metrics
 from app.auth import create_access_token
+from app.config import settings
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import json
+import time
 
 router = APIRouter(prefix="/v1/agent", tags=["agent"])
 
+# Upper bound on tasks handed out by a single heartbeat
+MAX_HEARTBEAT_CLAIM = 20
+
+# Upper bound on events accepted by one /tasks/events batch
+MAX_EVENT_BATCH = 100
+
+
+def _replayed_response(db: Session, key: Optional[str], endpoint: str) -> Optional[Response]:
+    """Stored response for an Idempotency-Key already handled on this endpoint"""
+    if not key:
+        return None
+    content = IdempotencyService(db).get_cached_response(key, endpoint)
+    if content is None:
+        return None
+    return Response(content=content, media_type="application/json")
+
+
+def _remember_response(db: Session, key: Optional[str], endpoint: str, response: Any) -> Response:
+    """Encode a successful response, storing it for replay if keyed"""
+    content = dump_json(response)
+    if key:
+        IdempotencyService(db).cache_response(key, endpoint, content)
+    return Response(content=content, media_type="application/json")
+
+
+def _result_ack(task: Task) -> Dict[str, Any]:
+    """Response to a result upload: the task without the document the agent
+    just sent, so replay records don't keep a second copy of it"""
+    return TaskResponse.model_validate(task).model_dump(exclude={"result"})
+
+
+def _claim_pending_tasks(db: Session, agent_id: int, limit: int) -> List[Task]:
+    """Move an agent's most urgent pending tasks to accepted, oldest first
+    within a priority (served by ix_tasks_claim).
+
+    Must run inside a write transaction (begin_write); the caller commits.
+    """
+    tasks = db.query(Task).filter(
+        Task.agent_id == agent_id,
+        Task.status == "pending"
+    ).order_by(Task.priority.asc(), Task.created_at.asc()).limit(limit).all()
+
+    now = datetime.utcnow()
+    for task in tasks:
+        task.status = "accepted"
+        task.accepted_at = now
+
+    return tasks
+
+
+def _claim_in_transaction(db: Session, agent_id: int, limit: int) -> List[Task]:
+    """Claim up to limit pending tasks in their own write transaction"""
+    try:
+        begin_write(db)
+        tasks = _claim_pending_tasks(db, agent_id, limit)
+        waits = _claim_waits(tasks)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "error": "claim_failed",
+                "message": "Failed to claim task",
+                "details": {"error": str(e)}
+            }
+        )
+    _observe_claims(waits)
+    return tasks
+
+
+def _claim_waits(tasks: List[Task]) -> List[Tuple[str, float]]:
+    """(type, pending -> accepted seconds) per claimed task, read before the
+    commit expires the attributes"""
+    return [
+        (task.type, (task.accepted_at - (task.pending_at or task.created_at)).total_seconds())
+        for task in tasks
+    ]
+
+
+def _observe_claims(waits: List[Tuple[str, float]]) -> None:
+    """Record pending -> accepted wait for committed claims"""
+    for task_type, seconds in waits:
+        metrics.task_transition_seconds.labels("pending_to_accepted", task_type).observe(seconds)
+
 
 @router.post("/register", response_model=AgentResponse)
 async def register_agent(
@@ -57,17 +162,24 @@ async def register_agent(
             }
         )
     
+    idempotency_key = request.headers.get("Idempotency-Key")
+    endpoint = f"POST {request.url.path}"
+    replayed = _replayed_response(db, idempotency_key, endpoint)
+    if replayed is not None:
+        return replayed
+
     # Update agent status and info
     agent.status = "online"
     agent.last_heartbeat = datetime.utcnow()
     agent.ip_address = body.ip_address
     if body.operating_system:
         agent.operating_system = body.operating_system
+    agent.server_pool_ports = sorted(body.server_pool) or None
 
     db.commit()
     db.refresh(agent)
 
-    return agent
+    return _remember_response(db, idempotency_key, endpoint, AgentResponse.model_validate(agent))
 
 
 @router.post("/heartbeat")
@@ -76,19 +188,68 @@ async def heartbeat(
     body: AgentHeartbeatRequest,
     db: Session = Depends(get_db)
 ):
-    """Agent heartbeat with running processes"""
+    """Agent heartbeat with running processes.
+
+    When body.claim > 0 pending tasks are claimed in the same transaction and
+    returned as "tasks", so the steady-state agent loop is a single request.
+    Of the tasks in body.tasks, those canceled since they were claimed are
+    returned as "cancel" for the agent to stop.
+    With body.wait > 0, a claim that finds nothing holds the response for up
+    to that long (at most HEARTBEAT_MAX_WAIT_SECONDS), until any worker
+    queues a task for the agent or cancels one.
+    Only heartbeats that claim tasks are recorded for Idempotency-Key replay;
+    plain heartbeats are naturally idempotent.
+    """
     agent = get_agent_from_headers(request, db)
 
+    idempotency_key = request.headers.get("Idempotency-Key") if body.claim > 0 else None
+    endpoint = f"POST {request.url.path}"
+    replayed = _replayed_response(db, idempotency_key, endpoint)
+    if replayed is not None:
+        return replayed
+
     # Update heartbeat
     agent.last_heartbeat = datetime.utcnow()
     agent.ip_address = body.ip_address
     agent.status = "online"
+    if body.server_pool is not None and sorted(body.server_pool) != (agent.server_pool_ports or []):
+        agent.server_pool_ports = sorted(body.server_pool) or None
 
-    db.commit()
-    
-    # Return hint about whether to pull tasks
-    # For now, always return true - could be smarter later
-    return {"pull_tasks": True}
+    if body.claim <= 0:
+        db.commit()
+        cancel = canceled_task_ids(db, agent.id, body.tasks)
+
+        # Return hint about whether to pull tasks
+        # For now, always return true - could be smarter later
+        return {"pull_tasks": True, "cancel": cancel}
+
+    agent_id = agent.id
+    limit = min(body.claim, MAX_HEARTBEAT_CLAIM)
+    deadline = time.monotonic() + min(max(body.wait, 0), settings.heartbeat_max_wait_seconds)
+    # Subscribed before the first claim, so tasks queued after it wake us
+    with Subscription(agent_channel(agent_id)) as subscription:
+        # Heartbeat update and claim share one write transaction
+        tasks = _claim_in_transaction(db, agent_id, limit)
+        cancel = canceled_task_ids(db, agent_id, body.tasks)
+        while not tasks and not cancel:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Hand the connection back to the pool while waiting
+            db.commit()
+            if not await subscription.wait(remaining):
+                break
+            tasks = _claim_in_transaction(db, agent_id, limit)
+            cancel = canceled_task_ids(db, agent_id, body.tasks)
+
+    response = {
+        "pull_tasks": True,
+        "tasks": [TaskResponse.model_validate(task) for task in tasks],
+        "cancel": cancel
+    }
+    if not tasks:
+        return response
+    return _remember_response(db, idempotency_key, endpoint, response)
 
 
 @router.post("/tasks/claim")
@@ -99,22 +260,19 @@ async def claim_task(
     """Atomically claim one pending task for this agent"""
     agent = get_agent_from_headers(request, db)
     
-    # Use BEGIN IMMEDIATE transaction for atomic claim
+    # Use a write transaction for atomic claim
     try:
         # Start transaction
-        db.execute(text("BEGIN IMMEDIATE"))
+        begin_write(db)
         
-        # Find oldest pending task for this agent
-        task = db.query(Task).filter(
-            Task.agent_id == agent.id,
-            Task.status == "pending"
-        ).order_by(Task.created_at.asc()).first()
-        
-        if task:
-            # Claim the task
-            task.status = "accepted"
-            task.accepted_at = datetime.utcnow()
+        # Claim the oldest pending task for this agent
+        tasks = _claim_pending_tasks(db, agent.id, 1)
+
+        if tasks:
+            task = tasks[0]
+            waits = _claim_waits(tasks)
             db.commit()
+            _observe_claims(waits)
             db.refresh(task)
 
             return {"task": TaskResponse.model_validate(task)}
@@ -134,16 +292,8 @@ async def claim_task(
         )
 
 
-@router.post("/tasks/{task_id}/started", response_model=TaskResponse)
-async def mark_task_started(
-    task_id: int,
-    request: Request,
-    body: TaskStartedRequest,
-    db: Session = Depends(get_db)
-):
-    """Mark task as started"""
-    agent = get_agent_from_headers(request, db)
-
+def _apply_task_started(db: Session, agent: Agent, task_id: int, body: TaskStartedRequest) -> Task:
+    """Transition an accepted task to running and commit"""
     task = db.query(Task).filter(
         Task.id == task_id,
         Task.agent_id == agent.id
@@ -172,6 +322,12 @@ async def mark_task_started(
     task.status = "running"
     task.started_at = datetime.utcnow()
 
+    # Start latency feeds the agent's adaptive grace (client delay excluded)
+    if task.accepted_at is not None:
+        record_latency(agent, "start", (
+            (task.started_at - task.accepted_at).total_seconds() - (task.payload or {}).get("client_delay_seconds", 0)
+        ))
+
     # Store PID in payload if provided
     if body.pid is not None:
         payload = task.payload or {}
@@ -180,27 +336,24 @@ async def mark_task_started(
     
     db.commit()
     db.refresh(task)
-    
+
+    metrics.task_transition_seconds.labels("accepted_to_running", task.type).observe(
+        (task.started_at - task.accepted_at).total_seconds()
+    )
     return task
 
 
-@router.post("/tasks/{task_id}/result", response_model=TaskResponse)
-async def submit_task_result(
+def _apply_task_result(
+    db: Session,
+    agent: Agent,
     task_id: int,
-    request: Request,
     body: TaskResultRequest,
-    db: Session = Depends(get_db)
-):
-    """Submit task result
-
-    TODO: Add support for gzip-compressed results
-          - Check for Content-Encoding: gzip header
-          - Decompress body before parsing JSON
-          - Store decompressed result in database
-          - Coordinate with agent compression implementation
-    """
-    agent = get_agent_from_headers(request, db)
-
+    result: Optional[bytes],
+    summary: Optional[Dict[str, Any]],
+    traceparent: Optional[str] = None
+) -> Task:
+    """Record a task result (already-encoded JSON), its summary and any
+    reported trace spans, and commit"""
     task = db.query(Task).filter(
         Task.id == task_id,
         Task.agent_id == agent.id
@@ -232,26 +385,204 @@ async def submit_task_result(
             }
         )
 
+    received_at = datetime.utcnow()
+    previous_status = task.status
+
+    # A result for an already-terminal task may change an ended exercise's
+    # cached detail/results
+    invalidated = invalidate_for_task(db, task.id) if task.status in LATE_RESULT_STATUSES else []
+
     # Update task - if it was timed_out but agent has results, accept them
     # For server tasks that are already succeeded, just update the result without changing status/finished_at
     if task.status != "succeeded":
         task.status = body.status
-        task.finished_at = datetime.utcnow()
+        task.finished_at = received_at
 
     # Always update result and error (allows server result updates)
-    task.result = body.result
+    task.result = result
+    task.archived_result = None
+    task.summary = summary
     task.error = body.stderr if body.status == "failed" else None
     
     # For server tasks, release port reservation when completed
     if task.type == "iperf_server_start" and body.status in ["succeeded", "failed"]:
-        from app.models.port_reservation import PortReservation
         reservation = db.query(PortReservation).filter(
             PortReservation.task_id == task_id
         ).first()
         if reservation:
             reservation.released_at = datetime.utcnow()
-    
+
+    if body.spans:
+        record_agent_spans(db, task, body.spans, received_at, traceparent)
+
+    # Server tasks may re-upload once succeeded; each client run counts once
+    regressions = []
+    if task.type == "iperf_client_run" and body.status == "succeeded" and previous_status != "succeeded" and summary:
+        test = db.query(Test).filter(Test.client_task_id == task.id).first()
+        # Search trials run at deliberately varied rates
+        if test is not None and not test.search:
+            regressions = record_result(db, test, task, summary)
+            record_pair_result(db, test, task, summary)
+    if task.type == "iperf_client_run":
+        if previous_status == "running" and task.started_at is not None:
+            # How long past its run the result took to arrive
+            record_latency(agent, "upload", (
+                received_at - task.started_at
+            ).total_seconds() - run_seconds(task))
+        advance_search(db, task, summary)
+        # The test's server has nothing left to serve unless a trial follows
+        db.flush()
+        stop_idle_servers(db, db.query(Test).filter(Test.client_task_id == task.id).all())
+
     db.commit()
     db.refresh(task)
-    
+    evict(invalidated)
+
+    if result is not None:
+        metrics.result_ingest_bytes.labels(task.type).observe(len(result))
+    for regression in regressions:
+        metrics.path_regressions.inc(labels=(regression.metric,))
+    if body.spans:
+        export_task_trace(db, task)
     return task
+
+
+@router.post("/tasks/{task_id}/started", response_model=TaskResponse)
+async def mark_task_started(
+    task_id: int,
+    request: Request,
+    body: TaskStartedRequest,
+    db: Session = Depends(get_db)
+):
+    """Mark task as started"""
+    agent = get_agent_from_headers(request, db)
+
+    idempotency_key = request.headers.get("Idempotency-Key")
+    endpoint = f"POST {request.url.path}"
+    replayed = _replayed_response(db, idempotency_key, endpoint)
+    if replayed is not None:
+        return replayed
+
+    task = _apply_task_started(db, agent, task_id, body)
+    return _remember_response(db, idempotency_key, endpoint, TaskResponse.model_validate(task))
+
+
+@router.post(
+    "/tasks/{task_id}/result",
+    response_model=TaskResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": TaskResultRequest.model_json_schema()}}
+        }
+    }
+)
+async def submit_task_result(
+    task_id: int,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """Submit task result
+
+    The body is read raw and decoded with orjson rather than bound to
+    TaskResultRequest, so the iperf3 document skips Pydantic. The response
+    (and its copy kept for Idempotency-Key replay) leaves the document out.
+
+    TODO: Add support for gzip-compressed results
+          - Check for Content-Encoding: gzip header
+          - Decompress body before parsing JSON
+          - Store decompressed result in database
+          - Coordinate with agent compression implementation
+    """
+    agent = get_agent_from_headers(request, db)
+
+    idempotency_key = request.headers.get("Idempotency-Key")
+    endpoint = f"POST {request.url.path}"
+    replayed = _replayed_response(db, idempotency_key, endpoint)
+    if replayed is not None:
+        return replayed
+
+    body, result, summary = parse_result_upload(await request.body())
+    task = _apply_task_result(
+        db, agent, task_id, body, result, summary, request.headers.get("traceparent")
+    )
+    return _remember_response(db, idempotency_key, endpoint, _result_ack(task))
+
+
+@router.post(
+    "/tasks/events",
+    response_model=TaskEventBatchResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": TaskEventBatchRequest.model_json_schema()}}
+        }
+    }
+)
+async def submit_task_events(
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """Apply a batch of queued started/result events in order.
+
+    Each event succeeds or fails on its own; the per-event status code tells
+    the agent whether to drop it (2xx/4xx) or retry it later (5xx). Like the
+    single result route, the body is decoded with orjson and event bodies are
+    not deep-validated.
+    """
+    agent = get_agent_from_headers(request, db)
+
+    try:
+        body = TaskEventBatchRequest.model_validate(load_json_body(await request.body()))
+    except ValidationError as e:
+        raise body_validation_error(e)
+
+    if len(body.events) > MAX_EVENT_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={
+                "error": "batch_too_large",
+                "message": f"At most {MAX_EVENT_BATCH} events per batch",
+                "details": {"events": len(body.events)}
+            }
+        )
+
+    results = []
+    for event in body.events:
+        # Same replay scope as the single-event routes, so a retry may use either
+        endpoint = f"POST {router.prefix}/tasks/{event.task_id}/{event.kind}"
+        try:
+            if event.kind not in ("started", "result"):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail={
+                        "error": "unknown_event_kind",
+                        "message": "Event kind must be started or result",
+                        "details": {"kind": event.kind}
+                    }
+                )
+
+            # Events already applied under this key are acknowledged without re-applying
+            if _replayed_response(db, event.idempotency_key, endpoint) is None:
+                if event.kind == "started":
+                    task = _apply_task_started(db, agent, event.task_id, TaskStartedRequest.model_validate(event.body))
+                else:
+                    result_body, result, summary = split_result_upload(event.body)
+                    task = _apply_task_result(db, agent, event.task_id, result_body, result, summary)
+                ack = TaskResponse.model_validate(task) if event.kind == "started" else _result_ack(task)
+                _remember_response(db, event.idempotency_key, endpoint, ack)
+
+            results.append(TaskEventResult(task_id=event.task_id, kind=event.kind, status_code=200))
+        except HTTPException as e:
+            db.rollback()
+            results.append(TaskEventResult(
+                task_id=event.task_id, kind=event.kind, status_code=e.status_code, detail=e.detail
+            ))
+        except ValidationError as e:
+            db.rollback()
+            results.append(TaskEventResult(
+                task_id=event.task_id, kind=event.kind, status_code=422,
+                detail={"error": "invalid_event_body", "message": str(e)}
+            ))
+
+    return TaskEventBatchResponse(results=results)
@@ -5,6 +5,7 @@ from app.database import get_db
 from app.schemas.agent import AgentCreate, AgentResponse, AgentUpdate
 from app.models.agent import Agent
 from app.auth import get_current_user
+from app.responses import ORJSONResponse
 from datetime import datetime
 
 router = APIRouter(prefix="/v1/agents", tags=["agents"])
@@ -71,7 +72,7 @@ async def list_agents(
         else:
             agent.status = "offline"
     
-    return agents
+    return ORJSONResponse([AgentResponse.model_validate(agent) for agent in agents])
 
 
 @router.get("/{agent_id}", response_model=AgentResponse)
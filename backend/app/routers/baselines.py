@@ -0,0 +1,85 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.database import get_db
+from app.schemas.baseline import PathBaselineResponse, PathRegressionResponse, BaselineRebuildResponse
+from app.models.path_baseline import PathBaseline
+from app.models.path_regression import PathRegression
+from app.auth import get_current_user
+from app.responses import ORJSONResponse
+from app.services.baselines import rebuild_baselines
+from datetime import datetime
+
+router = APIRouter(prefix="/v1/baselines", tags=["baselines"])
+
+
+@router.get("", response_model=List[PathBaselineResponse])
+async def list_baselines(
+    server_agent_id: Optional[int] = Query(None),
+    client_agent_id: Optional[int] = Query(None),
+    protocol: Optional[str] = Query(None),
+    tuning_key: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """List path baselines (median and MAD per metric over the rolling window)"""
+    query = db.query(PathBaseline)
+
+    if server_agent_id:
+        query = query.filter(PathBaseline.server_agent_id == server_agent_id)
+
+    if client_agent_id:
+        query = query.filter(PathBaseline.client_agent_id == client_agent_id)
+
+    if protocol:
+        query = query.filter(PathBaseline.protocol == protocol)
+
+    if tuning_key is not None:
+        query = query.filter(PathBaseline.tuning_key == tuning_key)
+
+    baselines = query.order_by(PathBaseline.id).all()
+    return ORJSONResponse([PathBaselineResponse.model_validate(baseline) for baseline in baselines])
+
+
+@router.get("/regressions", response_model=List[PathRegressionResponse])
+async def list_regressions(
+    exercise_id: Optional[int] = Query(None),
+    baseline_id: Optional[int] = Query(None),
+    metric: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """List flagged results, newest first"""
+    query = db.query(PathRegression)
+
+    if exercise_id:
+        query = query.filter(PathRegression.exercise_id == exercise_id)
+
+    if baseline_id:
+        query = query.filter(PathRegression.baseline_id == baseline_id)
+
+    if metric:
+        query = query.filter(PathRegression.metric == metric)
+
+    if since:
+        query = query.filter(PathRegression.detected_at >= since)
+
+    regressions = query.order_by(PathRegression.detected_at.desc(), PathRegression.id.desc()).limit(limit).all()
+    return ORJSONResponse([PathRegressionResponse.model_validate(regression) for regression in regressions])
+
+
+@router.post("/rebuild", response_model=BaselineRebuildResponse)
+def rebuild(
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Recompute all baselines and regressions from stored results
+
+    Run after changing BASELINE_WINDOW, BASELINE_MIN_SAMPLES or
+    REGRESSION_THRESHOLD, or to backfill history ingested before baselines existed.
+    A plain def, so the replay runs in the threadpool instead of holding up
+    the event loop's heartbeats and claims.
+    """
+    return rebuild_baselines(db)
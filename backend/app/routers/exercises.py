@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from typing import List
-from app.database import get_db
+from app.database import begin_write, get_db
 from app.schemas.exercise import ExerciseCreate, ExerciseResponse, ExerciseDetail
 from app.schemas.test import TestCreate, TestResponse
 from app.schemas.task import TaskResponse
@@ -11,6 +11,16 @@ from app.models.task import Task
 from app.models.port_reservation import PortReservation
 from app.models.agent import Agent
 from app.auth import get_current_user
+from app.responses import ORJSONResponse, dump_json
+from app.services.results import direction_summaries, summary_for_task
+from app.services.search import search_results, start_search
+from app.services.server_pool import free_pooled_port, is_pooled
+from app.services.cancellation import end_exercise
+from app.services.scheduler import queue_status, schedule
+from app.services.archive import load_archived_results
+from app.services.result_cache import ResultCacheService, is_immutable
+from app.services.tuning import tuning_options
+from app.services.tracing import latency_breakdown, new_traceparent, parse_traceparent, to_otlp, trace_for_tasks
 from datetime import datetime
 
 router = APIRouter(prefix="/v1/exercises", tags=["exercises"])
@@ -39,6 +49,7 @@ async def create_exercise(
         name=exercise_data.name,
         duration_seconds=exercise_data.duration_seconds,
         notes=exercise_data.notes,
+        priority=exercise_data.priority,
         created_at=datetime.utcnow()
     )
     
@@ -56,16 +67,14 @@ async def list_exercises(
 ):
     """List all exercises"""
     exercises = db.query(Exercise).all()
-    return exercises
+    queue = queue_status(db)
+    return ORJSONResponse([
+        ExerciseResponse.model_validate({**exercise.__dict__, **queue.get(exercise.id, {})})
+        for exercise in exercises
+    ])
 
 
-@router.get("/{exercise_id}", response_model=ExerciseDetail)
-async def get_exercise(
-    exercise_id: int,
-    db: Session = Depends(get_db),
-    current_user: str = Depends(get_current_user)
-):
-    """Get exercise details with tests and tasks"""
+def _get_exercise_or_404(db: Session, exercise_id: int) -> Exercise:
     exercise = db.query(Exercise).filter(Exercise.id == exercise_id).first()
     if not exercise:
         raise HTTPException(
@@ -76,25 +85,54 @@ async def get_exercise(
                 "details": {"exercise_id": exercise_id}
             }
         )
-    
-    # Get tests
+    return exercise
+
+
+def _exercise_response(db: Session, exercise: Exercise) -> ExerciseResponse:
+    """Exercise with its queue position and estimated start while queued"""
+    queue = queue_status(db) if exercise.queued_at and not exercise.started_at else {}
+    return ExerciseResponse.model_validate({**exercise.__dict__, **queue.get(exercise.id, {})})
+
+
+def _exercise_tests_and_tasks(db: Session, exercise_id: int):
+    """Tests of an exercise and their server/client tasks"""
     tests = db.query(Test).filter(Test.exercise_id == exercise_id).all()
-    
-    # Get all tasks for this exercise
-    task_ids = []
-    for test in tests:
-        if test.server_task_id:
-            task_ids.append(test.server_task_id)
-        if test.client_task_id:
-            task_ids.append(test.client_task_id)
-    
+    task_ids = [task_id for test in tests for task_id in (test.server_task_id, test.client_task_id) if task_id]
     tasks = db.query(Task).filter(Task.id.in_(task_ids)).all() if task_ids else []
-    
-    return ExerciseDetail(
+    return tests, tasks
+
+
+@router.get("/{exercise_id}", response_model=ExerciseDetail)
+async def get_exercise(
+    exercise_id: int,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Get exercise details with tests and tasks
+
+    Once an exercise has ended and all its tasks are terminal the rendered
+    response is cached (see ResultCacheService).
+    """
+    exercise = _get_exercise_or_404(db, exercise_id)
+    cache = ResultCacheService(db)
+    cached = cache.get(exercise, "detail")
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
+    tests, tasks = _exercise_tests_and_tasks(db, exercise_id)
+    load_archived_results(tasks)
+
+    # Nested schemas read the ORM rows directly (from_attributes)
+    queue = queue_status(db) if exercise.queued_at and not exercise.started_at else {}
+    content = dump_json(ExerciseDetail.model_validate({
         **exercise.__dict__,
-        tests=[TestResponse.model_validate(test) for test in tests],
-        tasks=[TaskResponse.model_validate(task) for task in tasks]
-    )
+        **queue.get(exercise.id, {}),
+        "tests": tests,
+        "tasks": tasks
+    }))
+    if is_immutable(exercise, tasks):
+        cache.put(exercise, "detail", content)
+    return Response(content=content, media_type="application/json")
 
 
 @router.post("/{exercise_id}/tests", response_model=dict, status_code=status.HTTP_201_CREATED)
@@ -117,14 +155,18 @@ async def add_test(
             }
         )
 
-    # Prevent adding tests to started exercises
-    if exercise.started_at:
+    # Prevent adding tests to started (or queued) exercises
+    if exercise.started_at or exercise.queued_at:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail={
                 "error": "exercise_already_started",
-                "message": "Cannot add tests to an exercise that has already started",
-                "details": {"exercise_id": exercise_id, "started_at": exercise.started_at}
+                "message": "Cannot add tests to an exercise that has already started or been queued",
+                "details": {
+                    "exercise_id": exercise_id,
+                    "queued_at": exercise.queued_at,
+                    "started_at": exercise.started_at
+                }
             }
         )
 
@@ -141,10 +183,28 @@ async def add_test(
             }
         )
     
+    # Without a port, lease a warm server from the agent's pool
+    server_port = test_data.server_port
+    if server_port is None:
+        server_port = free_pooled_port(db, server_agent)
+        if server_port is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={
+                    "error": "no_pooled_port_available",
+                    "message": "Server agent has no free warm server; specify server_port",
+                    "details": {
+                        "agent_id": test_data.server_agent_id,
+                        "server_pool_ports": server_agent.server_pool_ports or []
+                    }
+                }
+            )
+    pooled = is_pooled(server_agent, server_port)
+
     # Check for port reservation conflict
     existing_reservation = db.query(PortReservation).filter(
         PortReservation.agent_id == test_data.server_agent_id,
-        PortReservation.port == test_data.server_port,
+        PortReservation.port == server_port,
         PortReservation.released_at.is_(None)
     ).first()
     
@@ -156,7 +216,7 @@ async def add_test(
                 "message": "Port already reserved for this agent",
                 "details": {
                     "agent_id": test_data.server_agent_id,
-                    "port": test_data.server_port
+                    "port": server_port
                 }
             }
         )
@@ -169,23 +229,33 @@ async def add_test(
         exercise_id=exercise_id,
         server_agent_id=test_data.server_agent_id,
         client_agent_id=test_data.client_agent_id,
-        server_port=test_data.server_port,
+        server_port=server_port,
         udp=test_data.udp,
         parallel=test_data.parallel,
-        time_seconds=time_seconds
+        time_seconds=time_seconds,
+        **tuning_options(test_data)
     )
+    if test_data.search is not None:
+        test.search = test_data.search.model_dump()
     
     db.add(test)
     db.flush()  # Get the test ID
-    
+
+    # One trace per test; each task is a root span in it
+    server_traceparent = new_traceparent()
+    trace_id, _ = parse_traceparent(server_traceparent)
+
     # Create server task (queued until exercise starts)
     server_task = Task(
         type="iperf_server_start",
         agent_id=test_data.server_agent_id,
         status="queued",  # Will become "pending" when exercise starts
+        priority=exercise.priority,
         payload={
-            "port": test_data.server_port,
-            "udp": test_data.udp
+            "port": server_port,
+            "udp": test_data.udp,
+            "pooled": pooled,
+            "traceparent": server_traceparent
         },
         created_at=datetime.utcnow()
     )
@@ -198,24 +268,31 @@ async def add_test(
         type="iperf_client_run",
         agent_id=test_data.client_agent_id,
         status="queued",  # Will become "pending" when exercise starts
+        priority=exercise.priority,
         payload={
             "server_ip": server_agent.ip_address or "127.0.0.1",  # Fallback IP
-            "port": test_data.server_port,
+            "port": server_port,
             "udp": test_data.udp,
             "parallel": test_data.parallel,
             "time": time_seconds,
-            "client_delay_seconds": 2
+            # A pooled server is already listening
+            "client_delay_seconds": 0 if pooled else 2,
+            "traceparent": new_traceparent(trace_id),
+            **tuning_options(test_data)
         },
         created_at=datetime.utcnow()
     )
     
     db.add(client_task)
     db.flush()
+
+    if test.search:
+        start_search(db, test, client_task)
     
     # Create port reservation
     reservation = PortReservation(
         agent_id=test_data.server_agent_id,
-        port=test_data.server_port,
+        port=server_port,
         task_id=server_task.id,
         created_at=datetime.utcnow()
     )
@@ -231,11 +308,11 @@ async def add_test(
     db.refresh(server_task)
     db.refresh(client_task)
 
-    return {
+    return ORJSONResponse({
         "test": TestResponse.model_validate(test),
         "server_task": TaskResponse.model_validate(server_task),
         "client_task": TaskResponse.model_validate(client_task)
-    }
+    }, status_code=status.HTTP_201_CREATED)
 
 
 @router.post("/{exercise_id}/start", response_model=ExerciseResponse)
@@ -244,42 +321,19 @@ async def start_exercise(
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
-    """Start exercise - marks as started and activates all queued tasks for concurrent execution"""
-    exercise = db.query(Exercise).filter(Exercise.id == exercise_id).first()
-    if not exercise:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail={
-                "error": "exercise_not_found",
-                "message": "Exercise not found",
-                "details": {"exercise_id": exercise_id}
-            }
-        )
-
-    if not exercise.started_at:
-        exercise.started_at = datetime.utcnow()
-
-        # Get all tests for this exercise
-        tests = db.query(Test).filter(Test.exercise_id == exercise_id).all()
-
-        # Collect all task IDs from tests
-        task_ids = []
-        for test in tests:
-            if test.server_task_id:
-                task_ids.append(test.server_task_id)
-            if test.client_task_id:
-                task_ids.append(test.client_task_id)
-
-        # Transition all queued tasks to pending (this starts concurrent execution)
-        if task_ids:
-            db.query(Task).filter(
-                Task.id.in_(task_ids),
-                Task.status == "queued"
-            ).update({"status": "pending"}, synchronize_session=False)
+    """Start exercise - queues it until none of its agents is held by another
+    running exercise, then activates all its queued tasks for concurrent execution"""
+    exercise = _get_exercise_or_404(db, exercise_id)
 
+    if not exercise.queued_at and not exercise.started_at and not exercise.ended_at:
+        # Serialized with other scheduling passes, so agents are never handed out twice
+        begin_write(db)
+        exercise.queued_at = datetime.utcnow()
+        schedule(db)
         db.commit()
+        db.refresh(exercise)
 
-    return exercise
+    return ORJSONResponse(_exercise_response(db, exercise))
 
 
 @router.post("/{exercise_id}/stop", response_model=dict)
@@ -288,7 +342,8 @@ async def stop_exercise(
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
-    """Stop exercise - create kill_all tasks and release reservations"""
+    """Stop exercise - cancel unfinished tasks, create kill_all tasks scoped to
+    the exercise and release reservations"""
     exercise = db.query(Exercise).filter(Exercise.id == exercise_id).first()
     if not exercise:
         raise HTTPException(
@@ -300,44 +355,19 @@ async def stop_exercise(
             }
         )
     
-    # Get all agents involved in this exercise
     tests = db.query(Test).filter(Test.exercise_id == exercise_id).all()
-    agent_ids = set()
-    for test in tests:
-        agent_ids.add(test.server_agent_id)
-        agent_ids.add(test.client_agent_id)
-    
-    # Create kill_all tasks for each agent
-    kill_tasks = []
-    for agent_id in agent_ids:
-        kill_task = Task(
-            type="kill_all",
-            agent_id=agent_id,
-            status="pending",
-            payload={},
-            created_at=datetime.utcnow()
-        )
-        db.add(kill_task)
-        kill_tasks.append(kill_task)
-    
-    # Release all port reservations for this exercise
-    for test in tests:
-        if test.server_task_id:
-            reservation = db.query(PortReservation).filter(
-                PortReservation.task_id == test.server_task_id
-            ).first()
-            if reservation:
-                reservation.released_at = datetime.utcnow()
-    
-    # Mark exercise as ended
-    exercise.ended_at = datetime.utcnow()
-    
+    kill_tasks = end_exercise(db, exercise, tests)
     db.commit()
 
-    return {
+    # Its agents are free for the next queued exercises
+    begin_write(db)
+    schedule(db)
+    db.commit()
+
+    return ORJSONResponse({
         "stopped": True,
         "kill_tasks": [TaskResponse.model_validate(task) for task in kill_tasks]
-    }
+    })
 
 
 @router.get("/{exercise_id}/results", response_model=dict)
@@ -346,20 +376,20 @@ async def get_exercise_results(
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
-    """Get exercise results with parsed metrics"""
-    exercise = db.query(Exercise).filter(Exercise.id == exercise_id).first()
-    if not exercise:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail={
-                "error": "exercise_not_found",
-                "message": "Exercise not found",
-                "details": {"exercise_id": exercise_id}
-            }
-        )
-    
+    """Get exercise results with parsed metrics
+
+    Cached like get_exercise once the exercise can no longer change.
+    """
+    exercise = _get_exercise_or_404(db, exercise_id)
+    cache = ResultCacheService(db)
+    cached = cache.get(exercise, "results")
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
     # Get all tests and their tasks
-    tests = db.query(Test).filter(Test.exercise_id == exercise_id).all()
+    tests, tasks = _exercise_tests_and_tasks(db, exercise_id)
+    tasks_by_id = {task.id: task for task in tasks}
+    searches = search_results(db, tests)
     results = []
     
     for test in tests:
@@ -369,30 +399,25 @@ async def get_exercise_results(
             "client": {"agent_id": test.client_agent_id},
             "udp": test.udp,
             "parallel": test.parallel,
+            "tuning": tuning_options(test),
             "status": "pending"
         }
+        if test.id in searches:
+            test_result["search"] = searches[test.id]
         
         # Get client task result
         if test.client_task_id:
-            client_task = db.query(Task).filter(Task.id == test.client_task_id).first()
+            client_task = tasks_by_id.get(test.client_task_id)
             if client_task:
                 test_result["status"] = client_task.status
                 test_result["started_at"] = client_task.started_at
                 test_result["finished_at"] = client_task.finished_at
                 
                 if client_task.result and client_task.status == "succeeded":
-                    # Parse iperf JSON results
-                    result = client_task.result
-                    if "end" in result:
-                        end = result["end"]
-                        if "sum_sent" in end:
-                            sum_sent = end["sum_sent"]
-                            test_result["metrics"] = {
-                                "bps_avg": sum_sent.get("bits_per_second", 0),
-                                "retransmits": sum_sent.get("retransmits", 0),
-                                "jitter_ms": end.get("sum", {}).get("jitter_ms"),
-                                "loss_pct": end.get("sum", {}).get("lost_percent")
-                            }
+                    # Metrics extracted from the iperf JSON at ingest
+                    metrics = summary_for_task(client_task)
+                    if metrics is not None:
+                        test_result["metrics"] = metrics
         
         results.append(test_result)
     
@@ -401,11 +426,48 @@ async def get_exercise_results(
     if successful_tests:
         avg_bps = sum(r["metrics"]["bps_avg"] for r in successful_tests) / len(successful_tests)
         aggregate = {"bps_avg": avg_bps}
+
+        # Mean throughput per direction, over the tests that measured it
+        by_direction = {}
+        for r in successful_tests:
+            for direction, metrics in direction_summaries(r["metrics"]):
+                by_direction.setdefault(direction, []).append(metrics["bps_avg"])
+        aggregate["directions"] = {
+            direction: {"bps_avg": sum(values) / len(values)} for direction, values in by_direction.items()
+        }
     else:
         aggregate = {}
     
-    return {
+    content = dump_json({
         "exercise_id": exercise_id,
         "tests": results,
         "aggregate": aggregate
-    }
+    })
+    if is_immutable(exercise, tasks):
+        cache.put(exercise, "results", content)
+    return Response(content=content, media_type="application/json")
+
+
+@router.get("/{exercise_id}/trace", response_model=dict)
+async def get_exercise_trace(
+    exercise_id: int,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Lifecycle spans of every test in the exercise as OTLP/JSON"""
+    _get_exercise_or_404(db, exercise_id)
+    _, tasks = _exercise_tests_and_tasks(db, exercise_id)
+    return ORJSONResponse(to_otlp(trace_for_tasks(db, tasks)))
+
+
+@router.get("/{exercise_id}/latency", response_model=dict)
+async def get_exercise_latency(
+    exercise_id: int,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Where dispatch time went: per-test stage durations and per-stage aggregates"""
+    _get_exercise_or_404(db, exercise_id)
+    tests, tasks = _exercise_tests_and_tasks(db, exercise_id)
+    breakdown = latency_breakdown(tests, trace_for_tasks(db, tasks))
+    return ORJSONResponse({"exercise_id": exercise_id, **breakdown})
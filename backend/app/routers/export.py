@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from app.auth import get_current_user
+from app.services.export import ExportFilter, FORMATS, parquet_available, stream_export
+from datetime import datetime
+
+router = APIRouter(prefix="/v1/export", tags=["export"])
+
+
+def _export_response(kind: str, fmt: str, selection: ExportFilter) -> StreamingResponse:
+    if fmt not in FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": "invalid_export_format",
+                "message": "Unknown export format",
+                "details": {"format": fmt, "allowed": list(FORMATS)}
+            }
+        )
+    if fmt == "parquet" and not parquet_available():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail={
+                "error": "export_format_unavailable",
+                "message": "Parquet export requires the pyarrow package",
+                "details": {"format": fmt}
+            }
+        )
+
+    media_type, extension = FORMATS[fmt]
+    filename = f"{kind}_{datetime.utcnow():%Y%m%dT%H%M%S}.{extension}"
+    # The sync generator is iterated on the threadpool, one batch at a time
+    return StreamingResponse(
+        stream_export(kind, fmt, selection),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/tests")
+async def export_tests(
+    exercise_id: Optional[List[int]] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    fmt: str = Query("ndjson", alias="format"),
+    current_user: str = Depends(get_current_user)
+):
+    """Stream one row per test with its headline metrics.
+
+    Select exercises by repeated exercise_id and/or a started_at window
+    (since inclusive, until exclusive); with neither, every exercise is exported.
+    """
+    return _export_response("tests", fmt, ExportFilter(exercise_id, since, until))
+
+
+@router.get("/intervals")
+async def export_intervals(
+    exercise_id: Optional[List[int]] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    fmt: str = Query("ndjson", alias="format"),
+    current_user: str = Depends(get_current_user)
+):
+    """Stream one row per iperf3 reporting interval of each client run,
+    selected like export_tests"""
+    return _export_response("intervals", fmt, ExportFilter(exercise_id, since, until))
@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.database import get_db
+from app.schemas.matrix import AgentPairStatsResponse, MatrixResponse, PairStatsRebuildResponse
+from app.models.agent_pair_stats import AgentPairStats
+from app.auth import get_current_user
+from app.responses import ORJSONResponse
+from app.services.pair_stats import METRICS, STATS, rebuild_pair_stats, render_matrix
+
+router = APIRouter(prefix="/v1/matrix", tags=["matrix"])
+
+
+@router.get("", response_model=MatrixResponse)
+async def get_matrix(
+    protocol: str = Query("tcp"),
+    metric: str = Query("bps_avg"),
+    stat: str = Query("ewma"),
+    include_disabled: bool = Query(False),
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """N x N grid of one statistic between every pair of agents
+
+    values[i][j] is for traffic from agents[i] (client) to agents[j]
+    (server), null where the pair has no results. The encoded grid is cached
+    until a result or agent changes.
+    """
+    if protocol not in ("tcp", "udp") or metric not in METRICS or stat not in STATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": "invalid_matrix_query",
+                "message": "Unknown protocol, metric or stat",
+                "details": {"protocols": ["tcp", "udp"], "metrics": list(METRICS), "stats": list(STATS)}
+            }
+        )
+
+    content = render_matrix(db, protocol, metric, stat, include_disabled)
+    return Response(content=content, media_type="application/json")
+
+
+@router.get("/pairs", response_model=List[AgentPairStatsResponse])
+async def list_pairs(
+    client_agent_id: Optional[int] = Query(None),
+    server_agent_id: Optional[int] = Query(None),
+    protocol: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """All statistics of the matching agent pairs"""
+    query = db.query(AgentPairStats)
+
+    if client_agent_id:
+        query = query.filter(AgentPairStats.client_agent_id == client_agent_id)
+
+    if server_agent_id:
+        query = query.filter(AgentPairStats.server_agent_id == server_agent_id)
+
+    if protocol:
+        query = query.filter(AgentPairStats.protocol == protocol)
+
+    pairs = query.order_by(
+        AgentPairStats.client_agent_id, AgentPairStats.server_agent_id, AgentPairStats.protocol
+    ).all()
+    return ORJSONResponse([AgentPairStatsResponse.model_validate(pair) for pair in pairs])
+
+
+@router.post("/rebuild", response_model=PairStatsRebuildResponse)
+def rebuild(
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Recompute all pair statistics from stored results (backfills history
+    ingested before pair statistics existed). A plain def, so the replay runs
+    in the threadpool instead of holding up the event loop."""
+    return rebuild_pair_stats(db)
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models.agent import Agent
+from app.models.exercise import Exercise
+from app.models.task import Task
+from app import metrics
+from datetime import datetime
+
+router = APIRouter(tags=["metrics"])
+
+# Statuses counted for queue depth; terminal tasks only ever accumulate
+ACTIVE_TASK_STATUSES = ("queued", "pending", "accepted", "running")
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics(db: Session = Depends(get_db)):
+    """Prometheus scrape endpoint"""
+    # Point-in-time gauges are refreshed from the database on each scrape
+    rows = db.query(Task.status, Agent.name, func.count(Task.id)).join(
+        Agent, Agent.id == Task.agent_id
+    ).filter(
+        Task.status.in_(ACTIVE_TASK_STATUSES)
+    ).group_by(Task.status, Agent.name).all()
+    metrics.tasks_by_status.replace({(status, name): count for status, name, count in rows})
+
+    queued, running = db.query(
+        func.count(Exercise.id).filter(Exercise.started_at.is_(None), Exercise.queued_at.isnot(None)),
+        func.count(Exercise.id).filter(Exercise.started_at.isnot(None))
+    ).filter(Exercise.ended_at.is_(None)).one()
+    metrics.exercises_by_state.replace({("queued",): queued, ("running",): running})
+
+    now = datetime.utcnow()
+    agents = db.query(Agent.name, Agent.last_heartbeat).filter(
+        Agent.disabled == False,
+        Agent.last_heartbeat.isnot(None)
+    ).all()
+    metrics.agent_heartbeat_lag.replace({
+        (name,): (now - last_heartbeat).total_seconds() for name, last_heartbeat in agents
+    })
+
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
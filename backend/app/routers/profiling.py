@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends
+from app.auth import get_current_user
+from app.responses import ORJSONResponse
+from app import profiling
+
+router = APIRouter(prefix="/v1/profiling", tags=["profiling"])
+
+
+@router.get("/sql", response_model=dict)
+async def get_sql_profile(current_user: str = Depends(get_current_user)):
+    """Per-route statement counts and DB time, repeated statements and recent slow requests"""
+    return ORJSONResponse(profiling.store.summary())
+
+
+@router.delete("/sql", response_model=dict)
+async def reset_sql_profile(current_user: str = Depends(get_current_user)):
+    """Start a fresh profiling window"""
+    profiling.store.reset()
+    return {"reset": True}
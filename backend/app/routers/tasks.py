@@ -5,6 +5,10 @@ from app.database import get_db
 from app.schemas.task import TaskResponse, TaskCancel
 from app.models.task import Task
 from app.auth import get_current_user
+from app.responses import ORJSONResponse
+from app.services.archive import load_archived_results
+from app.services.notifications import notify_agents
+from app.services.search import advance_search
 from datetime import datetime
 
 router = APIRouter(prefix="/v1/tasks", tags=["tasks"])
@@ -31,7 +35,9 @@ async def list_tasks(
         query = query.filter(Task.type == type_filter)
     
     tasks = query.order_by(Task.created_at.desc()).all()
-    return tasks
+    load_archived_results(tasks)
+    # Stored results are spliced into the response without being decoded
+    return ORJSONResponse([TaskResponse.model_validate(task) for task in tasks])
 
 
 @router.get("/{task_id}", response_model=TaskResponse)
@@ -51,8 +57,9 @@ async def get_task(
                 "details": {"task_id": task_id}
             }
         )
-    
-    return task
+
+    load_archived_results([task])
+    return ORJSONResponse(TaskResponse.model_validate(task))
 
 
 @router.post("/{task_id}/cancel", response_model=TaskCancel)
@@ -61,7 +68,7 @@ async def cancel_task(
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
-    """Cancel a task"""
+    """Cancel a task; an agent already running it stops it on its next heartbeat"""
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(
@@ -87,9 +94,11 @@ async def cancel_task(
     # Cancel the task
     task.status = "canceled"
     task.finished_at = datetime.utcnow()
+    advance_search(db, task, None)
+    notify_agents(db, [task.agent_id])
     db.commit()
     
-    return TaskCancel(canceled=True, task=task)
+    return ORJSONResponse(TaskCancel(canceled=True, task=task))
 
 
 @router.get("/ports/reservations", response_model=List[dict])
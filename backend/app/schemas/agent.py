@@ -26,6 +26,8 @@ class Agent(AgentBase):
     first_registered: datetime
     last_heartbeat: Optional[datetime] = None
     ip_address: Optional[str] = None
+    server_pool_ports: Optional[List[int]] = None
+    latency: Optional[Dict[str, Any]] = None
 
     class Config:
         from_attributes = True
@@ -38,8 +40,13 @@ class AgentResponse(Agent):
 class AgentRegisterRequest(BaseModel):
     ip_address: str
     operating_system: Optional[str] = None
+    server_pool: List[int] = []  # ports with a warm iperf3 server
 
 
 class AgentHeartbeatRequest(BaseModel):
     ip_address: str
     running: List[Dict[str, Any]] = []
+    claim: int = 0  # claim up to this many pending tasks in the same exchange
+    server_pool: Optional[List[int]] = None  # warm server ports, when the agent runs a pool
+    tasks: List[int] = []  # IDs of the tasks the agent is executing
+    wait: float = 0  # when claiming finds nothing, wait up to this many seconds for tasks
@@ -0,0 +1,41 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, Any
+from datetime import datetime
+
+
+class PathBaselineResponse(BaseModel):
+    id: int
+    server_agent_id: int
+    client_agent_id: int
+    protocol: str
+    parallel: int
+    tuning_key: str = ""
+    sample_count: int
+    stats: Dict[str, Any] = {}
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class PathRegressionResponse(BaseModel):
+    id: int
+    baseline_id: int
+    exercise_id: int
+    test_id: int
+    task_id: int
+    metric: str
+    value: float
+    median: float
+    mad: float
+    score: float
+    detected_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class BaselineRebuildResponse(BaseModel):
+    baselines: int
+    results: int
+    regressions: int
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 from .test import TestResponse
@@ -9,6 +9,8 @@ class ExerciseBase(BaseModel):
     name: str
     duration_seconds: int = 30
     notes: Optional[str] = None
+    # Lower is more urgent: queued and claimed first (0 is reserved for kill_all)
+    priority: int = Field(100, ge=1, le=1000)
 
 
 class ExerciseCreate(ExerciseBase):
@@ -18,8 +20,12 @@ class ExerciseCreate(ExerciseBase):
 class Exercise(ExerciseBase):
     id: int
     created_at: datetime
+    queued_at: Optional[datetime] = None
     started_at: Optional[datetime] = None
     ended_at: Optional[datetime] = None
+    # While queued: place in the queue (from 1) and when its agents should be free
+    queue_position: Optional[int] = None
+    estimated_start_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
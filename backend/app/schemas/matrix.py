@@ -0,0 +1,35 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, Any, List
+from datetime import datetime
+
+
+class AgentPairStatsResponse(BaseModel):
+    client_agent_id: int
+    server_agent_id: int
+    protocol: str
+    count: int
+    last_task_id: Optional[int] = None
+    last_result_at: Optional[datetime] = None
+    stats: Dict[str, Any] = {}
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class MatrixAgent(BaseModel):
+    id: int
+    name: str
+
+
+class MatrixResponse(BaseModel):
+    protocol: str
+    metric: str
+    stat: str
+    agents: List[MatrixAgent]
+    values: List[List[Optional[float]]]  # [client index][server index]
+
+
+class PairStatsRebuildResponse(BaseModel):
+    pairs: int
+    results: int
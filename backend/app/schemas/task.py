@@ -1,12 +1,32 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, PlainSerializer, SerializationInfo
+from typing import Optional, Dict, Any, List, Annotated
 from datetime import datetime
+import orjson
+
+
+def _serialize_raw_json(value: Any, info: SerializationInfo) -> Any:
+    """Pass stored JSON text through untouched.
+
+    In python mode the text becomes an orjson.Fragment that orjson splices
+    into the response verbatim; JSON mode (jsonable_encoder, default
+    responses) has to decode it.
+    """
+    if not isinstance(value, (str, bytes)):
+        return value
+    if info.mode == "json":
+        return orjson.loads(value)
+    return orjson.Fragment(value)
+
+
+# Result document as stored by the RawJSON column: JSON text, or a plain dict
+RawResult = Annotated[Any, PlainSerializer(_serialize_raw_json)]
 
 
 class TaskBase(BaseModel):
     type: str
     agent_id: int
     status: str
+    priority: int = 100
     payload: Dict[str, Any] = {}
 
 
@@ -16,7 +36,8 @@ class Task(TaskBase):
     accepted_at: Optional[datetime] = None
     started_at: Optional[datetime] = None
     finished_at: Optional[datetime] = None
-    result: Optional[Dict[str, Any]] = None
+    result: Optional[RawResult] = None
+    summary: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
     
     class Config:
@@ -36,8 +57,41 @@ class TaskStartedRequest(BaseModel):
     pid: Optional[int] = None
 
 
+class TaskSpanIn(BaseModel):
+    """Agent-side lifecycle span, timed on the agent's clock"""
+    name: str
+    span_id: str
+    parent_span_id: Optional[str] = None
+    start_time_unix_nano: int
+    end_time_unix_nano: int
+    attributes: Dict[str, Any] = {}
+
+
 class TaskResultRequest(BaseModel):
     status: str
     result: Optional[Dict[str, Any]] = None
     stderr: Optional[str] = None
     exit_code: int = 0
+    spans: Optional[List[TaskSpanIn]] = None
+
+
+class TaskEvent(BaseModel):
+    task_id: int
+    kind: str  # started, result
+    idempotency_key: Optional[str] = None
+    body: Dict[str, Any] = {}
+
+
+class TaskEventBatchRequest(BaseModel):
+    events: List[TaskEvent]
+
+
+class TaskEventResult(BaseModel):
+    task_id: int
+    kind: str
+    status_code: int
+    detail: Optional[Any] = None
+
+
+class TaskEventBatchResponse(BaseModel):
+    results: List[TaskEventResult]
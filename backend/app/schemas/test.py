@@ -1,15 +1,62 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import Any, Dict, Optional
+from app.services.tuning import parse_rate
+
+# iperf3 sizes and rates: a number with an optional K/M/G suffix
+SIZE_PATTERN = r"^\d+(\.\d+)?[KMGkmg]?$"
+# -b also takes an optional /burst packet count
+BITRATE_PATTERN = r"^\d+(\.\d+)?[KMGkmg]?(/\d+)?$"
+
+
+class ThroughputSearch(BaseModel):
+    """Binary search for the highest UDP rate whose loss stays at or below a
+    threshold (see app.services.search). Rates are offered load across all
+    parallel streams."""
+    max_bitrate: str = Field(..., pattern=SIZE_PATTERN)  # first trial
+    min_bitrate: str = Field("1M", pattern=SIZE_PATTERN)
+    loss_threshold_pct: float = Field(0.0, ge=0, le=100)
+    resolution_pct: float = Field(1.0, gt=0, le=50)  # stop once the bracket is this narrow
+    max_trials: int = Field(12, ge=1, le=32)
+
+    @model_validator(mode="after")
+    def check_range(self):
+        if parse_rate(self.min_bitrate) >= parse_rate(self.max_bitrate):
+            raise ValueError("min_bitrate must be below max_bitrate")
+        return self
 
 
 class TestBase(BaseModel):
     server_agent_id: int
     client_agent_id: int
-    server_port: int
+    server_port: Optional[int] = None  # unset leases a free port of the server agent's warm pool
     udp: bool = False
     parallel: int = 1
     time_seconds: Optional[int] = None
 
+    # iperf3 client tuning (see app.services.tuning); unset keeps iperf3's defaults
+    zerocopy: bool = False  # -Z, sendfile() instead of write()
+    window: Optional[str] = Field(None, pattern=SIZE_PATTERN)  # -w socket buffer size
+    buffer_length: Optional[str] = Field(None, pattern=SIZE_PATTERN)  # -l read/write length
+    omit_seconds: Optional[int] = Field(None, ge=0, le=600)  # -O, excluded warm-up
+    congestion: Optional[str] = Field(None, pattern=r"^[A-Za-z0-9_-]{1,16}$")  # -C algorithm (TCP)
+    mss: Optional[int] = Field(None, ge=88, le=65535)  # -M maximum segment size (TCP)
+    bitrate: Optional[str] = Field(None, pattern=BITRATE_PATTERN)  # -b target; UDP defaults to 0 (unlimited)
+    fq_rate: Optional[str] = Field(None, pattern=SIZE_PATTERN)  # --fq-rate pacing (Linux fq qdisc)
+    reverse: bool = False  # -R, server sends
+    bidir: bool = False  # --bidir, both directions at once
+    # Run as a throughput search: a series of time_seconds trials at varying -b
+    search: Optional[ThroughputSearch] = None
+
+    @model_validator(mode="after")
+    def check_tuning(self):
+        if self.reverse and self.bidir:
+            raise ValueError("reverse and bidir are mutually exclusive")
+        if self.udp and (self.congestion is not None or self.mss is not None):
+            raise ValueError("congestion and mss only apply to TCP tests")
+        if self.search is not None and (not self.udp or self.bitrate is not None):
+            raise ValueError("search needs a UDP test without a fixed bitrate")
+        return self
+
 
 class TestCreate(TestBase):
     pass
@@ -18,8 +65,10 @@ class TestCreate(TestBase):
 class Test(TestBase):
     id: int
     exercise_id: int
+    server_port: int
     server_task_id: Optional[int] = None
-    client_task_id: Optional[int] = None
+    client_task_id: Optional[int] = None  # latest trial for search tests
+    search_state: Optional[Dict[str, Any]] = None
     
     class Config:
         from_attributes = True
@@ -0,0 +1,221 @@
+"""Cold storage for the results of old exercises.
+
+Each archived exercise gets one file, <ARCHIVE_DIR>/exercise_<id>.jsonl.zst
+(or .jsonl.gz), holding one {"task_id", "type", "result"} JSON line per task.
+Every line is compressed as its own frame, so:
+- The file is still a valid zstd/gzip stream that `zstd -dc` or `zcat` turns
+  into plain JSONL.
+- A task's archived_result pointer ({"file", "offset", "length", "codec"})
+  reads its result back with a single seek.
+
+zstd needs the optional zstandard package (`poetry install -E archive`);
+without it results are archived with gzip.
+"""
+import os
+import gzip
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from app.config import settings
+from app.database import engine
+from app.models.exercise import Exercise
+from app.models.exercise_result_cache import ExerciseResultCache
+from app.models.task import Task
+from app.models.test import Test
+from app.services.result_cache import TERMINAL_TASK_STATUSES
+from app.services.results import summary_for_task
+from app.services.search import search_trial_task_ids
+import orjson
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Tasks whose results are loaded and written per flush while archiving
+ARCHIVE_CHUNK = 100
+
+_EXTENSIONS = {"zstd": "zst", "gzip": "gz"}
+
+
+def _codec() -> str:
+    if settings.archive_codec == "gzip" or zstandard is None:
+        if settings.archive_codec == "zstd":
+            logger.warning("ARCHIVE_CODEC=zstd but zstandard is not installed, archiving with gzip")
+        return "gzip"
+    return "zstd"
+
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data, mtime=0)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd archives")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _line_prefix(task: Task) -> bytes:
+    return b'{"task_id":%d,"type":%s,"result":' % (task.id, orjson.dumps(task.type))
+
+
+def _exercise_task_ids(db: Session, exercise_id: int) -> List[int]:
+    tests = db.query(Test.id, Test.server_task_id, Test.client_task_id).filter(Test.exercise_id == exercise_id).all()
+    task_ids = {task_id for _, *pair in tests for task_id in pair if task_id}
+    # Earlier trials of search tests are no longer referenced from the test
+    task_ids.update(search_trial_task_ids(db, [test_id for test_id, *_ in tests]))
+    return sorted(task_ids)
+
+
+def archive_exercise(db: Session, exercise: Exercise) -> int:
+    """Move an exercise's task results to its archive file, returning the count.
+
+    Summaries are filled in first, so result listings never need the archive.
+    The file is synced before the pointers are committed; a crash in between
+    only leaves unreferenced frames behind.
+    """
+    codec = _codec()
+    archive_dir = Path(settings.archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    name = f"exercise_{exercise.id}.jsonl.{_EXTENSIONS[codec]}"
+
+    task_ids = [
+        task_id for (task_id,) in db.query(Task.id).filter(
+            Task.id.in_(_exercise_task_ids(db, exercise.id)),
+            Task.result.isnot(None)
+        ).order_by(Task.id)
+    ]
+
+    archived = 0
+    with open(archive_dir / name, "ab") as f:
+        offset = f.tell()
+        for start in range(0, len(task_ids), ARCHIVE_CHUNK):
+            tasks = db.query(Task).filter(Task.id.in_(task_ids[start:start + ARCHIVE_CHUNK])).all()
+            for task in tasks:
+                if task.summary is None:
+                    task.summary = summary_for_task(task)
+                frame = _compress(codec, _line_prefix(task) + task.result.encode("utf-8") + b"}\n")
+                f.write(frame)
+                task.archived_result = {"file": name, "offset": offset, "length": len(frame), "codec": codec}
+                task.result = None
+                offset += len(frame)
+                archived += 1
+            # Write the NULLed results out so the chunk's documents can be freed
+            db.flush()
+        f.flush()
+        os.fsync(f.fileno())
+
+    exercise.archived_at = datetime.utcnow()
+    # The stored detail response embeds the results the archive just took out
+    db.query(ExerciseResultCache).filter(
+        ExerciseResultCache.exercise_id == exercise.id,
+        ExerciseResultCache.kind == "detail"
+    ).delete(synchronize_session=False)
+    db.commit()
+    return archived
+
+
+def archive_due(db: Session, limit: int) -> Dict[str, int]:
+    """Archive up to limit exercises that ended more than ARCHIVE_AFTER_DAYS ago"""
+    cutoff = datetime.utcnow() - timedelta(days=settings.archive_after_days)
+    exercises = db.query(Exercise).filter(
+        Exercise.ended_at.isnot(None),
+        Exercise.ended_at < cutoff,
+        Exercise.archived_at.is_(None)
+    ).order_by(Exercise.ended_at).limit(limit).all()
+
+    totals = {"exercises": 0, "results": 0}
+    for exercise in exercises:
+        task_ids = _exercise_task_ids(db, exercise.id)
+        unfinished = db.query(Task.id).filter(
+            Task.id.in_(task_ids),
+            Task.status.notin_(TERMINAL_TASK_STATUSES)
+        ).first() if task_ids else None
+        if unfinished is not None:
+            continue
+        totals["results"] += archive_exercise(db, exercise)
+        totals["exercises"] += 1
+    return totals
+
+
+def load_archived_results(tasks: Iterable[Task]) -> None:
+    """Fill in archived results on loaded tasks, reading each file once.
+
+    Values are set as committed state, so the session never writes them back.
+    """
+    by_file: Dict[str, List[Task]] = {}
+    for task in tasks:
+        if task.result is None and task.archived_result:
+            by_file.setdefault(task.archived_result["file"], []).append(task)
+
+    for name, file_tasks in by_file.items():
+        path = Path(settings.archive_dir) / name
+        try:
+            with open(path, "rb") as f:
+                for task in sorted(file_tasks, key=lambda t: t.archived_result["offset"]):
+                    pointer = task.archived_result
+                    f.seek(pointer["offset"])
+                    line = _decompress(pointer["codec"], f.read(pointer["length"]))
+                    prefix = _line_prefix(task)
+                    if line.startswith(prefix):
+                        raw = line[len(prefix):].rstrip(b"\n")[:-1].decode("utf-8")
+                    else:
+                        raw = orjson.dumps(orjson.loads(line)["result"]).decode("utf-8")
+                    set_committed_value(task, "result", raw)
+        except (OSError, ValueError, RuntimeError) as e:
+            logger.error(f"Failed to read archived results from {path}: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail={
+                    "error": "archive_unavailable",
+                    "message": "Archived task result could not be read",
+                    "details": {"file": name, "task_ids": [task.id for task in file_tasks]}
+                }
+            )
+
+
+def compact_database() -> Dict[str, Any]:
+    """Return freed pages to the filesystem and truncate the WAL.
+
+    Incremental vacuum releases at most VACUUM_PAGES_PER_PASS pages per call
+    so writers are never blocked for long. It only works on databases created
+    with auto_vacuum=INCREMENTAL (new databases are, see app.database);
+    older files need a one-off VACUUM to switch.
+    """
+    if engine.dialect.name != "sqlite":
+        return {}
+
+    with engine.connect() as conn:
+        auto_vacuum = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        free_pages = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        if auto_vacuum == 2 and free_pages:
+            # The pragma frees one page per step, and the sqlite3 module steps
+            # row-less statements only once, so run it once per page (~16us each)
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            cursor = conn.connection.cursor()
+            try:
+                for _ in range(min(free_pages, settings.vacuum_pages_per_pass)):
+                    cursor.execute("PRAGMA incremental_vacuum")
+            finally:
+                cursor.close()
+            conn.commit()
+        busy, wal_pages, checkpointed = conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").one()
+        remaining = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+    return {
+        "incremental": auto_vacuum == 2,
+        "pages_freed": free_pages - remaining,
+        "free_pages": remaining,
+        "wal_checkpoint_busy": bool(busy)
+    }
@@ -0,0 +1,200 @@
+"""Per-path baselines and regression detection across exercises.
+
+Tests are grouped by signature: (server agent, client agent, protocol,
+parallel streams, tuning key). Each signature keeps its most recent BASELINE_WINDOW
+client results per metric, plus the window's median and MAD. The window is
+fixed-size, so updating a baseline costs the same after years of history as
+after ten runs.
+
+Each new result is scored against the baseline before it joins the window.
+The score is a robust z-score, (value - median) / (1.4826 * MAD), signed so
+that positive means worse. A metric is flagged once the window holds
+BASELINE_MIN_SAMPLES results and the score reaches REGRESSION_THRESHOLD.
+"""
+from datetime import datetime
+from statistics import median
+from typing import Any, Dict, Iterator, List, Tuple
+from sqlalchemy.orm import Session, defer
+from app.config import settings
+from app.models.path_baseline import PathBaseline
+from app.models.path_regression import PathRegression
+from app.models.task import Task
+from app.models.test import Test
+from app.services.results import summary_for_task
+from app.services.tuning import tuning_key, tuning_options
+
+# Summary metric -> +1 when higher is worse, -1 when lower is worse
+METRICS = {"bps_avg": -1, "retransmits": 1, "loss_pct": 1}
+
+# Scales MAD to the standard deviation for normally distributed samples
+MAD_SCALE = 1.4826
+
+# Smallest spread a score is taken against, so a perfectly steady path does
+# not flag noise: a share of the median, or an absolute floor for counters
+# whose median is often 0
+_RELATIVE_FLOOR = 0.01
+_ABSOLUTE_FLOOR = {"bps_avg": 0.0, "retransmits": 1.0, "loss_pct": 0.01}
+
+# Client tasks read per batch by replay_client_results
+REPLAY_BATCH = 500
+
+
+def signature(test: Test) -> Tuple[int, int, str, int, str]:
+    return (
+        test.server_agent_id, test.client_agent_id, "udp" if test.udp else "tcp", test.parallel,
+        tuning_key(tuning_options(test))
+    )
+
+
+def _window_stats(values: List[float]) -> Dict[str, Any]:
+    center = median(values)
+    return {"median": center, "mad": median(abs(v - center) for v in values), "n": len(values)}
+
+
+def score(metric: str, value: float, stats: Dict[str, Any]) -> float:
+    """Robust z-score of value against a metric's baseline, positive when worse"""
+    spread = max(
+        MAD_SCALE * stats["mad"],
+        _RELATIVE_FLOOR * abs(stats["median"]),
+        _ABSOLUTE_FLOOR[metric]
+    )
+    if spread == 0:
+        return 0.0
+    return METRICS[metric] * (value - stats["median"]) / spread
+
+
+def _get_or_create_baseline(db: Session, test: Test, now: datetime) -> PathBaseline:
+    server_agent_id, client_agent_id, protocol, parallel, key = signature(test)
+    baseline = db.query(PathBaseline).filter(
+        PathBaseline.server_agent_id == server_agent_id,
+        PathBaseline.client_agent_id == client_agent_id,
+        PathBaseline.protocol == protocol,
+        PathBaseline.parallel == parallel,
+        PathBaseline.tuning_key == key
+    ).first()
+    if baseline is None:
+        baseline = PathBaseline(
+            server_agent_id=server_agent_id,
+            client_agent_id=client_agent_id,
+            protocol=protocol,
+            parallel=parallel,
+            tuning_key=key,
+            sample_count=0,
+            window={},
+            stats={},
+            updated_at=now
+        )
+        db.add(baseline)
+        db.flush()
+    return baseline
+
+
+def _apply_sample(
+    db: Session,
+    baseline: PathBaseline,
+    test: Test,
+    task: Task,
+    summary: Dict[str, Any],
+    now: datetime
+) -> List[PathRegression]:
+    """Score one result against the baseline, then roll it into the window"""
+    window = dict(baseline.window or {})
+    stats = dict(baseline.stats or {})
+    regressions = []
+
+    for metric in METRICS:
+        value = summary.get(metric)
+        if value is None:
+            continue
+        value = float(value)
+
+        current = stats.get(metric)
+        if current is not None and current["n"] >= settings.baseline_min_samples:
+            z = score(metric, value, current)
+            if z >= settings.regression_threshold:
+                regression = PathRegression(
+                    baseline_id=baseline.id,
+                    exercise_id=test.exercise_id,
+                    test_id=test.id,
+                    task_id=task.id,
+                    metric=metric,
+                    value=value,
+                    median=current["median"],
+                    mad=current["mad"],
+                    score=z,
+                    detected_at=now
+                )
+                db.add(regression)
+                regressions.append(regression)
+
+        values = (window.get(metric) or []) + [value]
+        values = values[-settings.baseline_window:]
+        window[metric] = values
+        stats[metric] = _window_stats(values)
+
+    # Reassign so the JSON columns are marked dirty
+    baseline.window = window
+    baseline.stats = stats
+    baseline.sample_count += 1
+    baseline.updated_at = now
+    return regressions
+
+
+def record_result(db: Session, test: Test, task: Task, summary: Dict[str, Any]) -> List[PathRegression]:
+    """Update the baseline of a succeeded client task's path, returning any
+    regressions it showed. The caller commits."""
+    now = datetime.utcnow()
+    return _apply_sample(db, _get_or_create_baseline(db, test, now), test, task, summary, now)
+
+
+def replay_client_results(db: Session) -> Iterator[Tuple[Test, Task, Dict[str, Any]]]:
+    """(test, client task, summary) for every succeeded client run of a plain
+    (non-search) test, in finish order.
+
+    Keyset-paginated over (finished_at, id); summaries are enough, so results
+    stay unloaded. The session is flushed between batches.
+    """
+    last = (datetime.min, 0)
+    while True:
+        batch = db.query(Task, Test).join(Test, Test.client_task_id == Task.id).options(
+            defer(Task.result)
+        ).filter(
+            Task.status == "succeeded",
+            Task.finished_at.isnot(None),
+            (Task.finished_at > last[0]) | ((Task.finished_at == last[0]) & (Task.id > last[1]))
+        ).order_by(Task.finished_at, Task.id).limit(REPLAY_BATCH).all()
+        if not batch:
+            return
+        last = (batch[-1][0].finished_at, batch[-1][0].id)
+
+        for task, test in batch:
+            # Search trials run at deliberately varied rates
+            summary = summary_for_task(task) if not test.search else None
+            if summary:
+                yield test, task, summary
+        db.flush()
+
+
+def rebuild_baselines(db: Session) -> Dict[str, int]:
+    """Recompute every baseline and regression from stored results, oldest first.
+
+    Results are replayed in finish order, so the flags match what live
+    ingestion would have produced with the current settings.
+    """
+    db.query(PathRegression).delete(synchronize_session=False)
+    db.query(PathBaseline).delete(synchronize_session=False)
+    db.flush()
+
+    baselines: Dict[Tuple[int, int, str, int, str], PathBaseline] = {}
+    totals = {"baselines": 0, "results": 0, "regressions": 0}
+    for test, task, summary in replay_client_results(db):
+        key = signature(test)
+        baseline = baselines.get(key)
+        if baseline is None:
+            baseline = baselines[key] = _get_or_create_baseline(db, test, task.finished_at)
+        totals["regressions"] += len(_apply_sample(db, baseline, test, task, summary, task.finished_at))
+        totals["results"] += 1
+
+    db.commit()
+    totals["baselines"] = len(baselines)
+    return totals
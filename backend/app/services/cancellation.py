@@ -0,0 +1,109 @@
+"""Cancellation and exercise-scoped kills delivered to agents.
+
+Canceled tasks reach the agent running them through heartbeats: the agent
+lists the tasks it is executing, and the response names those since
+canceled, whose processes the agent then terminates. Ending an exercise
+sends each involved agent a kill_all scoped to that exercise's task IDs, at
+PRIORITY_CONTROL so it is claimed ahead of any queued runs. Processes of
+other exercises sharing the agent keep running.
+"""
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy.orm import Session
+from app.models.exercise import Exercise
+from app.models.port_reservation import PortReservation
+from app.models.task import PRIORITY_CONTROL, Task
+from app.models.test import Test
+from app.services.notifications import notify_agents
+from app.services.search import advance_search, search_trial_task_ids
+
+TERMINAL_STATUSES = ("succeeded", "failed", "canceled", "timed_out")
+
+
+def exercise_task_ids(db: Session, tests: List[Test]) -> List[int]:
+    """Server, client and search trial task IDs of an exercise's tests"""
+    task_ids = {task_id for test in tests for task_id in (test.server_task_id, test.client_task_id) if task_id}
+    task_ids.update(search_trial_task_ids(db, [test.id for test in tests]))
+    return sorted(task_ids)
+
+
+def cancel_exercise_tasks(db: Session, tests: List[Test]) -> int:
+    """Cancel the exercise's tasks that have not finished. Running servers are
+    left to the kill_all, which ends them with their output. The caller commits."""
+    task_ids = exercise_task_ids(db, tests)
+    if not task_ids:
+        return 0
+    tasks = db.query(Task).filter(
+        Task.id.in_(task_ids),
+        Task.status.notin_(TERMINAL_STATUSES),
+        ~((Task.type == "iperf_server_start") & (Task.status == "running"))
+    ).all()
+    now = datetime.utcnow()
+    for task in tasks:
+        task.status = "canceled"
+        task.finished_at = now
+        advance_search(db, task, None)
+    return len(tasks)
+
+
+def exercise_kill_tasks(db: Session, exercise_id: int, tests: List[Test]) -> List[Task]:
+    """One kill_all per agent of the exercise, scoped to its tasks on that
+    agent. The caller commits."""
+    agent_task_ids: Dict[int, List[int]] = {}
+    for test in tests:
+        agent_task_ids.setdefault(test.server_agent_id, [])
+        agent_task_ids.setdefault(test.client_agent_id, [])
+    task_ids = exercise_task_ids(db, tests)
+    if task_ids:
+        for task_id, agent_id in db.query(Task.id, Task.agent_id).filter(Task.id.in_(task_ids)):
+            agent_task_ids.setdefault(agent_id, []).append(task_id)
+
+    kill_tasks = []
+    for agent_id, agent_tasks in agent_task_ids.items():
+        kill_task = Task(
+            type="kill_all",
+            agent_id=agent_id,
+            status="pending",
+            priority=PRIORITY_CONTROL,
+            payload={"exercise_id": exercise_id, "task_ids": sorted(agent_tasks)},
+            created_at=datetime.utcnow()
+        )
+        db.add(kill_task)
+        kill_tasks.append(kill_task)
+    notify_agents(db, agent_task_ids)
+    return kill_tasks
+
+
+def end_exercise(db: Session, exercise: Exercise, tests: List[Test]) -> List[Task]:
+    """End an exercise early: cancel its unfinished tasks, kill its processes
+    and release its reservations. Returns the kill tasks; the caller commits."""
+    # Marked ended first, so search tests queue no further trials
+    now = datetime.utcnow()
+    exercise.ended_at = now
+
+    # Tasks not yet claimed never run; agents drop claimed ones on their next heartbeat
+    cancel_exercise_tasks(db, tests)
+
+    # Kill the exercise's processes on each agent, leaving other exercises' alone
+    kill_tasks = exercise_kill_tasks(db, exercise.id, tests) if exercise.started_at else []
+
+    server_task_ids = [test.server_task_id for test in tests if test.server_task_id]
+    if server_task_ids:
+        db.query(PortReservation).filter(
+            PortReservation.task_id.in_(server_task_ids),
+            PortReservation.released_at.is_(None)
+        ).update({"released_at": now}, synchronize_session=False)
+    return kill_tasks
+
+
+def canceled_task_ids(db: Session, agent_id: int, task_ids: List[int]) -> List[int]:
+    """Which of the tasks an agent reports executing have been canceled"""
+    if not task_ids:
+        return []
+    return [
+        task_id for (task_id,) in db.query(Task.id).filter(
+            Task.id.in_(task_ids),
+            Task.agent_id == agent_id,
+            Task.status == "canceled"
+        ).order_by(Task.id)
+    ]
@@ -0,0 +1,36 @@
+"""Counters bumped in the transactions whose changes they count.
+
+A worker caching something derived from the database reads a counter to
+learn whether (and, with rows stamped by it, what) changed since its last
+read, without relying on clocks. Bumping writes the counter's row, which
+stays locked until commit (SQLite's write lock, a row lock on Postgres), so
+the bumping transactions commit one after another in counter order: once a
+value is visible, every change stamped with it or lower is too.
+"""
+from typing import Dict
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.change_counter import ChangeCounter
+
+
+def bump_counter(db: Session, name: str) -> int:
+    """Increment a counter in the caller's transaction, returning its new
+    value. The caller commits."""
+    updated = db.query(ChangeCounter).filter(ChangeCounter.name == name).update(
+        {ChangeCounter.value: ChangeCounter.value + 1}, synchronize_session=False
+    )
+    if not updated:
+        try:
+            with db.begin_nested():
+                db.add(ChangeCounter(name=name, value=1))
+            return 1
+        except IntegrityError:
+            # Another transaction created it first
+            return bump_counter(db, name)
+    return db.query(ChangeCounter.value).filter(ChangeCounter.name == name).scalar()
+
+
+def read_counters(db: Session, *names: str) -> Dict[str, int]:
+    """Current values of counters, 0 for ones never bumped"""
+    values = dict(db.query(ChangeCounter.name, ChangeCounter.value).filter(ChangeCounter.name.in_(names)))
+    return {name: values.get(name, 0) for name in names}
@@ -0,0 +1,202 @@
+"""Task deadlines with per-agent adaptive grace, and server task lifetimes.
+
+Every task an agent holds (accepted or running) has a deadline; the timeout
+sweeper marks tasks past it timed_out:
+- accepted: accepted_at + client start delay + start grace (a server also
+  waits up to SERVER_READY_SECONDS for its port)
+- running client: started_at + time + omitted seconds + upload grace
+- running server: once its test's client has finished, the client's end +
+  STOP_SECONDS + start grace + upload grace
+- kill_all and iperf_server_stop, which agents never mark running:
+  accepted_at + STOP_SECONDS + start grace + upload grace
+
+Grace follows each agent's observed latency, kept on Agent.latency like a TCP
+retransmission timer (RFC 6298): a smoothed mean and mean deviation per kind,
+and grace = mean + 4 * deviation, clamped to TASK_GRACE_MIN/MAX_SECONDS.
+- start: accepted -> running, less the intended client delay
+- upload: a client's result arriving after its run should have ended
+
+Until an agent has LATENCY_MIN_SAMPLES samples of a kind, the fixed grace
+applies: max(30s, 10% of the run).
+
+A server task stays running while its test's client runs. Once the client
+task is terminal (after the last trial of a search), an iperf_server_stop
+scoped to the server task is queued at PRIORITY_CONTROL. The agent stops the
+server and uploads its output, which ends the task and releases the port.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session, defer
+from app.config import settings
+from app.models.agent import Agent
+from app.models.port_reservation import PortReservation
+from app.models.task import PRIORITY_CONTROL, Task
+from app.models.test import Test
+from app.services.result_cache import TERMINAL_TASK_STATUSES as TERMINAL_STATUSES
+from app.services.notifications import notify_agents
+from app.services.search import advance_search
+
+# Tasks the agent runs to completion without marking them running
+CONTROL_TYPES = ("kill_all", "iperf_server_stop")
+
+# RFC 6298 gains for the smoothed mean and the mean deviation
+LATENCY_ALPHA = 0.125
+LATENCY_BETA = 0.25
+LATENCY_MIN_SAMPLES = 5
+
+# Agent terminate wait (5s) plus server result capture (10s)
+STOP_SECONDS = 15
+# Agent wait for a spawned server to listen, rounded up
+SERVER_READY_SECONDS = 5
+
+
+def record_latency(agent: Agent, kind: str, seconds: float) -> None:
+    """Fold one start or upload latency sample into the agent's estimate"""
+    seconds = max(seconds, 0.0)
+    latency = dict(agent.latency or {})
+    current = latency.get(kind)
+    if not current:
+        current = {"mean": seconds, "deviation": seconds / 2, "samples": 1}
+    else:
+        deviation = (1 - LATENCY_BETA) * current["deviation"] + LATENCY_BETA * abs(current["mean"] - seconds)
+        current = {
+            "mean": (1 - LATENCY_ALPHA) * current["mean"] + LATENCY_ALPHA * seconds,
+            "deviation": deviation,
+            "samples": current["samples"] + 1
+        }
+    latency[kind] = current
+    # Reassign so the JSON column is marked dirty
+    agent.latency = latency
+
+
+def grace_seconds(latency: Optional[Dict[str, Any]], kind: str, run_seconds: float = 0) -> float:
+    estimate = (latency or {}).get(kind)
+    if not estimate or estimate["samples"] < LATENCY_MIN_SAMPLES:
+        return max(30, int(run_seconds * 0.1))
+    grace = estimate["mean"] + 4 * estimate["deviation"]
+    return min(max(grace, settings.task_grace_min_seconds), settings.task_grace_max_seconds)
+
+
+def run_seconds(task: Task) -> float:
+    """How long a client run lasts, counting iperf3's omitted warm-up"""
+    payload = task.payload or {}
+    return payload.get("time", 30) + payload.get("omit_seconds", 0)
+
+
+def task_deadline(
+    task: Task,
+    latency: Optional[Dict[str, Any]],
+    client_end: Optional[datetime] = None
+) -> Optional[datetime]:
+    """When an accepted or running task times out; None while it may run on.
+
+    client_end is when a running server's client finished, if it has.
+    """
+    start_grace = grace_seconds(latency, "start")
+    if task.type in CONTROL_TYPES:
+        seconds = STOP_SECONDS + start_grace + grace_seconds(latency, "upload")
+        return task.accepted_at + timedelta(seconds=seconds) if task.accepted_at else None
+
+    if task.status == "accepted":
+        if task.accepted_at is None:
+            return None
+        seconds = (task.payload or {}).get("client_delay_seconds", 0) + start_grace
+        if task.type == "iperf_server_start":
+            seconds += SERVER_READY_SECONDS
+        return task.accepted_at + timedelta(seconds=seconds)
+
+    if task.type == "iperf_client_run":
+        if task.started_at is None:
+            return None
+        run = run_seconds(task)
+        return task.started_at + timedelta(seconds=run + grace_seconds(latency, "upload", run))
+
+    if task.type == "iperf_server_start" and client_end is not None:
+        seconds = STOP_SECONDS + start_grace + grace_seconds(latency, "upload")
+        return client_end + timedelta(seconds=seconds)
+    return None
+
+
+def stop_idle_servers(db: Session, tests: List[Test]) -> List[Task]:
+    """Queue an iperf_server_stop for each running server task whose test's
+    client has finished, once per server. The caller commits."""
+    task_ids = [task_id for test in tests for task_id in (test.server_task_id, test.client_task_id) if task_id]
+    if not task_ids:
+        return []
+    tasks = {
+        task.id: task for task in db.query(Task).options(defer(Task.result)).filter(Task.id.in_(task_ids))
+    }
+
+    now = datetime.utcnow()
+    stops = []
+    for test in tests:
+        server, client = tasks.get(test.server_task_id), tasks.get(test.client_task_id)
+        if server is None or client is None or server.status != "running" or client.status not in TERMINAL_STATUSES:
+            continue
+        if (server.payload or {}).get("stop_task_id"):
+            continue
+        stop = Task(
+            type="iperf_server_stop",
+            agent_id=server.agent_id,
+            status="pending",
+            priority=PRIORITY_CONTROL,
+            payload={"task_ids": [server.id]},
+            created_at=now,
+            pending_at=now
+        )
+        db.add(stop)
+        db.flush()
+        server.payload = {**server.payload, "stop_task_id": stop.id}
+        stops.append(stop)
+    notify_agents(db, [stop.agent_id for stop in stops])
+    return stops
+
+
+def sweep_deadlines(db: Session) -> Dict[str, List[Task]]:
+    """Time out accepted and running tasks past their deadline, and queue
+    stops for servers whose client has finished. The caller commits."""
+    tasks = db.query(Task).options(defer(Task.result)).filter(
+        Task.status.in_(("accepted", "running"))
+    ).all()
+    if not tasks:
+        return {"timed_out": [], "stopped": []}
+
+    # Running servers: their tests, and when each test's client finished
+    server_ids = [task.id for task in tasks if task.type == "iperf_server_start" and task.status == "running"]
+    tests = db.query(Test).filter(Test.server_task_id.in_(server_ids)).all() if server_ids else []
+    client_ends: Dict[int, datetime] = {}
+    client_ids = [test.client_task_id for test in tests if test.client_task_id]
+    if client_ids:
+        finished = dict(db.query(Task.id, Task.finished_at).filter(
+            Task.id.in_(client_ids),
+            Task.status.in_(TERMINAL_STATUSES)
+        ).all())
+        for test in tests:
+            if test.client_task_id in finished:
+                client_ends[test.server_task_id] = finished[test.client_task_id] or datetime.utcnow()
+
+    latencies = dict(db.query(Agent.id, Agent.latency).filter(
+        Agent.id.in_({task.agent_id for task in tasks})
+    ).all())
+
+    now = datetime.utcnow()
+    timed_out = []
+    for task in tasks:
+        deadline = task_deadline(task, latencies.get(task.agent_id), client_ends.get(task.id))
+        if deadline is None or now <= deadline:
+            continue
+        task.status = "timed_out"
+        task.finished_at = now
+        if task.type == "iperf_client_run":
+            advance_search(db, task, None)
+        elif task.type == "iperf_server_start":
+            db.query(PortReservation).filter(
+                PortReservation.task_id == task.id,
+                PortReservation.released_at.is_(None)
+            ).update({"released_at": now}, synchronize_session=False)
+        timed_out.append(task)
+
+    # Clients timed out above end their servers' lifetimes too
+    db.flush()
+    stopped = stop_idle_servers(db, tests)
+    return {"timed_out": timed_out, "stopped": stopped}
@@ -0,0 +1,258 @@
+"""Streaming bulk export of exercise results.
+
+Rows are produced incrementally: tests are read in keyset-paginated batches,
+each in its own short read transaction, so memory stays flat and a long
+export never pins the WAL. Two row kinds are exported:
+- tests: one row per test with the client task's headline metrics
+- intervals: one row per iperf3 reporting interval of each client run
+
+NDJSON and CSV are always available; Parquet needs the optional pyarrow
+package (`poetry install -E export`) and is written one row group per batch.
+"""
+import csv
+import io
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from sqlalchemy.orm import Session, defer
+from app.database import SessionLocal
+from app.models.exercise import Exercise
+from app.models.task import Task
+from app.models.test import Test
+from app.services.archive import load_archived_results
+from app.services.results import summary_for_task
+from app.services.tuning import tuning_key, tuning_options
+import orjson
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional dependency
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# Tests read per batch (and rows per Parquet row group for test rows)
+EXPORT_BATCH = 200
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Column name and Parquet type for each row kind, in output order
+COLUMNS = {
+    "tests": (
+        ("exercise_id", "int64"), ("exercise_name", "string"), ("test_id", "int64"),
+        ("server_agent_id", "int64"), ("client_agent_id", "int64"), ("server_port", "int64"),
+        ("udp", "bool"), ("parallel", "int64"), ("time_seconds", "int64"), ("tuning", "string"),
+        ("task_id", "int64"), ("status", "string"),
+        ("started_at", "timestamp"), ("finished_at", "timestamp"),
+        ("bps_avg", "float64"), ("retransmits", "int64"), ("jitter_ms", "float64"), ("loss_pct", "float64"),
+        ("rtt_ms", "float64"),
+    ),
+    "intervals": (
+        ("exercise_id", "int64"), ("test_id", "int64"), ("task_id", "int64"), ("interval", "int64"),
+        ("start", "float64"), ("end", "float64"), ("seconds", "float64"), ("bytes", "int64"),
+        ("bits_per_second", "float64"), ("retransmits", "int64"), ("jitter_ms", "float64"),
+        ("lost_percent", "float64"), ("omitted", "bool"),
+    ),
+}
+
+
+def parquet_available() -> bool:
+    return pyarrow is not None
+
+
+class ExportFilter:
+    """Exercises selected for export: explicit IDs and/or a started_at window"""
+
+    def __init__(
+        self,
+        exercise_ids: Optional[Sequence[int]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ):
+        self.exercise_ids = list(exercise_ids or [])
+        self.since = since
+        self.until = until
+
+    def apply(self, query):
+        if self.exercise_ids:
+            query = query.filter(Exercise.id.in_(self.exercise_ids))
+        if self.since is not None:
+            query = query.filter(Exercise.started_at >= self.since)
+        if self.until is not None:
+            query = query.filter(Exercise.started_at < self.until)
+        return query
+
+
+def _test_batches(db: Session, selection: ExportFilter, with_results: bool) -> Iterator[List[tuple]]:
+    """(test, exercise name, client task) batches in test ID order"""
+    last_id = 0
+    while True:
+        query = db.query(Test, Exercise.name, Task).join(
+            Exercise, Exercise.id == Test.exercise_id
+        ).outerjoin(Task, Task.id == Test.client_task_id)
+        if not with_results:
+            query = query.options(defer(Task.result))
+        batch = selection.apply(query).filter(Test.id > last_id).order_by(Test.id).limit(EXPORT_BATCH).all()
+        if not batch:
+            return
+        last_id = batch[-1][0].id
+        if with_results:
+            load_archived_results([task for _, _, task in batch if task is not None])
+        yield batch
+        # End the read transaction between batches
+        db.rollback()
+
+
+def _test_row(test: Test, exercise_name: str, task: Optional[Task]) -> Dict[str, Any]:
+    metrics = (summary_for_task(task) if task is not None and task.status == "succeeded" else None) or {}
+    return {
+        "exercise_id": test.exercise_id,
+        "exercise_name": exercise_name,
+        "test_id": test.id,
+        "server_agent_id": test.server_agent_id,
+        "client_agent_id": test.client_agent_id,
+        "server_port": test.server_port,
+        "udp": test.udp,
+        "parallel": test.parallel,
+        "time_seconds": test.time_seconds,
+        "tuning": tuning_key(tuning_options(test)),
+        "task_id": task.id if task is not None else None,
+        "status": task.status if task is not None else "pending",
+        "started_at": task.started_at if task is not None else None,
+        "finished_at": task.finished_at if task is not None else None,
+        "bps_avg": metrics.get("bps_avg"),
+        "retransmits": metrics.get("retransmits"),
+        "jitter_ms": metrics.get("jitter_ms"),
+        "loss_pct": metrics.get("loss_pct"),
+        "rtt_ms": metrics.get("rtt_ms"),
+    }
+
+
+def _interval_rows(test: Test, task: Optional[Task]) -> List[Dict[str, Any]]:
+    if task is None or not task.result:
+        return []
+    try:
+        intervals = orjson.loads(task.result).get("intervals") or []
+    except (orjson.JSONDecodeError, AttributeError):
+        return []
+
+    rows = []
+    for index, interval in enumerate(intervals):
+        total = (interval.get("sum") if isinstance(interval, dict) else None) or {}
+        rows.append({
+            "exercise_id": test.exercise_id,
+            "test_id": test.id,
+            "task_id": task.id,
+            "interval": index,
+            "start": total.get("start"),
+            "end": total.get("end"),
+            "seconds": total.get("seconds"),
+            "bytes": total.get("bytes"),
+            "bits_per_second": total.get("bits_per_second"),
+            "retransmits": total.get("retransmits"),
+            "jitter_ms": total.get("jitter_ms"),
+            "lost_percent": total.get("lost_percent"),
+            "omitted": total.get("omitted"),
+        })
+    return rows
+
+
+def iter_rows(db: Session, kind: str, selection: ExportFilter) -> Iterator[List[Dict[str, Any]]]:
+    """Export rows of the given kind, one list per batch of tests"""
+    for batch in _test_batches(db, selection, with_results=kind == "intervals"):
+        if kind == "tests":
+            yield [_test_row(test, name, task) for test, name, task in batch]
+        else:
+            rows: List[Dict[str, Any]] = []
+            for test, _, task in batch:
+                rows.extend(_interval_rows(test, task))
+            if rows:
+                yield rows
+
+
+def _ndjson(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    for rows in batches:
+        yield b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv(kind: str, batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    names = [name for name, _ in COLUMNS[kind]]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for rows in batches:
+        for row in rows:
+            writer.writerow([_csv_value(row[name]) for name in names])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file collecting what the Parquet writer emits between batches"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _parquet(kind: str, batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    types = {
+        "int64": pyarrow.int64(), "float64": pyarrow.float64(), "bool": pyarrow.bool_(),
+        "string": pyarrow.string(), "timestamp": pyarrow.timestamp("us"),
+    }
+    schema = pyarrow.schema([(name, types[type_name]) for name, type_name in COLUMNS[kind]])
+    sink = _Drain()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in batches:
+            writer.write_table(pyarrow.Table.from_pylist(rows, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    # The footer is written on close
+    yield sink.take()
+
+
+def stream_export(kind: str, fmt: str, selection: ExportFilter) -> Iterator[bytes]:
+    """Encoded export body, produced batch by batch from its own session"""
+    db = SessionLocal()
+    try:
+        batches = iter_rows(db, kind, selection)
+        if fmt == "ndjson":
+            yield from _ndjson(batches)
+        elif fmt == "csv":
+            yield from _csv(kind, batches)
+        else:
+            yield from _parquet(kind, batches)
+    finally:
+        db.close()
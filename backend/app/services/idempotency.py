@@ -1,31 +1,97 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Tuple, Union
+from collections import OrderedDict
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from app.config import settings
 from app.models.idempotency_log import IdempotencyLog
-from datetime import datetime
+from datetime import datetime, timedelta
+
+
+class _ResponseCache:
+    """Size-bounded LRU of recent idempotent responses (encoded JSON text).
+
+    Only touched from the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[datetime, str]]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str], cutoff: datetime) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, response = entry
+        if created_at < cutoff:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def put(self, key: Tuple[str, str], created_at: datetime, response: str) -> None:
+        self._entries[key] = (created_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+response_cache = _ResponseCache(settings.idempotency_cache_size)
+
+
+def _cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.idempotency_ttl_seconds)
 
 
 class IdempotencyService:
     def __init__(self, db: Session):
         self.db = db
     
-    def get_cached_response(self, key: str, endpoint: str) -> Optional[Dict[str, Any]]:
-        """Get cached response for idempotency key"""
+    def get_cached_response(self, key: str, endpoint: str) -> Optional[str]:
+        """Get cached response body (JSON text) for idempotency key, if it hasn't expired"""
+        cutoff = _cutoff()
+        response = response_cache.get((key, endpoint), cutoff)
+        if response is not None:
+            return response
+
         cached = self.db.query(IdempotencyLog).filter(
             IdempotencyLog.key == key,
-            IdempotencyLog.endpoint == endpoint
+            IdempotencyLog.endpoint == endpoint,
+            IdempotencyLog.created_at >= cutoff
         ).first()
         
         if cached:
+            response_cache.put((key, endpoint), cached.created_at, cached.response)
             return cached.response
         return None
     
-    def cache_response(self, key: str, endpoint: str, response: Dict[str, Any]) -> None:
-        """Cache response for idempotency key"""
+    def cache_response(self, key: str, endpoint: str, response: Union[str, bytes]) -> None:
+        """Cache encoded response body for idempotency key"""
+        if isinstance(response, bytes):
+            response = response.decode("utf-8")
+        created_at = datetime.utcnow()
         cached = IdempotencyLog(
             key=key,
             endpoint=endpoint,
             response=response,
-            created_at=datetime.utcnow()
+            created_at=created_at
         )
         self.db.add(cached)
-        self.db.commit()
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # A concurrent retry stored the same key first; keep its response
+            self.db.rollback()
+            return
+        response_cache.put((key, endpoint), created_at, response)
+
+
+def purge_expired(db: Session) -> int:
+    """Delete idempotency records older than the TTL, returning the count"""
+    deleted = db.query(IdempotencyLog).filter(
+        IdempotencyLog.created_at < _cutoff()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
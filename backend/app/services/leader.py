@@ -0,0 +1,73 @@
+"""Leader election among manager workers, with a lease row.
+
+Background jobs must run in one process only: two exercise auto-enders would
+each queue kill_all tasks for the same exercise. Every worker tries to take
+the background lease in worker_leases every LEADER_LEASE_SECONDS / 3:
+- the holder renews it, moving expires_at forward
+- any worker takes it over once it has expired
+- a worker that shuts down releases it for the next attempt by another
+
+Each step is a single conditional UPDATE or INSERT, so two workers never
+both win. A worker holds the lease until LEADER_LEASE_SECONDS after its last
+successful attempt began, and only then runs background jobs (held()). The
+lease is timed by each worker's clock, so replicas on separate hosts need
+synchronized clocks.
+"""
+import os
+import secrets
+import socket
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.worker_lease import WorkerLease
+
+BACKGROUND_LEASE = "background"
+
+# Unique per process, and readable in the worker_leases table
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+
+
+def acquire_lease(db: Session, name: str, holder: str, seconds: float) -> bool:
+    """Take or renew a lease, returning whether holder now has it"""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=seconds)
+    held = db.query(WorkerLease).filter(
+        WorkerLease.name == name,
+        WorkerLease.holder == holder
+    ).update({"expires_at": expires_at}, synchronize_session=False)
+    if not held:
+        held = db.query(WorkerLease).filter(
+            WorkerLease.name == name,
+            WorkerLease.expires_at < now
+        ).update({"holder": holder, "acquired_at": now, "expires_at": expires_at}, synchronize_session=False)
+    if not held:
+        # No row yet, or another worker holds it
+        db.add(WorkerLease(name=name, holder=holder, acquired_at=now, expires_at=expires_at))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
+def release_lease(db: Session, name: str, holder: str) -> None:
+    db.query(WorkerLease).filter(
+        WorkerLease.name == name,
+        WorkerLease.holder == holder
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+class Leadership:
+    """This worker's hold on the background lease"""
+
+    def __init__(self):
+        self.held_until = 0.0  # time.monotonic()
+
+    def held(self) -> bool:
+        return time.monotonic() < self.held_until
+
+
+leadership = Leadership()
@@ -0,0 +1,127 @@
+"""Wake-ups between manager workers, through the database.
+
+Any number of uvicorn workers (or replicas) serve agents from one database,
+so a task queued by one worker must reach an agent whose heartbeat is
+waiting on another. Making tasks claimable records a row on each agent's
+channel in the same transaction (notify_agents). Every worker runs a
+listener that reads new rows every NOTIFY_POLL_SECONDS (read_new) and wakes
+the subscriptions on their channels in its own process.
+
+Rows are read by ID. SQLite hands IDs out in commit order, but other
+databases need not, so each read also goes back NOTIFY_MARGIN and skips rows
+already seen. The leader purges rows older than NOTIFY_RETENTION.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.notification import Notification
+
+NOTIFY_MARGIN = timedelta(seconds=5)
+NOTIFY_RETENTION = timedelta(minutes=5)
+
+
+def agent_channel(agent_id: int) -> str:
+    return f"agent:{agent_id}"
+
+
+def notify_agents(db: Session, agent_ids: Iterable[int]) -> None:
+    """Wake the agents' waiting heartbeats on every worker. The caller commits."""
+    now = datetime.utcnow()
+    db.add_all(
+        Notification(channel=agent_channel(agent_id), created_at=now)
+        for agent_id in sorted(set(agent_ids)) if agent_id is not None
+    )
+
+
+class _Reader:
+    """Read position in the notifications table for this process"""
+
+    def __init__(self):
+        self.last_id: Optional[int] = None
+        # ID -> created_at of rows read within the margin
+        self.seen: Dict[int, datetime] = {}
+
+    def read(self, db: Session) -> Set[str]:
+        if self.last_id is None:
+            # Start from the present; earlier rows woke nobody here
+            self.last_id = db.query(func.max(Notification.id)).scalar() or 0
+            return set()
+
+        cutoff = datetime.utcnow() - NOTIFY_MARGIN
+        rows = db.query(Notification.id, Notification.channel, Notification.created_at).filter(
+            (Notification.id > self.last_id) | (Notification.created_at > cutoff)
+        ).all()
+
+        channels = set()
+        for notification_id, channel, created_at in rows:
+            if notification_id in self.seen:
+                continue
+            self.seen[notification_id] = created_at
+            channels.add(channel)
+            self.last_id = max(self.last_id, notification_id)
+        self.seen = {key: created_at for key, created_at in self.seen.items() if created_at > cutoff}
+        return channels
+
+
+_reader = _Reader()
+
+
+def read_new(db: Session) -> Set[str]:
+    """Channels notified since the last read"""
+    return _reader.read(db)
+
+
+def purge_notifications(db: Session) -> int:
+    """Delete rows every listener has long read, returning the count"""
+    deleted = db.query(Notification).filter(
+        Notification.created_at < datetime.utcnow() - NOTIFY_RETENTION
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+# Subscriptions per channel; only touched from the event loop thread
+_subscriptions: Dict[str, List["Subscription"]] = {}
+
+
+class Subscription:
+    """Wake-ups on one channel in this process.
+
+    Subscribe before checking for work, so a notification committed in
+    between is not missed:
+
+        with Subscription(agent_channel(agent.id)) as subscription:
+            ... claim; if nothing, await subscription.wait(timeout) ...
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self._event = asyncio.Event()
+
+    def __enter__(self) -> "Subscription":
+        _subscriptions.setdefault(self.channel, []).append(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        subscriptions = _subscriptions.get(self.channel, [])
+        subscriptions.remove(self)
+        if not subscriptions:
+            _subscriptions.pop(self.channel, None)
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for a notification, returning False on timeout"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+
+def wake(channels: Iterable[str]) -> None:
+    """Wake this process's subscriptions on the given channels"""
+    for channel in channels:
+        for subscription in _subscriptions.get(channel, []):
+            subscription._event.set()
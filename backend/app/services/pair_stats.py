@@ -0,0 +1,278 @@
+"""Materialized per agent pair statistics and the network matrix.
+
+Each (sending agent, receiving agent, protocol) pair has one agent_pair_stats
+row, updated in O(1) on every succeeded client result. The sender is stored
+as client_agent_id: a -R run feeds the (server, client) row and a --bidir
+run feeds both. For each metric the
+row keeps the count, last value, EWMA, min and max. It also keeps a
+log-bucketed quantile sketch (DDSketch-style, ~1% relative error, at most
+SKETCH_MAX_BUCKETS buckets) and the p50/p95 read from it. Reads never touch
+Test or Task rows. The matrix endpoint pulls one statistic per pair out of
+the JSON column and keeps the grid cached. Every write bumps the pair_stats
+change counter and stamps the rows it touched with the new value, so a
+cached grid patches in exactly the rows written since its last read.
+"""
+import math
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.agent import Agent
+from app.models.agent_pair_stats import AgentPairStats
+from app.models.task import Task
+from app.models.test import Test
+from app.responses import dump_json
+from app.services.baselines import replay_client_results
+from app.services.counters import bump_counter, read_counters
+from app.services.results import direction_summaries
+
+# Summary metrics tracked per pair (loss and jitter are only reported for UDP,
+# RTT only for TCP on Linux senders)
+METRICS = ("bps_avg", "loss_pct", "jitter_ms", "rtt_ms", "retransmits")
+STATS = ("last", "ewma", "p50", "p95", "min", "max", "count")
+
+# Sketch buckets grow by GAMMA, so a bucket's midpoint is within
+# SKETCH_ACCURACY of every value in it
+SKETCH_ACCURACY = 0.01
+GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+# Lowest buckets are merged beyond this, trading accuracy at the low tail
+SKETCH_MAX_BUCKETS = 256
+
+# Matrices kept per (protocol, metric, stat, include_disabled)
+MATRIX_CACHE_ENTRIES = 32
+
+# Change counters: bumped by every write to agent_pair_stats, and by rebuilds
+PAIR_STATS_COUNTER = "pair_stats"
+PAIR_STATS_REBUILDS = "pair_stats_rebuilds"
+
+
+def _bucket(value: float) -> int:
+    return math.ceil(math.log(value) / _LOG_GAMMA)
+
+
+def _bucket_value(index: int) -> float:
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+def sketch_add(sketch: Dict[str, Any], value: float) -> None:
+    """Add a value to a {"zero": n, "buckets": {index: n}} sketch in place"""
+    if value <= 0:
+        sketch["zero"] = sketch.get("zero", 0) + 1
+        return
+    buckets = sketch.setdefault("buckets", {})
+    key = str(_bucket(value))
+    buckets[key] = buckets.get(key, 0) + 1
+    if len(buckets) > SKETCH_MAX_BUCKETS:
+        lowest, second = sorted(buckets, key=int)[:2]
+        buckets[second] += buckets.pop(lowest)
+
+
+def sketch_quantile(sketch: Dict[str, Any], q: float) -> Optional[float]:
+    buckets = sketch.get("buckets") or {}
+    zero = sketch.get("zero", 0)
+    total = zero + sum(buckets.values())
+    if total == 0:
+        return None
+    rank = q * (total - 1)
+    if rank < zero:
+        return 0.0
+    seen = zero
+    for key in sorted(buckets, key=int):
+        seen += buckets[key]
+        if seen > rank:
+            return _bucket_value(int(key))
+    return _bucket_value(max(int(key) for key in buckets))
+
+
+def _protocol(test: Test) -> str:
+    return "udp" if test.udp else "tcp"
+
+
+def _pairs(test: Test, summary: Dict[str, Any]) -> Iterator[Tuple[Tuple[int, int, str], Dict[str, Any]]]:
+    """((sender, receiver, protocol), metrics) for each direction of a result"""
+    for direction, metrics in direction_summaries(summary):
+        if direction == "server_to_client":
+            yield (test.server_agent_id, test.client_agent_id, _protocol(test)), metrics
+        else:
+            yield (test.client_agent_id, test.server_agent_id, _protocol(test)), metrics
+
+
+def _get_or_create(db: Session, key: Tuple[int, int, str], now: datetime) -> AgentPairStats:
+    sender_id, receiver_id, protocol = key
+    row = db.query(AgentPairStats).filter(
+        AgentPairStats.client_agent_id == sender_id,
+        AgentPairStats.server_agent_id == receiver_id,
+        AgentPairStats.protocol == protocol
+    ).first()
+    if row is None:
+        row = AgentPairStats(
+            client_agent_id=sender_id,
+            server_agent_id=receiver_id,
+            protocol=protocol,
+            count=0,
+            stats={},
+            sketches={},
+            updated_at=now
+        )
+        db.add(row)
+        db.flush()
+    return row
+
+
+def _apply(row: AgentPairStats, task: Task, summary: Dict[str, Any], now: datetime) -> None:
+    stats = dict(row.stats or {})
+    sketches = dict(row.sketches or {})
+    alpha = settings.pair_stats_ewma_alpha
+
+    for metric in METRICS:
+        value = summary.get(metric)
+        if value is None:
+            continue
+        value = float(value)
+        current = dict(stats.get(metric) or {})
+        sketch = dict(sketches.get(metric) or {})
+        sketch["buckets"] = dict(sketch.get("buckets") or {})
+        sketch_add(sketch, value)
+
+        count = current.get("count", 0)
+        current.update({
+            "last": value,
+            "ewma": value if count == 0 else alpha * value + (1 - alpha) * current["ewma"],
+            "min": value if count == 0 else min(current["min"], value),
+            "max": value if count == 0 else max(current["max"], value),
+            "count": count + 1,
+            "p50": sketch_quantile(sketch, 0.5),
+            "p95": sketch_quantile(sketch, 0.95)
+        })
+        stats[metric] = current
+        sketches[metric] = sketch
+
+    # Reassign so the JSON columns are marked dirty
+    row.stats = stats
+    row.sketches = sketches
+    row.count += 1
+    row.last_task_id = task.id
+    row.last_result_at = task.finished_at
+    row.updated_at = now
+
+
+def record_pair_result(db: Session, test: Test, task: Task, summary: Dict[str, Any]) -> None:
+    """Fold a succeeded client result into its pairs' stats. The caller commits."""
+    now = datetime.utcnow()
+    pairs = list(_pairs(test, summary))
+    if not pairs:
+        return
+    version = bump_counter(db, PAIR_STATS_COUNTER)
+    for key, metrics in pairs:
+        row = _get_or_create(db, key, now)
+        _apply(row, task, metrics, now)
+        row.version = version
+
+
+def rebuild_pair_stats(db: Session) -> Dict[str, int]:
+    """Recompute every pair's stats from stored results, oldest first"""
+    db.query(AgentPairStats).delete(synchronize_session=False)
+    db.flush()
+
+    rows: Dict[Tuple[int, int, str], AgentPairStats] = {}
+    results = 0
+    for test, task, summary in replay_client_results(db):
+        for key, metrics in _pairs(test, summary):
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = _get_or_create(db, key, task.finished_at)
+            _apply(row, task, metrics, task.finished_at)
+        results += 1
+
+    # Cached matrices start over, dropping pairs that no longer exist
+    version = bump_counter(db, PAIR_STATS_COUNTER)
+    bump_counter(db, PAIR_STATS_REBUILDS)
+    now = datetime.utcnow()
+    for row in rows.values():
+        row.updated_at = now
+        row.version = version
+    db.commit()
+    return {"pairs": len(rows), "results": results}
+
+
+class _MatrixState:
+    """One cached matrix: the grid, its encoding and the pair_stats version
+    it has read up to"""
+    __slots__ = ("agents_version", "rebuilds", "agents", "index", "values", "version", "body")
+
+    def __init__(self, agents_version: tuple, rebuilds: int, agents: List[tuple]):
+        self.agents_version = agents_version
+        self.rebuilds = rebuilds
+        self.agents = agents
+        self.index = {agent_id: i for i, (agent_id, _) in enumerate(agents)}
+        self.values: List[List[Optional[float]]] = [[None] * len(agents) for _ in agents]
+        self.version: Optional[int] = None
+        self.body: Optional[bytes] = None
+
+
+# Matrices per (protocol, metric, stat, include_disabled); only touched from
+# the event loop thread
+_matrices: "OrderedDict[tuple, _MatrixState]" = OrderedDict()
+
+
+def _agents_version(db: Session) -> tuple:
+    return tuple(tuple(agent) for agent in db.query(Agent.id, Agent.name, Agent.disabled).order_by(Agent.id))
+
+
+def render_matrix(db: Session, protocol: str, metric: str, stat: str, include_disabled: bool = False) -> bytes:
+    """Encoded N x N matrix of one statistic over agents ordered by ID.
+
+    values[i][j] is the statistic for traffic from agents[i] (client) to
+    agents[j] (server), or null where the pair has no results. Server-to-client
+    traffic of -R and --bidir runs counts from the server agent. Cached grids
+    are patched with the rows written since they last read (an index range on
+    version), so results from any worker show up without a full rebuild.
+    """
+    key = (protocol, metric, stat, include_disabled)
+    agents_version = _agents_version(db)
+    counters = read_counters(db, PAIR_STATS_COUNTER, PAIR_STATS_REBUILDS)
+    version, rebuilds = counters[PAIR_STATS_COUNTER], counters[PAIR_STATS_REBUILDS]
+    state = _matrices.get(key)
+    if state is None or state.agents_version != agents_version or state.rebuilds != rebuilds:
+        query = db.query(Agent.id, Agent.name).order_by(Agent.id)
+        if not include_disabled:
+            query = query.filter(Agent.disabled.is_(False))
+        state = _MatrixState(agents_version, rebuilds, [tuple(agent) for agent in query.all()])
+    _matrices[key] = state
+    _matrices.move_to_end(key)
+    while len(_matrices) > MATRIX_CACHE_ENTRIES:
+        _matrices.popitem(last=False)
+    if state.version is not None and state.version >= version:
+        return state.body
+
+    query = db.query(
+        AgentPairStats.client_agent_id,
+        AgentPairStats.server_agent_id,
+        AgentPairStats.stats[(metric, stat)],
+        AgentPairStats.version
+    ).filter(AgentPairStats.protocol == protocol)
+    if state.version is not None:
+        query = query.filter(AgentPairStats.version > state.version)
+
+    changed = False
+    for client_id, server_id, value, row_version in query:
+        # Rows committed since the counter was read may already show up
+        version = max(version, row_version)
+        row, column = state.index.get(client_id), state.index.get(server_id)
+        if row is not None and column is not None and state.values[row][column] != value:
+            state.values[row][column] = value
+            changed = True
+
+    state.version = version
+
+    if changed or state.body is None:
+        state.body = dump_json({
+            "protocol": protocol,
+            "metric": metric,
+            "stat": stat,
+            "agents": [{"id": agent_id, "name": name} for agent_id, name in state.agents],
+            "values": state.values
+        })
+    return state.body
@@ -0,0 +1,145 @@
+from typing import Iterable, List, Optional, Tuple, Union
+from collections import OrderedDict
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from app.config import settings
+from app.models.exercise import Exercise
+from app.models.exercise_result_cache import ExerciseResultCache
+from app.models.task import Task
+from app.models.test import Test
+from datetime import datetime
+
+TERMINAL_TASK_STATUSES = ("succeeded", "failed", "canceled", "timed_out")
+
+# Statuses a task can still receive a result in after its exercise ended
+LATE_RESULT_STATUSES = ("succeeded", "timed_out")
+
+
+class _RenderedCache:
+    """Byte-bounded LRU of rendered exercise responses (encoded JSON text).
+
+    Entries carry the exercise's result_version so a late result makes them
+    stale without a cross-worker eviction. Only touched from the event loop
+    thread, so no locking is needed.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[int, str]]" = OrderedDict()
+
+    def get(self, key: Tuple[int, str], version: int) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] != version:
+            self.discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: Tuple[int, str], version: int, body: str) -> None:
+        if len(body) > self.max_bytes:
+            return
+        self.discard(key)
+        self._entries[key] = (version, body)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def discard(self, key: Tuple[int, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+
+rendered_cache = _RenderedCache(settings.result_cache_bytes)
+
+
+def is_immutable(exercise: Exercise, tasks: Iterable[Task]) -> bool:
+    """Whether the exercise's detail and results can no longer change"""
+    return exercise.ended_at is not None and all(task.status in TERMINAL_TASK_STATUSES for task in tasks)
+
+
+class ResultCacheService:
+    """Rendered detail/results responses for ended exercises, in memory and in the DB"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get(self, exercise: Exercise, kind: str) -> Optional[str]:
+        """Cached response body for the exercise's current result version"""
+        if exercise.ended_at is None:
+            return None
+        key = (exercise.id, kind)
+        body = rendered_cache.get(key, exercise.result_version)
+        if body is not None:
+            return body
+
+        cached = self.db.query(ExerciseResultCache).filter(
+            ExerciseResultCache.exercise_id == exercise.id,
+            ExerciseResultCache.kind == kind,
+            ExerciseResultCache.version == exercise.result_version
+        ).first()
+        if cached is None:
+            return None
+        rendered_cache.put(key, cached.version, cached.body)
+        return cached.body
+
+    def put(self, exercise: Exercise, kind: str, body: Union[str, bytes]) -> None:
+        """Store a rendered response; the caller checks is_immutable() first.
+
+        Detail responses of archived exercises embed their results, so they
+        are only kept in memory.
+        """
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        if kind == "detail" and exercise.archived_at is not None:
+            rendered_cache.put((exercise.id, kind), exercise.result_version, body)
+            return
+        self.db.query(ExerciseResultCache).filter(
+            ExerciseResultCache.exercise_id == exercise.id,
+            ExerciseResultCache.kind == kind
+        ).delete(synchronize_session=False)
+        self.db.add(ExerciseResultCache(
+            exercise_id=exercise.id,
+            kind=kind,
+            version=exercise.result_version,
+            body=body,
+            created_at=datetime.utcnow()
+        ))
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # A concurrent request stored the same response first
+            self.db.rollback()
+            return
+        rendered_cache.put((exercise.id, kind), exercise.result_version, body)
+
+
+def invalidate_for_task(db: Session, task_id: int) -> List[int]:
+    """Bump the result version of the ended exercise owning task_id and drop
+    its stored responses, returning the affected exercise IDs. The caller commits."""
+    exercises = db.query(Exercise).join(Test, Test.exercise_id == Exercise.id).filter(
+        or_(Test.server_task_id == task_id, Test.client_task_id == task_id),
+        Exercise.ended_at.isnot(None)
+    ).all()
+    for exercise in exercises:
+        exercise.result_version += 1
+        db.query(ExerciseResultCache).filter(
+            ExerciseResultCache.exercise_id == exercise.id
+        ).delete(synchronize_session=False)
+    return [exercise.id for exercise in exercises]
+
+
+def evict(exercise_ids: Iterable[int]) -> None:
+    """Free memory held for the exercises (stale entries would miss anyway)"""
+    for exercise_id in exercise_ids:
+        for kind in ("detail", "results"):
+            rendered_cache.discard((exercise_id, kind))
@@ -0,0 +1,155 @@
+from typing import Optional, Dict, Any, List, Tuple
+from fastapi import HTTPException, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from app.schemas.task import TaskResultRequest
+import orjson
+
+
+# Traffic directions of a test, named by which end sends
+DIRECTIONS = ("client_to_server", "server_to_client")
+
+
+def _direction(end: Dict[str, Any], suffix: str) -> Optional[Dict[str, Any]]:
+    """Sender and receiver sums of one direction of an iperf3 end block.
+
+    --bidir reports the server-to-client half under the *_bidir_reverse keys.
+    """
+    sent = end.get("sum_sent" + suffix)
+    if not isinstance(sent, dict):
+        return None
+    received = end.get("sum_received" + suffix) or {}
+    udp = end.get("sum" + suffix) or {}
+    return {
+        "bps_avg": sent.get("bits_per_second", 0),
+        "bps_received": received.get("bits_per_second"),
+        "retransmits": sent.get("retransmits", 0),
+        "jitter_ms": udp.get("jitter_ms"),
+        "loss_pct": udp.get("lost_percent")
+    }
+
+
+def extract_summary(result: Any) -> Optional[Dict[str, Any]]:
+    """Headline metrics from a parsed iperf3 JSON document, if it has any.
+
+    Top-level metrics are the main sums iperf3 reports (the server's sending
+    with -R, the client's otherwise); "directions" splits them by direction,
+    with both halves of a --bidir run.
+    """
+    if not isinstance(result, dict):
+        return None
+    end = result.get("end")
+    if not isinstance(end, dict) or "sum_sent" not in end:
+        return None
+
+    sum_sent = end["sum_sent"]
+    # TCP senders report smoothed RTT per stream in microseconds (Linux only)
+    rtts = [
+        stream["sender"]["mean_rtt"] for stream in end.get("streams") or []
+        if isinstance(stream, dict) and isinstance(stream.get("sender"), dict) and stream["sender"].get("mean_rtt") is not None
+    ]
+    rtt_ms = sum(rtts) / len(rtts) / 1000 if rtts else None
+
+    test_start = (result.get("start") or {}).get("test_start") or {}
+    reverse = bool(test_start.get("reverse"))
+    main = _direction(end, "")
+    # Only the local (client) senders measure RTT
+    main["rtt_ms"] = None if reverse else rtt_ms
+    directions = {DIRECTIONS[1] if reverse else DIRECTIONS[0]: main}
+    bidir_reverse = _direction(end, "_bidir_reverse")
+    if bidir_reverse is not None:
+        bidir_reverse["rtt_ms"] = None
+        directions[DIRECTIONS[1]] = bidir_reverse
+
+    return {
+        "bps_avg": sum_sent.get("bits_per_second", 0),
+        "retransmits": sum_sent.get("retransmits", 0),
+        "jitter_ms": end.get("sum", {}).get("jitter_ms"),
+        "loss_pct": end.get("sum", {}).get("lost_percent"),
+        "rtt_ms": rtt_ms,
+        "directions": directions
+    }
+
+
+def direction_summaries(summary: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """(direction, metrics) for each direction a summary measured.
+
+    Summaries stored before directions were split are client-to-server.
+    """
+    directions = summary.get("directions")
+    if not directions:
+        return [(DIRECTIONS[0], summary)]
+    return [(direction, directions[direction]) for direction in DIRECTIONS if direction in directions]
+
+
+def summary_for_task(task) -> Optional[Dict[str, Any]]:
+    """Stored summary, or one extracted from the raw result for rows ingested
+    before summaries were recorded"""
+    if task.summary is not None:
+        return task.summary
+    if not task.result:
+        return None
+    try:
+        return extract_summary(orjson.loads(task.result))
+    except orjson.JSONDecodeError:
+        return None
+
+
+def load_json_body(raw: bytes) -> Any:
+    """Decode a request body with orjson, as a 422 if it is malformed"""
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                "error": "invalid_json",
+                "message": "Request body is not valid JSON",
+                "details": {"error": str(e)}
+            }
+        )
+
+
+def body_validation_error(e: ValidationError) -> RequestValidationError:
+    """Report a manually validated body the way FastAPI reports bound bodies"""
+    return RequestValidationError(
+        [{**error, "loc": ("body", *error["loc"])} for error in e.errors()]
+    )
+
+
+def split_result_upload(body: Dict[str, Any]) -> Tuple[TaskResultRequest, Optional[bytes], Optional[Dict[str, Any]]]:
+    """Split a decoded task result upload into its envelope, encoded result
+    and summary.
+
+    Only the small envelope goes through Pydantic; the iperf3 document is
+    re-encoded by orjson for storage. Raises ValidationError for a bad envelope.
+    """
+    body = dict(body)
+    result = body.pop("result", None)
+    envelope = TaskResultRequest.model_validate(body)
+
+    if result is None:
+        return envelope, None, None
+    return envelope, orjson.dumps(result), extract_summary(result)
+
+
+def parse_result_upload(raw: bytes) -> Tuple[TaskResultRequest, Optional[bytes], Optional[Dict[str, Any]]]:
+    """Parse a raw task result request body.
+
+    orjson's well-formedness check is all the validation the iperf3 document
+    gets, and the stdlib json module never sees it.
+    """
+    body = load_json_body(raw)
+    if not isinstance(body, dict):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                "error": "invalid_json",
+                "message": "Request body must be a JSON object"
+            }
+        )
+
+    try:
+        return split_result_upload(body)
+    except ValidationError as e:
+        raise body_validation_error(e)
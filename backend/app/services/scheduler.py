@@ -0,0 +1,155 @@
+"""Exercise scheduling across the shared agent fleet.
+
+Concurrent iperf3 runs on one agent share its NIC and CPU, so a running
+exercise holds every agent its tests use until it ends. Starting an
+exercise queues it (Exercise.queued_at). The queue is ordered by priority
+(lower first), then by queue time. The scheduler releases queued exercises
+in that order once none of their agents is held:
+- exercises on disjoint agents run side by side
+- a later exercise may start ahead of a blocked one, as long as it uses
+  none of the blocked exercise's agents
+
+Each queued exercise, in turn, claims its agents, so nothing behind it can
+keep it waiting.
+
+With SCHEDULER_EXCLUSIVE_AGENTS=false nothing is held and every exercise
+starts as soon as it is queued. With SCHEDULER_PREEMPT=true, a queued
+exercise whose agents are held only by less urgent running exercises ends
+them (see end_exercise) and starts in their place.
+
+Estimated start times come from the same pass. A running exercise holds its
+agents until its estimated end: the longest of its tests, counting omitted
+seconds, every trial of a search and START_OVERHEAD_SECONDS. A queued
+exercise starts once all its agents are free, then holds them for its own
+estimated duration.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Set, Tuple
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.exercise import Exercise
+from app.models.task import Task
+from app.models.test import Test
+from app.services.cancellation import end_exercise
+from app.services.notifications import notify_agents
+
+logger = logging.getLogger(__name__)
+
+# Client start delay plus the auto-ender's polling lag
+START_OVERHEAD_SECONDS = 10
+
+
+def _footprints(db: Session, exercises: List[Exercise]) -> Dict[int, Tuple[Set[int], float]]:
+    """(agent IDs, estimated seconds) per exercise"""
+    footprints = {exercise.id: (set(), 0.0) for exercise in exercises}
+    if not exercises:
+        return footprints
+    rows = db.query(
+        Test.exercise_id, Test.server_agent_id, Test.client_agent_id,
+        Test.time_seconds, Test.omit_seconds, Test.search
+    ).filter(Test.exercise_id.in_(list(footprints)))
+    for exercise_id, server_agent_id, client_agent_id, time_seconds, omit_seconds, search in rows:
+        agents, seconds = footprints[exercise_id]
+        agents.update((server_agent_id, client_agent_id))
+        test_seconds = (time_seconds or 0) + (omit_seconds or 0)
+        if search:
+            test_seconds *= search["max_trials"]
+        footprints[exercise_id] = (agents, max(seconds, test_seconds + START_OVERHEAD_SECONDS))
+    return footprints
+
+
+def _plan(db: Session, now: datetime) -> List[Tuple[Exercise, datetime, bool, List[Exercise]]]:
+    """(exercise, estimated start, startable now, running exercises to end
+    first) for each queued exercise, in queue order"""
+    queued = db.query(Exercise).filter(
+        Exercise.queued_at.isnot(None),
+        Exercise.started_at.is_(None),
+        Exercise.ended_at.is_(None)
+    ).order_by(Exercise.priority, Exercise.queued_at, Exercise.id).all()
+    if not queued:
+        return []
+    running = db.query(Exercise).filter(
+        Exercise.started_at.isnot(None),
+        Exercise.ended_at.is_(None)
+    ).all()
+    footprints = _footprints(db, running + queued)
+
+    # Running exercises on each agent, and when each agent is expected to be free
+    holders: Dict[int, List[Exercise]] = {}
+    free_at: Dict[int, datetime] = {}
+    for exercise in running:
+        agents, seconds = footprints[exercise.id]
+        # An overrunning exercise is expected to end any moment
+        end = max(exercise.started_at + timedelta(seconds=seconds), now)
+        for agent_id in agents:
+            free_at[agent_id] = max(free_at.get(agent_id, now), end)
+            holders.setdefault(agent_id, []).append(exercise)
+
+    # Agents claimed by queued exercises ahead in the queue, or by preemptors
+    claimed: Set[int] = set()
+    preempted: Set[int] = set()
+    plan = []
+    for exercise in queued:
+        agents, seconds = footprints[exercise.id]
+        blockers = {
+            blocker.id: blocker for agent_id in agents
+            for blocker in holders.get(agent_id, []) if blocker.id not in preempted
+        }
+        victims: List[Exercise] = []
+        startable = not settings.scheduler_exclusive_agents or not (agents & claimed or blockers)
+        if not startable and settings.scheduler_preempt and not agents & claimed and all(
+            blocker.priority > exercise.priority for blocker in blockers.values()
+        ):
+            startable = True
+            victims = list(blockers.values())
+            preempted.update(blockers)
+        start = now if startable else max(free_at.get(agent_id, now) for agent_id in agents)
+        for agent_id in agents:
+            free_at[agent_id] = start + timedelta(seconds=seconds)
+        claimed |= agents
+        plan.append((exercise, start, startable, victims))
+    return plan
+
+
+def _release(db: Session, exercise: Exercise, now: datetime) -> None:
+    """Mark an exercise started and make its queued tasks claimable"""
+    exercise.started_at = now
+    task_ids = [
+        task_id for test in db.query(Test).filter(Test.exercise_id == exercise.id)
+        for task_id in (test.server_task_id, test.client_task_id) if task_id
+    ]
+    if task_ids:
+        queued = db.query(Task).filter(Task.id.in_(task_ids), Task.status == "queued")
+        notify_agents(db, [agent_id for (agent_id,) in queued.with_entities(Task.agent_id).distinct()])
+        queued.update({"status": "pending", "pending_at": now}, synchronize_session=False)
+
+
+def schedule(db: Session) -> List[Exercise]:
+    """Start every queued exercise whose agents are free (or preemptable),
+    returning them.
+
+    Must run inside a write transaction (begin_write), so two passes never hand
+    the same agent out twice; the caller commits.
+    """
+    # Queue changes made by the caller must be visible to the plan
+    db.flush()
+    now = datetime.utcnow()
+    started = []
+    for exercise, _, startable, victims in _plan(db, now):
+        if not startable:
+            continue
+        for victim in victims:
+            end_exercise(db, victim, db.query(Test).filter(Test.exercise_id == victim.id).all())
+            logger.info(f"Exercise {victim.id} ({victim.name}) preempted by exercise {exercise.id} ({exercise.name})")
+        _release(db, exercise, now)
+        started.append(exercise)
+    return started
+
+
+def queue_status(db: Session) -> Dict[int, Dict[str, Any]]:
+    """queue_position (from 1) and estimated_start_at per queued exercise ID"""
+    return {
+        exercise.id: {"queue_position": position, "estimated_start_at": start}
+        for position, (exercise, start, _, _) in enumerate(_plan(db, datetime.utcnow()), start=1)
+    }
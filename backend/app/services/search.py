@@ -0,0 +1,164 @@
+"""Maximum-throughput search for UDP tests, in the style of RFC 2544.
+
+A search test runs as a series of short client trials against the test's
+one server process. Each trial offers a fixed load with -b. Trial 1 offers
+max_bitrate. After each trial the manager halves the bracket:
+- a trial whose loss is at or below loss_threshold_pct raises the floor
+- any other trial lowers the ceiling
+
+The next trial offers the middle of the bracket. The search ends once the
+bracket is within resolution_pct of its ceiling, or after max_trials. Its
+result is the highest rate that passed.
+
+Every trial is a plain iperf_client_run task recorded as a SearchTrial.
+Test.client_task_id follows the latest trial, so the exercise only ends
+once the search has. Progress is kept on Test.search_state:
+{"status", "low_bps", "high_bps", "best_bps", "trial_count"}. status is one of:
+- running
+- converged: the bracket reached resolution_pct
+- exhausted: max_trials ran out first
+- failed: a trial did not succeed
+- canceled: a trial was canceled, or the exercise ended first
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.models.exercise import Exercise
+from app.models.search_trial import SearchTrial
+from app.models.task import Task
+from app.models.test import Test
+from app.services.notifications import notify_agents
+from app.services.results import direction_summaries
+from app.services.tracing import new_traceparent, parse_traceparent
+from app.services.tuning import parse_rate
+
+
+def _stream_bitrate(test: Test, rate: float) -> str:
+    # -b applies per stream
+    return str(max(int(rate / test.parallel), 1))
+
+
+def start_search(db: Session, test: Test, client_task: Task) -> None:
+    """Turn a new test's client task into trial 1 at max_bitrate. The caller commits."""
+    config = test.search
+    high = parse_rate(config["max_bitrate"])
+    test.search_state = {
+        "status": "running",
+        "low_bps": parse_rate(config["min_bitrate"]),
+        "high_bps": high,
+        "best_bps": None,
+        "trial_count": 1
+    }
+    client_task.payload = {**client_task.payload, "bitrate": _stream_bitrate(test, high)}
+    db.add(SearchTrial(test_id=test.id, trial=1, task_id=client_task.id, bitrate_bps=high))
+
+
+def _trial_loss(summary: Dict[str, Any]) -> float:
+    """Worst loss over the directions a trial measured"""
+    return max((metrics.get("loss_pct") or 0.0) for _, metrics in direction_summaries(summary))
+
+
+def advance_search(db: Session, task: Task, summary: Optional[Dict[str, Any]]) -> Optional[Task]:
+    """Record a finished client task's trial and queue the next one.
+
+    No-op for tasks that are not the open trial of a search. Returns the next
+    trial's task, if any. The caller commits.
+    """
+    trial = db.query(SearchTrial).filter(
+        SearchTrial.task_id == task.id,
+        SearchTrial.finished_at.is_(None)
+    ).first()
+    if trial is None:
+        return None
+
+    test = db.query(Test).filter(Test.id == trial.test_id).first()
+    config = test.search
+    state = dict(test.search_state)
+    trial.finished_at = task.finished_at or datetime.utcnow()
+
+    if task.status != "succeeded" or not summary:
+        state["status"] = "canceled" if task.status == "canceled" else "failed"
+        test.search_state = state
+        return None
+
+    trial.bps_avg = summary.get("bps_avg")
+    trial.loss_pct = _trial_loss(summary)
+    trial.passed = trial.loss_pct <= config["loss_threshold_pct"]
+    if trial.passed:
+        state["low_bps"] = trial.bitrate_bps
+        state["best_bps"] = max(state["best_bps"] or 0.0, trial.bitrate_bps)
+    else:
+        state["high_bps"] = trial.bitrate_bps
+
+    exercise = db.query(Exercise).filter(Exercise.id == test.exercise_id).first()
+    if state["high_bps"] - state["low_bps"] <= config["resolution_pct"] / 100 * state["high_bps"]:
+        state["status"] = "converged"
+    elif state["trial_count"] >= config["max_trials"]:
+        state["status"] = "exhausted"
+    elif exercise.ended_at is not None:
+        state["status"] = "canceled"
+    if state["status"] != "running":
+        test.search_state = state
+        return None
+
+    # Same agent, server and trace; the server is already listening
+    rate = (state["low_bps"] + state["high_bps"]) / 2
+    trace = parse_traceparent(task.payload.get("traceparent"))
+    now = datetime.utcnow()
+    next_task = Task(
+        type="iperf_client_run",
+        agent_id=task.agent_id,
+        status="pending",
+        priority=task.priority,
+        payload={
+            **task.payload,
+            "bitrate": _stream_bitrate(test, rate),
+            "client_delay_seconds": 0,
+            "traceparent": new_traceparent(trace[0] if trace else None)
+        },
+        created_at=now,
+        pending_at=now
+    )
+    db.add(next_task)
+    db.flush()
+    notify_agents(db, [next_task.agent_id])
+
+    state["trial_count"] += 1
+    db.add(SearchTrial(test_id=test.id, trial=state["trial_count"], task_id=next_task.id, bitrate_bps=rate))
+    test.search_state = state
+    test.client_task_id = next_task.id
+    return next_task
+
+
+def search_trial_task_ids(db: Session, test_ids: List[int]) -> List[int]:
+    """Task IDs of every trial of the given tests"""
+    if not test_ids:
+        return []
+    return [
+        task_id for (task_id,) in db.query(SearchTrial.task_id).filter(SearchTrial.test_id.in_(test_ids))
+    ]
+
+
+def search_results(db: Session, tests: List[Test]) -> Dict[int, Dict[str, Any]]:
+    """Search outcome and trials per search test ID, for exercise results"""
+    searches = {test.id: test for test in tests if test.search}
+    if not searches:
+        return {}
+    results = {
+        test_id: {**test.search, **(test.search_state or {}), "trials": []}
+        for test_id, test in searches.items()
+    }
+    trials = db.query(SearchTrial).filter(
+        SearchTrial.test_id.in_(list(searches))
+    ).order_by(SearchTrial.test_id, SearchTrial.trial)
+    for trial in trials:
+        results[trial.test_id]["trials"].append({
+            "trial": trial.trial,
+            "task_id": trial.task_id,
+            "bitrate_bps": trial.bitrate_bps,
+            "bps_avg": trial.bps_avg,
+            "loss_pct": trial.loss_pct,
+            "passed": trial.passed,
+            "finished_at": trial.finished_at
+        })
+    return results
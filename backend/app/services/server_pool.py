@@ -0,0 +1,43 @@
+"""Leases of agents' warm iperf3 server pools.
+
+Agents started with SERVER_POOL_PORTS keep an iperf3 server listening on each
+pool port and report the live ones on register and heartbeat. A server task
+on a pool port is marked "pooled": the agent hands it the running server
+instead of spawning one. It then demultiplexes that server's output back to
+the task when the lease ends. Pool ports are leased through ordinary port
+reservations, so pooled and spawned servers never share a port.
+"""
+from typing import Optional, Set
+from sqlalchemy.orm import Session
+from app.models.agent import Agent
+from app.models.exercise import Exercise
+from app.models.port_reservation import PortReservation
+from app.models.test import Test
+
+
+def _busy_ports(db: Session, agent_id: int) -> Set[int]:
+    """Ports of the agent held by an active reservation or by a test of an
+    exercise that has not ended (server reservations are released once the
+    server is up)"""
+    reserved = db.query(PortReservation.port).filter(
+        PortReservation.agent_id == agent_id,
+        PortReservation.released_at.is_(None)
+    )
+    in_use = db.query(Test.server_port).join(Exercise, Exercise.id == Test.exercise_id).filter(
+        Test.server_agent_id == agent_id,
+        Exercise.ended_at.is_(None)
+    )
+    return {port for (port,) in reserved} | {port for (port,) in in_use}
+
+
+def free_pooled_port(db: Session, agent: Agent) -> Optional[int]:
+    """Lowest warm pool port of the agent that no test holds, if any"""
+    ports = agent.server_pool_ports or []
+    if not ports:
+        return None
+    busy = _busy_ports(db, agent.id)
+    return next((port for port in ports if port not in busy), None)
+
+
+def is_pooled(agent: Agent, port: int) -> bool:
+    return port in (agent.server_pool_ports or [])
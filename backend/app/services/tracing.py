@@ -0,0 +1,280 @@
+"""Task lifecycle tracing.
+
+Each test gets one trace, created by add_test and carried to the agents as a
+W3C traceparent in the task payloads. The Manager's spans (queued, pending,
+accepted, running) are derived from task timestamps when read; agents report
+their own spans (spawn, port ready, connect, first interval, run) with the
+result, and the Manager records an upload span on receipt. Agent spans are
+timed on the agent's clock, so cross-host spans are only as accurate as the
+hosts' clock sync.
+"""
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from statistics import median
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.task import Task
+from app.models.task_span import TaskSpan
+from app.schemas.task import TaskSpanIn
+import orjson
+
+_EPOCH = datetime(1970, 1, 1)
+
+# OTLP SpanKind: internal for lifecycle steps, server for the result upload
+_SPAN_KIND_INTERNAL = 1
+_SPAN_KIND_SERVER = 2
+
+# Stages reported by the latency breakdown, in lifecycle order
+BREAKDOWN_STAGES = (
+    "claim_wait", "client_delay", "retry_backoff", "failed_attempts", "spawn",
+    "port_ready", "connect", "first_interval", "run", "upload"
+)
+# Stages that delay traffic from starting once the exercise has started
+DISPATCH_STAGES = (
+    "claim_wait", "client_delay", "retry_backoff", "failed_attempts", "spawn", "port_ready", "connect"
+)
+
+
+def new_traceparent(trace_id: Optional[str] = None) -> str:
+    """W3C traceparent for a new root span, in a new trace unless one is given"""
+    return f"00-{trace_id or uuid.uuid4().hex}-{secrets.token_hex(8)}-01"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(trace_id, span_id) from a traceparent header, or None if malformed"""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def _unix_nano(value: datetime) -> int:
+    return (value - _EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def _from_unix_nano(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value // 1000)
+
+
+def _derived_span_id(root_span_id: str, name: str) -> str:
+    # Stable across reads, so exported traces can be de-duplicated
+    return hashlib.sha1(f"{root_span_id}:{name}".encode()).hexdigest()[:16]
+
+
+def manager_spans(task: Task, now: Optional[datetime] = None) -> List[TaskSpan]:
+    """Lifecycle spans for a traced task, derived from its timestamps (not persisted)"""
+    context = parse_traceparent((task.payload or {}).get("traceparent"))
+    if context is None:
+        return []
+    trace_id, root_span_id = context
+    attributes = {"iperf.task_id": task.id, "iperf.task_type": task.type, "iperf.agent_id": task.agent_id}
+
+    spans = [TaskSpan(
+        task_id=task.id, trace_id=trace_id, span_id=root_span_id, parent_span_id=None,
+        name=task.type, source="manager", start_time=task.created_at,
+        end_time=task.finished_at or now or datetime.utcnow(),
+        attributes={**attributes, "iperf.task_status": task.status}
+    )]
+
+    pending_since = task.pending_at or task.created_at
+    steps = (
+        ("queued", task.created_at, task.pending_at),
+        ("pending", pending_since, task.accepted_at),
+        ("accepted", task.accepted_at, task.started_at),
+        ("running", task.started_at, task.finished_at),
+    )
+    for name, start, end in steps:
+        if start is None or end is None:
+            continue
+        spans.append(TaskSpan(
+            task_id=task.id, trace_id=trace_id, span_id=_derived_span_id(root_span_id, name),
+            parent_span_id=root_span_id, name=name, source="manager",
+            start_time=start, end_time=end, attributes=attributes
+        ))
+    return spans
+
+
+def record_agent_spans(
+    db: Session,
+    task: Task,
+    spans: List[TaskSpanIn],
+    received_at: datetime,
+    traceparent: Optional[str] = None
+) -> None:
+    """Replace the task's stored spans with the agent's, plus an upload span.
+
+    The upload span runs from the end of the agent's last span to receipt.
+    Its parent is the span named in the request's traceparent header when it
+    belongs to this trace, otherwise the agent's root span. The caller commits.
+    """
+    context = parse_traceparent((task.payload or {}).get("traceparent"))
+    if context is None or not spans:
+        return
+    trace_id, root_span_id = context
+
+    db.query(TaskSpan).filter(TaskSpan.task_id == task.id).delete(synchronize_session=False)
+
+    for span in spans:
+        db.add(TaskSpan(
+            task_id=task.id, trace_id=trace_id, span_id=span.span_id,
+            parent_span_id=span.parent_span_id, name=span.name, source="agent",
+            start_time=_from_unix_nano(span.start_time_unix_nano),
+            end_time=_from_unix_nano(span.end_time_unix_nano),
+            attributes=span.attributes
+        ))
+
+    header = parse_traceparent(traceparent)
+    if header is not None and header[0] == trace_id:
+        parent_span_id = header[1]
+    else:
+        agent_roots = [s.span_id for s in spans if s.parent_span_id == root_span_id]
+        parent_span_id = agent_roots[0] if agent_roots else root_span_id
+
+    upload_start = min(_from_unix_nano(max(s.end_time_unix_nano for s in spans)), received_at)
+    db.add(TaskSpan(
+        task_id=task.id, trace_id=trace_id, span_id=secrets.token_hex(8),
+        parent_span_id=parent_span_id, name="upload", source="manager",
+        start_time=upload_start, end_time=received_at,
+        attributes={"iperf.task_id": task.id, "iperf.result_status": task.status}
+    ))
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: Iterable[TaskSpan]) -> Dict[str, Any]:
+    """OTLP/JSON ExportTraceServiceRequest with one resource per span source"""
+    by_source: Dict[str, List[Dict[str, Any]]] = {}
+    for span in spans:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": _SPAN_KIND_SERVER if span.name == "upload" else _SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(_unix_nano(span.start_time)),
+            "endTimeUnixNano": str(_unix_nano(span.end_time)),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)} for key, value in (span.attributes or {}).items()
+            ]
+        }
+        if span.parent_span_id:
+            otlp_span["parentSpanId"] = span.parent_span_id
+        by_source.setdefault(span.source, []).append(otlp_span)
+
+    return {"resourceSpans": [
+        {
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": f"iperf-{source}"}}
+            ]},
+            "scopeSpans": [{"scope": {"name": "iperf-orchestrator"}, "spans": otlp_spans}]
+        }
+        for source, otlp_spans in by_source.items()
+    ]}
+
+
+def trace_for_tasks(db: Session, tasks: List[Task]) -> List[TaskSpan]:
+    """Derived and stored spans for the given tasks"""
+    if not tasks:
+        return []
+    now = datetime.utcnow()
+    spans: List[TaskSpan] = []
+    for task in tasks:
+        spans.extend(manager_spans(task, now))
+    spans.extend(db.query(TaskSpan).filter(
+        TaskSpan.task_id.in_([task.id for task in tasks])
+    ).order_by(TaskSpan.id).all())
+    return spans
+
+
+def export_task_trace(db: Session, task: Task) -> None:
+    """Append the task's trace to settings.trace_export_path as one OTLP JSON line"""
+    if not settings.trace_export_path:
+        return
+    spans = trace_for_tasks(db, [task])
+    if not spans:
+        return
+    with open(settings.trace_export_path, "ab") as f:
+        f.write(orjson.dumps(to_otlp(spans)) + b"\n")
+
+
+def _seconds(span: TaskSpan) -> float:
+    return max(0.0, (span.end_time - span.start_time).total_seconds())
+
+
+def task_stages(spans: Iterable[TaskSpan]) -> Dict[str, float]:
+    """Seconds spent in each breakdown stage, from one task's spans"""
+    stages: Dict[str, float] = {}
+    for span in spans:
+        if span.name == "pending":
+            stage = "claim_wait"
+        elif span.name == "attempt":
+            if (span.attributes or {}).get("iperf.exit_code", 0) == 0:
+                continue
+            stage = "failed_attempts"
+        elif span.name in BREAKDOWN_STAGES:
+            stage = span.name
+        else:
+            continue
+        stages[stage] = stages.get(stage, 0.0) + _seconds(span)
+    return stages
+
+
+def _stage_stats(values: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": median(values),
+        "max": max(values)
+    }
+
+
+def latency_breakdown(tests: List[Any], spans: List[TaskSpan]) -> Dict[str, Any]:
+    """Per-test stage durations and per-stage aggregates for an exercise"""
+    spans_by_task: Dict[int, List[TaskSpan]] = {}
+    for span in spans:
+        spans_by_task.setdefault(span.task_id, []).append(span)
+
+    per_test = []
+    samples: Dict[str, Dict[str, List[float]]] = {"server": {}, "client": {}}
+    for test in tests:
+        entry: Dict[str, Any] = {"test_id": test.id, "trace_id": None}
+        for role, task_id in (("server", test.server_task_id), ("client", test.client_task_id)):
+            task_spans = spans_by_task.get(task_id, [])
+            if task_spans:
+                entry["trace_id"] = task_spans[0].trace_id
+            stages = task_stages(task_spans)
+            entry[role] = {
+                "task_id": task_id,
+                "stages": stages,
+                "dispatch_seconds": sum(stages.get(stage, 0.0) for stage in DISPATCH_STAGES)
+            }
+            for stage, seconds in stages.items():
+                samples[role].setdefault(stage, []).append(seconds)
+        per_test.append(entry)
+
+    stage_stats = {
+        role: {stage: _stage_stats(by_stage[stage]) for stage in BREAKDOWN_STAGES if stage in by_stage}
+        for role, by_stage in samples.items()
+    }
+
+    # The dispatch stage that cost the most on average
+    dominant = None
+    for role, by_stage in stage_stats.items():
+        for stage in DISPATCH_STAGES:
+            stats = by_stage.get(stage)
+            if stats and (dominant is None or stats["mean"] > dominant["mean_seconds"]):
+                dominant = {"role": role, "stage": stage, "mean_seconds": stats["mean"]}
+
+    return {"tests": per_test, "stages": stage_stats, "dominant_stage": dominant}
@@ -0,0 +1,56 @@
+"""iperf3 client tuning options of a test.
+
+The options live as nullable columns on Test (and fields on TestCreate) and
+travel to the client agent in its task payload under the same names. Only
+options that are set are carried. tuning_key() renders them as a canonical
+string, so results can be grouped by the settings that produced them.
+"""
+from typing import Any, Dict
+
+# iperf3 rate suffixes (decimal, as -b reads them)
+_RATE_UNITS = {"k": 1e3, "m": 1e6, "g": 1e9}
+
+# Option name -> iperf3 flag, in the order they appear in tuning keys
+TUNING_FLAGS = {
+    "zerocopy": "Z",
+    "window": "w",
+    "buffer_length": "l",
+    "omit_seconds": "O",
+    "congestion": "C",
+    "mss": "M",
+    "bitrate": "b",
+    "fq_rate": "fq-rate",
+    "reverse": "R",
+    "bidir": "bidir",
+}
+
+
+def tuning_options(source: Any) -> Dict[str, Any]:
+    """Set tuning options of a Test row or TestCreate body (False/None are unset)"""
+    options = {}
+    for name in TUNING_FLAGS:
+        value = getattr(source, name, None)
+        if value is not None and value is not False:
+            options[name] = value
+    return options
+
+
+def tuning_key(options: Dict[str, Any]) -> str:
+    """Canonical flag string for a set of options, e.g. "Z,w=4M,O=2" ("" when untuned)"""
+    parts = []
+    for name, flag in TUNING_FLAGS.items():
+        value = options.get(name)
+        if value is True:
+            parts.append(flag)
+        elif value is not None and value is not False:
+            parts.append(f"{flag}={value}")
+    return ",".join(parts)
+
+
+def parse_rate(value: str) -> float:
+    """Bits per second of an iperf3 rate such as "10G" or "500M/32" """
+    value = value.split("/", 1)[0]
+    unit = _RATE_UNITS.get(value[-1:].lower())
+    if unit is None:
+        return float(value)
+    return float(value[:-1]) * unit
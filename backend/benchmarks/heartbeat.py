@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Heartbeat throughput benchmark
+
+Drives POST /v1/agent/heartbeat in-process through httpx's ASGI transport
+(no sockets, no uvicorn) against a scratch SQLite database, so the number
+reflects the Manager's own per-request cost: middleware, agent auth, the
+heartbeat update and response rendering.
+
+Example:
+  python -m benchmarks.heartbeat --agents 50 --concurrency 50 --seconds 10
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.loadtest import percentile
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark heartbeat requests/sec")
+    parser.add_argument("--agents", type=int, default=50, help="Distinct agents sending heartbeats")
+    parser.add_argument("--concurrency", type=int, default=50, help="Heartbeats in flight")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--api-version", type=int, default=1)
+    parser.add_argument("--json-output", help="Write the report as JSON to this file")
+    return parser.parse_args()
+
+
+async def run(args) -> Dict[str, Any]:
+    # Imported late so DATABASE_URL points at the scratch database
+    from datetime import datetime
+    from app.main import app
+    from app.database import Base, engine, SessionLocal
+    from app.models.agent import Agent
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    for i in range(args.agents):
+        db.add(Agent(name=f"bench-{i}", registration_key="bench", status="online",
+                     first_registered=datetime.utcnow()))
+    db.commit()
+    db.close()
+
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + args.seconds
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(index: int):
+            nonlocal errors
+            headers = {
+                "X-API-Version": str(args.api_version),
+                "X-AGENT-NAME": f"bench-{index % args.agents}",
+                "X-AGENT-KEY": "bench",
+            }
+            body = {"ip_address": "10.0.0.1", "running": []}
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.post("/v1/agent/heartbeat", json=body, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    args = parse_arguments()
+    scratch = tempfile.mkdtemp(prefix="heartbeat-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(scratch) / 'bench.db'}"
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if report["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
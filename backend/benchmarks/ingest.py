@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Result ingest CPU benchmark
+
+Measures CPU time per MB of iperf3 JSON spent handling a task result upload
+(request decoding, validation, column encoding, response encoding and the
+idempotency log copy) and a task read, for two pipelines:
+
+  dict  - the previous path: stdlib json decode, Pydantic Dict[str, Any]
+          validation, SQLAlchemy JSON column encode/decode and a
+          jsonable_encoder round trip for the response
+  raw   - the current path: orjson decode of the upload, envelope-only
+          validation, RawJSON column text passed through to the response
+
+No database or HTTP server is involved; only the per-request CPU work that
+scales with result size is timed.
+
+Example:
+  python -m benchmarks.ingest --result-kb 256 --streams 32 --udp --repeat 20
+"""
+
+import json
+import time
+import argparse
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from app.database import RawJSON
+from app.responses import dump_json
+from app.schemas.task import TaskResponse
+from app.services.results import parse_result_upload
+from benchmarks.loadtest import synthetic_iperf_result
+
+
+class DictTaskResultRequest(BaseModel):
+    status: str
+    result: Optional[Dict[str, Any]] = None
+    stderr: Optional[str] = None
+    exit_code: int = 0
+
+
+class DictTaskResponse(BaseModel):
+    id: int
+    type: str
+    agent_id: int
+    status: str
+    payload: Dict[str, Any] = {}
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+def _task_fields() -> Dict[str, Any]:
+    now = datetime.utcnow()
+    return {"id": 1, "type": "iperf_client_run", "agent_id": 1, "status": "succeeded",
+            "payload": {"port": 5201}, "created_at": now, "finished_at": now}
+
+
+def dict_ingest(raw: bytes) -> bytes:
+    body = DictTaskResultRequest.model_validate(json.loads(raw))
+    stored = json.dumps(body.result)  # JSON column bind
+    task = DictTaskResponse(result=json.loads(stored), **_task_fields())  # db.refresh()
+    content = jsonable_encoder(task)
+    json.dumps(content)  # idempotency log
+    return json.dumps(content).encode()  # JSONResponse
+
+
+def raw_ingest(raw: bytes) -> bytes:
+    body, result, summary = parse_result_upload(raw)
+    stored = RawJSON().process_bind_param(result, None)
+    task = TaskResponse(result=stored, summary=summary, **_task_fields())
+    return dump_json(task)  # same bytes go to the idempotency log and the client
+
+
+def dict_read(stored: str) -> bytes:
+    task = DictTaskResponse(result=json.loads(stored), **_task_fields())
+    return json.dumps(jsonable_encoder(task)).encode()
+
+
+def raw_read(stored: str) -> bytes:
+    return dump_json(TaskResponse(result=stored, **_task_fields()))
+
+
+def cpu_ms_per_mb(fn: Callable[[Any], Any], arg: Any, size_bytes: int, repeat: int) -> float:
+    fn(arg)  # warm up
+    start = time.process_time()
+    for _ in range(repeat):
+        fn(arg)
+    elapsed = time.process_time() - start
+    return elapsed * 1000 / repeat / (size_bytes / 1_000_000)
+
+
+def run(result_kb: List[int], streams: int, udp: bool, repeat: int) -> List[Dict[str, Any]]:
+    rows = []
+    for kb in result_kb:
+        document = synthetic_iperf_result(kb * 1024, streams=streams, udp=udp)
+        raw = json.dumps({"status": "succeeded", "result": document, "stderr": "", "exit_code": 0}).encode()
+        stored = json.dumps(document)
+        size = len(stored)
+
+        row = {
+            "result_kb": round(size / 1024),
+            "ingest_dict_ms_per_mb": cpu_ms_per_mb(dict_ingest, raw, size, repeat),
+            "ingest_raw_ms_per_mb": cpu_ms_per_mb(raw_ingest, raw, size, repeat),
+            "read_dict_ms_per_mb": cpu_ms_per_mb(dict_read, stored, size, repeat),
+            "read_raw_ms_per_mb": cpu_ms_per_mb(raw_read, stored, size, repeat),
+        }
+        row["ingest_speedup"] = row["ingest_dict_ms_per_mb"] / row["ingest_raw_ms_per_mb"]
+        row["read_speedup"] = row["read_dict_ms_per_mb"] / row["read_raw_ms_per_mb"]
+        rows.append(row)
+    return rows
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark result ingest CPU time per MB")
+    parser.add_argument("--result-kb", type=int, nargs="+", default=[64, 256, 1024],
+                        help="Approximate result document sizes to test")
+    parser.add_argument("--streams", type=int, default=32, help="Parallel streams (-P) in the document")
+    parser.add_argument("--udp", action="store_true", help="Generate UDP documents")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json-output", help="Write the report as JSON to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    rows = run(args.result_kb, args.streams, args.udp, args.repeat)
+
+    print(f"{'size KB':>8} {'ingest dict':>12} {'ingest raw':>11} {'x':>6} {'read dict':>10} {'read raw':>9} {'x':>7}")
+    for row in rows:
+        print(f"{row['result_kb']:>8} {row['ingest_dict_ms_per_mb']:>12.2f} {row['ingest_raw_ms_per_mb']:>11.2f} "
+              f"{row['ingest_speedup']:>6.1f} {row['read_dict_ms_per_mb']:>10.2f} {row['read_raw_ms_per_mb']:>9.2f} "
+              f"{row['read_speedup']:>7.1f}")
+    print("(CPU ms per MB of result JSON)")
+
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
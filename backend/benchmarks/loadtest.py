@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Manager load-test harness
+
+Spins up many lightweight simulated agents (one asyncio coroutine each, all
+sharing a single httpx connection pool) that speak the /v1/agent/* protocol
+against a running Manager. Simulated agents execute fake tasks and upload
+synthetic iperf3 JSON documents instead of running iperf3.
+
+Example:
+  python -m benchmarks.loadtest --manager-url http://localhost:8000 \\
+      --agents 2000 --run-seconds 120 --result-kb 256 \\
+      --db-path ./iperf_orchestrator.db --json-output loadtest.json
+"""
+
+import sys
+import json
+import time
+import math
+import random
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any
+
+import httpx
+
+logger = logging.getLogger("loadtest")
+
+
+@dataclass
+class Stats:
+    heartbeat_latencies: List[float] = field(default_factory=list)
+    claim_latencies: List[float] = field(default_factory=list)
+    result_latencies: List[float] = field(default_factory=list)
+    tasks_claimed: int = 0
+    results_submitted: int = 0
+    result_bytes: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+
+    def record_error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile, None for an empty sample"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def db_size_bytes(db_path: Optional[Path]) -> Optional[int]:
+    """Size of the SQLite database including its WAL file"""
+    if not db_path:
+        return None
+    total = 0
+    for path in (db_path, Path(f"{db_path}-wal")):
+        if path.exists():
+            total += path.stat().st_size
+    return total
+
+
+def synthetic_iperf_result(target_bytes: int, streams: int = 4, udp: bool = False) -> Dict[str, Any]:
+    """Build an iperf3 -J style client document of roughly target_bytes"""
+    def stream_entry(socket_id: int, start: float, end: float) -> Dict[str, Any]:
+        entry = {
+            "socket": socket_id,
+            "start": start,
+            "end": end,
+            "seconds": end - start,
+            "bytes": 1179648000,
+            "bits_per_second": 9.437184e9,
+            "omitted": False,
+            "sender": True
+        }
+        if udp:
+            entry.update({"jitter_ms": 0.012, "lost_packets": 0, "packets": 813802, "lost_percent": 0.0})
+        else:
+            entry.update({"retransmits": 0, "snd_cwnd": 3145728, "rtt": 120, "rttvar": 30, "pmtu": 1500})
+        return entry
+
+    def interval(index: int) -> Dict[str, Any]:
+        start, end = float(index), float(index + 1)
+        return {
+            "streams": [stream_entry(5 + s, start, end) for s in range(streams)],
+            "sum": {
+                "start": start,
+                "end": end,
+                "seconds": 1.0,
+                "bytes": 1179648000 * streams,
+                "bits_per_second": 9.437184e9 * streams,
+                "omitted": False,
+                "sender": True
+            }
+        }
+
+    sum_sent = {"start": 0, "end": 0, "seconds": 0, "bytes": 0, "bits_per_second": 9.437184e9 * streams,
+                "retransmits": 0, "sender": True}
+    document = {
+        "start": {
+            "connected": [{"socket": 5 + s, "local_host": "10.0.0.2", "remote_host": "10.0.0.1"} for s in range(streams)],
+            "version": "iperf 3.16",
+            "test_start": {"protocol": "UDP" if udp else "TCP", "num_streams": streams, "duration": 0}
+        },
+        "intervals": [],
+        "end": {
+            "sum_sent": sum_sent,
+            "sum_received": dict(sum_sent, sender=False),
+            "sum": {"jitter_ms": 0.012, "lost_percent": 0.0} if udp else {},
+            "cpu_utilization_percent": {"host_total": 35.2, "remote_total": 28.9}
+        }
+    }
+
+    # Size the interval list to hit the target document size
+    interval_size = len(json.dumps(interval(0)))
+    count = max(1, target_bytes // interval_size)
+    document["intervals"] = [interval(i) for i in range(count)]
+    document["start"]["test_start"]["duration"] = count
+    for key in ("end", "seconds"):
+        sum_sent[key] = float(count)
+    sum_sent["bytes"] = 1179648000 * streams * count
+    return document
+
+
+class SimulatedAgent:
+    """A fake agent driving the Manager's agent protocol"""
+
+    def __init__(self, harness: "LoadTest", name: str, key: str):
+        self.harness = harness
+        self.name = name
+        self.headers = {
+            "X-AGENT-NAME": name,
+            "X-AGENT-KEY": key,
+            "X-API-Version": str(harness.args.api_version),
+            "Content-Type": "application/json"
+        }
+        self.ip_address = f"10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+        self.running: Dict[int, asyncio.Task] = {}
+
+    async def post(self, path: str, body: Any = None, content: Optional[bytes] = None) -> Optional[httpx.Response]:
+        """POST to the Manager, recording transport errors instead of raising"""
+        try:
+            if content is not None:
+                return await self.harness.client.post(path, headers=self.headers, content=content)
+            return await self.harness.client.post(path, headers=self.headers, json=body if body is not None else {})
+        except httpx.HTTPError as e:
+            self.harness.stats.record_error(type(e).__name__)
+            return None
+
+    async def run(self, stop_at: float):
+        stats = self.harness.stats
+        interval = self.harness.args.heartbeat_interval
+
+        response = await self.post("/v1/agent/register", {"ip_address": self.ip_address, "operating_system": "Linux"})
+        if response is None or response.status_code != 200:
+            stats.record_error("register")
+            return
+
+        # Spread agents over the heartbeat interval like a real fleet
+        await asyncio.sleep(random.uniform(0, interval))
+
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            running = [{"type": "client", "port": None, "pid": task_id} for task_id in self.running]
+            response = await self.post("/v1/agent/heartbeat", {
+                "ip_address": self.ip_address,
+                "running": running,
+                "claim": self.harness.args.claim
+            })
+            if response is not None and response.status_code == 200:
+                stats.heartbeat_latencies.append(time.perf_counter() - started)
+                result = response.json()
+                if "tasks" in result:
+                    for task in result["tasks"]:
+                        self.start_task(task)
+                elif result.get("pull_tasks"):
+                    await self.claim_tasks()
+            elif response is not None:
+                stats.record_error(f"heartbeat_{response.status_code}")
+
+            self.running = {task_id: t for task_id, t in self.running.items() if not t.done()}
+            await asyncio.sleep(interval)
+
+        if self.running:
+            await asyncio.gather(*self.running.values(), return_exceptions=True)
+
+    async def claim_tasks(self):
+        stats = self.harness.stats
+        for _ in range(5):
+            started = time.perf_counter()
+            response = await self.post("/v1/agent/tasks/claim")
+            if response is None or response.status_code != 200:
+                if response is not None:
+                    stats.record_error(f"claim_{response.status_code}")
+                return
+            stats.claim_latencies.append(time.perf_counter() - started)
+            task = response.json().get("task")
+            if not task:
+                return
+            self.start_task(task)
+
+    def start_task(self, task: Dict[str, Any]):
+        self.harness.stats.tasks_claimed += 1
+        self.running[task["id"]] = asyncio.create_task(self.execute(task))
+
+    async def execute(self, task: Dict[str, Any]):
+        task_id = task["id"]
+        payload = task.get("payload") or {}
+
+        response = await self.post(f"/v1/agent/tasks/{task_id}/started", {"pid": 100000 + task_id})
+        if response is None or response.status_code != 200:
+            self.harness.stats.record_error("started")
+
+        if task["type"] == "iperf_client_run":
+            await asyncio.sleep(payload.get("time", 0) * self.harness.args.timescale)
+            body = self.harness.client_result_body(payload.get("udp", False))
+        elif task["type"] == "iperf_server_start":
+            body = self.harness.small_result_body({"started": True, "pid": 100000 + task_id})
+        else:
+            body = self.harness.small_result_body({"killed": True, "count": 0})
+
+        started = time.perf_counter()
+        response = await self.post(f"/v1/agent/tasks/{task_id}/result", content=body)
+        if response is not None and response.status_code == 200:
+            stats = self.harness.stats
+            stats.result_latencies.append(time.perf_counter() - started)
+            stats.results_submitted += 1
+            stats.result_bytes += len(body)
+        elif response is not None:
+            self.harness.stats.record_error(f"result_{response.status_code}")
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.stats = Stats()
+        self.client = httpx.AsyncClient(
+            base_url=args.manager_url,
+            timeout=args.timeout,
+            limits=httpx.Limits(
+                max_connections=args.max_connections,
+                max_keepalive_connections=args.max_connections
+            )
+        )
+        self._result_bodies: Dict[bool, bytes] = {}
+
+    def client_result_body(self, udp: bool) -> bytes:
+        """Pre-serialised result upload, built once per protocol"""
+        if udp not in self._result_bodies:
+            document = synthetic_iperf_result(self.args.result_kb * 1024, self.args.streams, udp)
+            self._result_bodies[udp] = json.dumps({
+                "status": "succeeded",
+                "result": document,
+                "stderr": "",
+                "exit_code": 0
+            }).encode()
+        return self._result_bodies[udp]
+
+    def small_result_body(self, result: Dict[str, Any]) -> bytes:
+        return json.dumps({"status": "succeeded", "result": result, "stderr": "", "exit_code": 0}).encode()
+
+    async def admin_headers(self) -> Dict[str, str]:
+        response = await self.client.post("/v1/auth/login", json={
+            "username": self.args.admin_username,
+            "password": self.args.admin_password
+        })
+        response.raise_for_status()
+        return {
+            "Authorization": f"Bearer {response.json()['access_token']}",
+            "X-API-Version": str(self.args.api_version)
+        }
+
+    async def provision(self) -> List[SimulatedAgent]:
+        """Create (or reset) the simulated agent records and an exercise pairing them"""
+        headers = await self.admin_headers()
+        existing = await self.client.get("/v1/agents", headers=headers, params={"include_disabled": True})
+        existing.raise_for_status()
+        by_name = {a["name"]: a for a in existing.json()}
+
+        agents = []
+        agent_ids = []
+        semaphore = asyncio.Semaphore(50)
+
+        async def ensure(index: int):
+            name = f"{self.args.agent_prefix}{index:05d}"
+            async with semaphore:
+                if name in by_name:
+                    agent_id = by_name[name]["id"]
+                    response = await self.client.put(f"/v1/agents/{agent_id}", headers=headers,
+                                                     json={"registration_key": self.args.agent_key})
+                    if by_name[name]["disabled"]:
+                        await self.client.post(f"/v1/agents/{agent_id}/enable", headers=headers)
+                else:
+                    response = await self.client.post("/v1/agents", headers=headers, json={
+                        "name": name,
+                        "registration_key": self.args.agent_key,
+                        "operating_system": "Linux"
+                    })
+                    agent_id = response.json().get("id")
+                response.raise_for_status()
+            return SimulatedAgent(self, name, self.args.agent_key), agent_id
+
+        for agent, agent_id in await asyncio.gather(*(ensure(i) for i in range(self.args.agents))):
+            agents.append(agent)
+            agent_ids.append(agent_id)
+
+        # Pair agents (server, client) into tests of one exercise
+        test_count = self.args.tests if self.args.tests is not None else len(agent_ids) // 2
+        if test_count:
+            response = await self.client.post("/v1/exercises", headers=headers, json={
+                "name": f"loadtest-{int(time.time())}",
+                "duration_seconds": self.args.test_seconds,
+                "notes": f"Load test with {self.args.agents} simulated agents"
+            })
+            response.raise_for_status()
+            exercise_id = response.json()["id"]
+
+            async def add_test(index: int):
+                server_id = agent_ids[(2 * index) % len(agent_ids)]
+                client_id = agent_ids[(2 * index + 1) % len(agent_ids)]
+                port = self.args.base_port + index // max(1, len(agent_ids) // 2)
+                async with semaphore:
+                    response = await self.client.post(f"/v1/exercises/{exercise_id}/tests", headers=headers, json={
+                        "server_agent_id": server_id,
+                        "client_agent_id": client_id,
+                        "server_port": port,
+                        "udp": self.args.udp,
+                        "parallel": self.args.streams
+                    })
+                    if response.status_code != 201:
+                        self.stats.record_error(f"add_test_{response.status_code}")
+
+            await asyncio.gather(*(add_test(i) for i in range(test_count)))
+            response = await self.client.post(f"/v1/exercises/{exercise_id}/start", headers=headers)
+            response.raise_for_status()
+            logger.info(f"Started exercise {exercise_id} with {test_count} tests")
+
+        return agents
+
+    async def run(self) -> Dict[str, Any]:
+        db_path = Path(self.args.db_path) if self.args.db_path else None
+        agents = await self.provision()
+        db_before = db_size_bytes(db_path)
+
+        # Profile only the steady-state run, not provisioning
+        profile_headers = None
+        if self.args.sql_profile:
+            profile_headers = await self.admin_headers()
+            response = await self.client.delete("/v1/profiling/sql", headers=profile_headers)
+            response.raise_for_status()
+
+        logger.info(f"Running {len(agents)} simulated agents for {self.args.run_seconds}s")
+        started = time.monotonic()
+        stop_at = started + self.args.run_seconds
+        await asyncio.gather(*(agent.run(stop_at) for agent in agents))
+        elapsed = time.monotonic() - started
+
+        sql_profile = None
+        if profile_headers is not None:
+            response = await self.client.get("/v1/profiling/sql", headers=profile_headers)
+            response.raise_for_status()
+            sql_profile = response.json()
+        await self.client.aclose()
+
+        db_after = db_size_bytes(db_path)
+        stats = self.stats
+        to_ms = lambda v: round(v * 1000, 2) if v is not None else None
+        return {
+            "agents": len(agents),
+            "elapsed_seconds": round(elapsed, 2),
+            "heartbeats": len(stats.heartbeat_latencies),
+            "heartbeat_p50_ms": to_ms(percentile(stats.heartbeat_latencies, 50)),
+            "heartbeat_p99_ms": to_ms(percentile(stats.heartbeat_latencies, 99)),
+            "claim_p50_ms": to_ms(percentile(stats.claim_latencies, 50)),
+            "claim_p99_ms": to_ms(percentile(stats.claim_latencies, 99)),
+            "tasks_claimed": stats.tasks_claimed,
+            "claims_per_second": round(stats.tasks_claimed / elapsed, 2),
+            "results_submitted": stats.results_submitted,
+            "results_per_second": round(stats.results_submitted / elapsed, 2),
+            "result_ingest_mb_per_second": round(stats.result_bytes / elapsed / 1024 / 1024, 3),
+            "result_p50_ms": to_ms(percentile(stats.result_latencies, 50)),
+            "result_p99_ms": to_ms(percentile(stats.result_latencies, 99)),
+            "db_bytes_before": db_before,
+            "db_bytes_after": db_after,
+            "db_growth_bytes": db_after - db_before if db_before is not None else None,
+            "errors": stats.errors,
+            "sql_profile": {
+                "enabled": sql_profile["enabled"],
+                "routes": sql_profile["routes"],
+                "duplicated_statements": sql_profile["duplicated_statements"][:10]
+            } if sql_profile is not None else None
+        }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Load-test the Manager with simulated agents")
+    parser.add_argument("--manager-url", default="http://localhost:8000")
+    parser.add_argument("--admin-username", default="admin")
+    parser.add_argument("--admin-password", default="admin123")
+    parser.add_argument("--api-version", type=int, default=1)
+    parser.add_argument("--agents", type=int, default=100, help="Number of simulated agents")
+    parser.add_argument("--agent-prefix", default="sim-agent-")
+    parser.add_argument("--agent-key", default="loadtest-key")
+    parser.add_argument("--tests", type=int, default=None, help="Tests to schedule (default: agents / 2)")
+    parser.add_argument("--test-seconds", type=int, default=10, help="Nominal iperf3 duration per test")
+    parser.add_argument("--timescale", type=float, default=1.0, help="Multiplier applied to fake test durations")
+    parser.add_argument("--base-port", type=int, default=5201)
+    parser.add_argument("--udp", action="store_true", help="Schedule UDP tests")
+    parser.add_argument("--streams", type=int, default=4, help="Parallel streams (-P) per test")
+    parser.add_argument("--result-kb", type=int, default=64, help="Approximate size of synthetic iperf3 JSON")
+    parser.add_argument("--heartbeat-interval", type=float, default=5.0)
+    parser.add_argument("--claim", type=int, default=5,
+                        help="Tasks claimed per heartbeat (0 uses the separate claim endpoint)")
+    parser.add_argument("--run-seconds", type=float, default=60.0)
+    parser.add_argument("--max-connections", type=int, default=200, help="Size of the shared httpx pool")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--db-path", help="SQLite database file, to report DB growth")
+    parser.add_argument("--json-output", help="Write the report as JSON to this file")
+    parser.add_argument("--max-heartbeat-p99-ms", type=float,
+                        help="Exit non-zero if heartbeat p99 exceeds this (regression gate)")
+    parser.add_argument("--sql-profile", action="store_true",
+                        help="Report the Manager's SQL profile for the run (needs SQL_PROFILING=true)")
+    parser.add_argument("--max-statements-per-request", type=int,
+                        help="Exit non-zero if any route ran more SQL statements than this in one request "
+                             "(regression gate, implies --sql-profile)")
+    args = parser.parse_args()
+    if args.max_statements_per_request is not None:
+        args.sql_profile = True
+    return args
+
+
+async def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    args = parse_arguments()
+
+    report = await LoadTest(args).run()
+    print(json.dumps(report, indent=2))
+
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    p99 = report["heartbeat_p99_ms"]
+    if args.max_heartbeat_p99_ms is not None and (p99 is None or p99 > args.max_heartbeat_p99_ms):
+        logger.error(f"Heartbeat p99 {p99}ms exceeds gate of {args.max_heartbeat_p99_ms}ms")
+        sys.exit(1)
+
+    if args.max_statements_per_request is not None:
+        profile = report["sql_profile"]
+        if not profile["enabled"]:
+            logger.error("SQL statement gate needs the Manager running with SQL_PROFILING=true")
+            sys.exit(1)
+        # Background job passes are profiled too but are not requests
+        over = [
+            route for route in profile["routes"]
+            if not route["label"].startswith("job ") and route["statements_max"] > args.max_statements_per_request
+        ]
+        for route in over:
+            logger.error(f"{route['label']} ran {route['statements_max']} statements in one request, "
+                         f"gate is {args.max_statements_per_request}")
+        if over:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
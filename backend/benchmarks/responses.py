@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Response generation micro-benchmark
+
+Times turning N Task ORM rows into a response body, the work behind
+GET /v1/tasks, for two paths:
+
+  default  - returning the rows and letting FastAPI validate them against
+             response_model, serialise in JSON mode and render with the
+             stdlib json encoder
+  orjson   - one model_validate per row and ORJSONResponse, as the routers
+             do now
+
+No database or HTTP server is involved; rows are built in memory.
+
+Example:
+  python -m benchmarks.responses --tasks 1000 --result-kb 8 --repeat 20
+"""
+
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.models.task import Task
+from app.responses import ORJSONResponse
+from app.schemas.task import TaskResponse
+from benchmarks.loadtest import synthetic_iperf_result
+
+
+def build_tasks(count: int, result_kb: int) -> List[Task]:
+    """Half server, half client tasks; client tasks carry a stored result"""
+    now = datetime.utcnow()
+    result = json.dumps(synthetic_iperf_result(result_kb * 1024, streams=4)) if result_kb else None
+    tasks = []
+    for i in range(count):
+        client = i % 2 == 1
+        tasks.append(Task(
+            id=i + 1,
+            type="iperf_client_run" if client else "iperf_server_start",
+            agent_id=i % 50 + 1,
+            status="succeeded",
+            payload={"port": 5201 + i % 100, "duration_sec": 10, "parallel": 4, "udp": False},
+            created_at=now - timedelta(seconds=count - i),
+            accepted_at=now,
+            started_at=now,
+            finished_at=now,
+            result=result if client else None,
+            summary={"bps_avg": 9.4e9, "retransmits": 0, "jitter_ms": None, "loss_pct": None} if client else None,
+        ))
+    return tasks
+
+
+async def default_response(field, tasks: List[Task]) -> bytes:
+    content = await serialize_response(field=field, response_content=tasks)
+    return JSONResponse(content).body
+
+
+async def orjson_response(field, tasks: List[Task]) -> bytes:
+    return ORJSONResponse([TaskResponse.model_validate(task) for task in tasks]).body
+
+
+async def time_ms(fn, field, tasks: List[Task], repeat: int) -> float:
+    await fn(field, tasks)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await fn(field, tasks)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+async def run(count: int, result_kb: int, repeat: int) -> Dict[str, Any]:
+    tasks = build_tasks(count, result_kb)
+    field = create_response_field(name="Response_List_Tasks", type_=List[TaskResponse])
+
+    # Both paths must produce the same document
+    assert json.loads(await default_response(field, tasks)) == json.loads(await orjson_response(field, tasks))
+
+    default_ms = await time_ms(default_response, field, tasks, repeat)
+    orjson_ms = await time_ms(orjson_response, field, tasks, repeat)
+    return {
+        "tasks": count,
+        "result_kb": result_kb,
+        "response_bytes": len(await orjson_response(field, tasks)),
+        "default_ms": default_ms,
+        "orjson_ms": orjson_ms,
+        "speedup": default_ms / orjson_ms,
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark task list response generation")
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--result-kb", type=int, default=0,
+                        help="Size of the stored result on each client task (0 for none)")
+    parser.add_argument("--repeat", type=int, default=20)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    report = asyncio.run(run(args.tasks, args.result_kb, args.repeat))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()